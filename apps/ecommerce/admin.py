@@ -1,15 +1,190 @@
-from django.contrib import admin
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
 
-from apps.ecommerce.models import Product, Category, Attributes, ProductAttribute
+from apps.ecommerce.deletion import start_category_deletion, start_product_deletion
+from apps.ecommerce.models import Product, Category, Attributes, ProductAttribute, AttributeValue, OutboxEvent
+from apps.ecommerce.outbox import product_change_events
+from apps.ecommerce.related import request_related_refresh
 
 # Register your models here.
 
-class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'price', 'quantity', 'is_active')
-    search_fields = ('name',)
+
+def estimated_row_count(model, using):
+    """
+    Returns the planner's row estimate of the model's table on PostgreSQL,
+    or None when no estimate is available (other databases, never analyzed).
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+        row = cursor.fetchone()
+    return row[0] if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for changelists of large tables. An unfiltered changelist uses
+    the planner's row estimate once it is above ADMIN_EXACT_COUNT_LIMIT;
+    otherwise rows are counted up to that limit only, so neither case runs a
+    full COUNT(*) over millions of rows. Pages past the limit are reached by
+    narrowing the filters.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        if not queryset.query.has_filters():
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                return estimate
+        return queryset.order_by()[:limit].count()
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class BackgroundDeletionMixin:
+    """
+    Deletes through background deletion jobs. The confirmation page lists
+    the selected objects only, instead of collecting the whole cascade.
+    """
+    confirmation_limit = 100
+
+    def get_deleted_objects(self, objs, request):
+        objs = list(objs[:self.confirmation_limit + 1]) if hasattr(objs, 'query') else list(objs)
+        perms_needed = set() if self.has_delete_permission(request) else {self.opts.verbose_name}
+        deleted = [str(obj) for obj in objs[:self.confirmation_limit]]
+        if len(objs) > self.confirmation_limit:
+            deleted.append("...")
+        return deleted, {}, perms_needed, []
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, self.model.objects.filter(pk=obj.pk))
+
+
+class ProductAttributeForm(forms.ModelForm):
+    """
+    Edits the attribute value as plain text; it is interned into
+    AttributeValue when the product attribute is saved.
+    """
+    value = forms.CharField(max_length=128)
+
+    class Meta:
+        model = ProductAttribute
+        fields = ('product', 'attribute', 'value')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.attribute_value_id is not None:
+            self.initial.setdefault('value', self.instance.value)
+
+    def save(self, commit=True):
+        self.instance.value = self.cleaned_data['value']
+        return super().save(commit)
+
+
+class ProductAttributeInline(admin.TabularInline):
+    model = ProductAttribute
+    form = ProductAttributeForm
+    fields = ('attribute', 'value')
+    autocomplete_fields = ('attribute',)
+    extra = 0
+
+
+def _change_stock_status(modeladmin, request, queryset, **values):
+    """
+    Applies `values` to the selected products with a single UPDATE. The
+    outbox events of the products whose stock state changes are written in
+    the same transaction, and modified_time is set so that the suggest index
+    picks the change up.
+    """
+    with transaction.atomic():
+        events = []
+        if values.get('quantity') == 0:
+            fields = ('id', 'sku', 'base_code', 'price', 'quantity', 'is_active')
+            for row in queryset.filter(quantity__gt=0).values(*fields).iterator(chunk_size=2000):
+                product = Product(**{**row, 'quantity': 0, 'is_active': False})
+                events += product_change_events(product, {'quantity': row['quantity']})
+        OutboxEvent.objects.bulk_create(events, batch_size=1000)
+        request_related_refresh(queryset.order_by().values_list('base_code', flat=True).distinct().iterator())
+        updated = queryset.update(**values, modified_time=timezone.now())
+    modeladmin.message_user(request, f"{updated} products updated.", messages.SUCCESS)
+
+
+@admin.action(description="Mark selected products out of stock")
+def mark_out_of_stock(modeladmin, request, queryset):
+    _change_stock_status(modeladmin, request, queryset, quantity=0, is_active=False)
+
+
+@admin.action(description="Activate selected products that are in stock")
+def activate_in_stock(modeladmin, request, queryset):
+    _change_stock_status(modeladmin, request, queryset.filter(quantity__gt=0), is_active=True)
+
+
+@admin.action(description="Deactivate selected products")
+def deactivate(modeladmin, request, queryset):
+    _change_stock_status(modeladmin, request, queryset, is_active=False)
+
+
+@admin.register(Product)
+class ProductAdmin(BackgroundDeletionMixin, LargeTableAdmin):
+    list_display = ('name', 'sku', 'base_code', 'category', 'price', 'quantity', 'is_active')
+    list_select_related = ('category',)
+    # Prefix/exact lookups can use the sku and base_code indexes.
+    search_fields = ('^name', '=sku', '=base_code')
     list_filter = ('is_active', 'category')
+    autocomplete_fields = ('category',)
+    readonly_fields = ('variant_options', 'variant_signature')
+    inlines = (ProductAttributeInline,)
+    actions = (mark_out_of_stock, activate_in_stock, deactivate)
+
+    def delete_queryset(self, request, queryset):
+        job = start_product_deletion(queryset.values_list('id', flat=True).iterator())
+        self.message_user(request, f"Deletion job {job.id} started for {job.total} products.", messages.INFO)
+
+
+@admin.register(Category)
+class CategoryAdmin(BackgroundDeletionMixin, admin.ModelAdmin):
+    list_display = ('name', 'modified_time')
+    search_fields = ('name',)
+
+    def delete_queryset(self, request, queryset):
+        for category in queryset:
+            job = start_category_deletion(category)
+            self.message_user(request, f"Deletion job {job.id} started for {category}.", messages.INFO)
+
+
+@admin.register(Attributes)
+class AttributesAdmin(admin.ModelAdmin):
+    list_display = ('name', 'is_visible', 'is_variant')
+    list_filter = ('is_visible', 'is_variant')
+    search_fields = ('name',)
+
+
+@admin.register(AttributeValue)
+class AttributeValueAdmin(LargeTableAdmin):
+    list_display = ('value', 'attribute')
+    list_select_related = ('attribute',)
+    list_filter = ('attribute',)
+    search_fields = ('^value',)
+    autocomplete_fields = ('attribute',)
+
 
-admin.site.register(Product)
-admin.site.register(Category)
-admin.site.register(Attributes)
-admin.site.register(ProductAttribute)
+@admin.register(ProductAttribute)
+class ProductAttributeAdmin(LargeTableAdmin):
+    form = ProductAttributeForm
+    list_display = ('product', 'attribute', 'value')
+    list_select_related = ('product', 'attribute', 'attribute_value')
+    list_filter = ('attribute',)
+    search_fields = ('=product__sku',)
+    autocomplete_fields = ('product', 'attribute')
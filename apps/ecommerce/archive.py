@@ -0,0 +1,86 @@
+import time
+from datetime import timedelta
+
+from django.db import models, router, transaction
+from django.utils import timezone
+
+from .images import release_images, retain_images
+from .models import ArchivedProduct, ArchivedProductAttribute, Product, ProductAttribute
+
+# Columns copied between the hot and the archive tables; the archive keeps the
+# original ids and timestamps.
+PRODUCT_FIELDS = [
+    field.attname for field in ArchivedProduct._meta.concrete_fields if field.name != 'archived_time'
+]
+ATTRIBUTE_FIELDS = [field.attname for field in ArchivedProductAttribute._meta.concrete_fields]
+
+
+def archivable_products(days):
+    """
+    Returns the products that have been inactive for more than `days` days
+    and have no stock movements waiting for compaction.
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    return Product.objects.filter(is_active=False, modified_time__lt=cutoff).exclude(stock_movements__isnull=False)
+
+
+def archive_inactive_products(days, batch_size=500, pause=0.0):
+    """
+    Moves long inactive products and their attributes to the archive tables.
+    Every batch is copied and removed from the hot tables in its own short
+    transaction, walking the products by id, so the job can run next to the
+    regular traffic; `pause` seconds are slept between batches to spread the
+    load further. Returns the number of archived products.
+    """
+    archived = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                archivable_products(days).select_for_update(skip_locked=True)
+                .filter(id__gt=last_id).order_by('id').values(*PRODUCT_FIELDS)[:batch_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            ids = [row['id'] for row in rows]
+            attributes = ProductAttribute.objects.filter(product_id__in=ids)
+            ArchivedProduct.objects.bulk_create([ArchivedProduct(**row) for row in rows])
+            # The archived rows keep the images referenced; deleting the
+            # products below releases their references.
+            retain_images(row['image'] for row in rows)
+            ArchivedProductAttribute.objects.bulk_create([
+                ArchivedProductAttribute(**row) for row in attributes.values(*ATTRIBUTE_FIELDS)
+            ])
+            # The products are deleted right after, so there is no variant
+            # signature to refresh for each removed attribute.
+            attributes._raw_delete(router.db_for_write(ProductAttribute))
+            Product.objects.filter(id__in=ids).delete()
+        archived += len(rows)
+        if pause:
+            time.sleep(pause)
+    return archived
+
+
+def restore_archived_product(product_id):
+    """
+    Moves an archived product and its attributes back to the hot tables under
+    their original ids and timestamps. Returns the restored product, or None
+    when the product is not archived (anymore).
+    """
+    with transaction.atomic():
+        row = (
+            ArchivedProduct.objects.select_for_update()
+            .filter(id=product_id).values(*PRODUCT_FIELDS).first()
+        )
+        if row is None:
+            return None
+        product = Product(**row)
+        # Raw saves keep the archived timestamps (like loaddata does) and are
+        # ignored by the catalog receivers; the product is still inactive here.
+        models.Model.save_base(product, raw=True, force_insert=True)
+        for attribute_row in ArchivedProductAttribute.objects.filter(product_id=product_id).values(*ATTRIBUTE_FIELDS):
+            models.Model.save_base(ProductAttribute(**attribute_row), raw=True, force_insert=True)
+        ArchivedProduct.objects.filter(id=product_id).delete()
+        release_images([row['image']])
+    return product
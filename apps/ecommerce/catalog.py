@@ -0,0 +1,58 @@
+from django.db.models import Min
+
+from .serializers import ArchivedProductSerializer, ProductSerializer
+
+BASE_CODE_CHUNK_SIZE = 500
+
+
+def group_by_base_code(queryset, variants_queryset):
+    """
+    Builds the storefront listing: one entry per base_code found in `queryset`
+    with its active variants taken from `variants_queryset`. The main product
+    (lowest id of the base_code within `queryset`) comes first; it is left out
+    when inactive. Variants are loaded with one query per chunk of base codes
+    instead of one query per base code.
+    """
+    main_ids = queryset.values('base_code').annotate(min_id=Min('id')).values_list('min_id', flat=True)
+    main_products = list(queryset.filter(id__in=list(main_ids)).order_by('id'))
+
+    variants_by_base_code = {}
+    main_product_ids = {product.id for product in main_products}
+    base_codes = [product.base_code for product in main_products]
+    for start in range(0, len(base_codes), BASE_CODE_CHUNK_SIZE):
+        chunk = base_codes[start:start + BASE_CODE_CHUNK_SIZE]
+        variants = variants_queryset.filter(base_code__in=chunk, is_active=True).order_by('id')
+        for variant in variants:
+            if variant.id not in main_product_ids:
+                variants_by_base_code.setdefault(variant.base_code, []).append(variant)
+
+    results = []
+    for main_product in main_products:
+        products = [main_product] if main_product.is_active else []
+        products += variants_by_base_code.get(main_product.base_code, [])
+        results.append({
+            'base_code': main_product.base_code,
+            'variants': ProductSerializer(products, many=True).data,
+        })
+    return results
+
+
+def add_archived_variants(results, archived_queryset):
+    """
+    Adds the archived products of `archived_queryset` to a storefront listing
+    built by group_by_base_code: under `archived` of their base_code entry, or
+    in a new entry when the whole base_code has been archived.
+    """
+    archived_by_base_code = {}
+    for product in archived_queryset.order_by('id'):
+        archived_by_base_code.setdefault(product.base_code, []).append(product)
+
+    for entry in results:
+        entry['archived'] = ArchivedProductSerializer(archived_by_base_code.pop(entry['base_code'], []), many=True).data
+    for base_code, products in archived_by_base_code.items():
+        results.append({
+            'base_code': base_code,
+            'variants': [],
+            'archived': ArchivedProductSerializer(products, many=True).data,
+        })
+    return results
@@ -0,0 +1,177 @@
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .images import release_images
+from .models import (
+    ArchivedProduct, ArchivedProductAttribute, Category, DeletionJob, Product, ProductAttribute, StockMovement,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _raw_delete(queryset):
+    return queryset._raw_delete(router.db_for_write(queryset.model))
+
+
+def delete_products(product_ids):
+    """
+    Deletes the given products in the current transaction. Their attributes
+    and stock movements are removed with raw deletes first: nothing references
+    those rows and their signals only maintain the (deleted) product, so the
+    cascade collector has nothing left to load but the products themselves,
+    whose delete signals still run.
+    """
+    _raw_delete(ProductAttribute.objects.filter(product_id__in=product_ids))
+    _raw_delete(StockMovement.objects.filter(product_id__in=product_ids))
+    Product.objects.filter(id__in=product_ids).delete()
+
+
+def _schedule(job):
+    if settings.DELETION_JOBS_IN_PROCESS:
+        transaction.on_commit(deletion_runner.request)
+    return job
+
+
+def start_category_deletion(category):
+    """
+    Creates the job deleting the category with its products and archived
+    products; it is run in the background.
+    """
+    job = DeletionJob.objects.create(
+        target=DeletionJob.Target.CATEGORY,
+        category_id=category.id,
+        total=Product.objects.filter(category_id=category.id).count(),
+    )
+    return _schedule(job)
+
+
+def start_product_deletion(product_ids):
+    """
+    Creates the job deleting the given products; it is run in the background.
+    """
+    product_ids = sorted(set(product_ids))
+    job = DeletionJob.objects.create(
+        target=DeletionJob.Target.PRODUCTS,
+        product_ids=product_ids,
+        total=len(product_ids),
+    )
+    return _schedule(job)
+
+
+def _product_chunks(job, batch_size):
+    if job.target == DeletionJob.Target.CATEGORY:
+        products = Product.objects.filter(category_id=job.category_id).order_by('id')
+        while chunk := list(products.values_list('id', flat=True)[:batch_size]):
+            yield chunk
+    else:
+        for start in range(0, len(job.product_ids), batch_size):
+            yield job.product_ids[start:start + batch_size]
+
+
+def run_deletion_job(job, batch_size=None):
+    """
+    Deletes the job's products chunk by chunk, one transaction per chunk,
+    recording the progress after each chunk. A category job finally removes
+    the category's archived products and the category itself.
+    """
+    batch_size = batch_size or settings.DELETION_BATCH_SIZE
+    try:
+        for chunk in _product_chunks(job, batch_size):
+            with transaction.atomic():
+                delete_products(chunk)
+                DeletionJob.objects.filter(id=job.id).update(
+                    deleted=F('deleted') + len(chunk), modified_time=timezone.now(),
+                )
+
+        if job.target == DeletionJob.Target.CATEGORY:
+            archived = ArchivedProduct.objects.filter(category_id=job.category_id).order_by('id')
+            while chunk := list(archived.values_list('id', flat=True)[:batch_size]):
+                with transaction.atomic():
+                    release_images(ArchivedProduct.objects.filter(id__in=chunk).values_list('image', flat=True))
+                    _raw_delete(ArchivedProductAttribute.objects.filter(product_id__in=chunk))
+                    _raw_delete(ArchivedProduct.objects.filter(id__in=chunk))
+            Category.objects.filter(id=job.category_id).delete()
+    except Exception as exc:
+        logger.exception("Deletion job %s failed", job.id)
+        DeletionJob.objects.filter(id=job.id).update(
+            status=DeletionJob.Status.FAILED, last_error=str(exc)[:1000], modified_time=timezone.now(),
+        )
+        return False
+
+    DeletionJob.objects.filter(id=job.id).update(
+        status=DeletionJob.Status.DONE, finished_time=timezone.now(), modified_time=timezone.now(),
+    )
+    return True
+
+
+def claim_deletion_job():
+    """
+    Takes the oldest pending job, or a running job whose worker stopped
+    making progress, and marks it running.
+    """
+    stale = timezone.now() - timedelta(seconds=settings.DELETION_JOB_STALE_SECONDS)
+    with transaction.atomic():
+        job = (
+            DeletionJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=DeletionJob.Status.PENDING) | Q(status=DeletionJob.Status.RUNNING, modified_time__lt=stale))
+            .order_by('id').first()
+        )
+        if job is not None:
+            job.status = DeletionJob.Status.RUNNING
+            job.save(update_fields=['status'])
+    return job
+
+
+def process_deletion_jobs(batch_size=None):
+    """
+    Runs deletion jobs until none is left. Returns the number of jobs run.
+    """
+    processed = 0
+    while (job := claim_deletion_job()) is not None:
+        run_deletion_job(job, batch_size)
+        processed += 1
+    return processed
+
+
+class DeletionRunner:
+    """
+    Processes deletion jobs in a background thread of the web process.
+    Requests made while the thread is running are picked up by it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._running = False
+
+    def request(self):
+        with self._lock:
+            self._dirty = True
+            if self._running:
+                return
+            self._running = True
+        threading.Thread(target=self._run, name='deletion-jobs', daemon=True).start()
+
+    def _run(self):
+        try:
+            while True:
+                with self._lock:
+                    if not self._dirty:
+                        self._running = False
+                        return
+                    self._dirty = False
+                try:
+                    process_deletion_jobs()
+                except Exception:
+                    logger.exception("Processing deletion jobs failed")
+        finally:
+            connections.close_all()
+
+
+deletion_runner = DeletionRunner()
@@ -0,0 +1,120 @@
+import os
+from collections import Counter
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import ArchivedProduct, ImageBlob, Product
+
+
+def register_image_blob(name, size):
+    """
+    Records a stored (or deduplicated) file. Touching `modified_time`
+    restarts the garbage collection grace period of an unreferenced file
+    that is being uploaded again. The UPDATE keeps the row locked until the
+    surrounding transaction ends, which ContentAddressedStorage relies on.
+    """
+    ImageBlob.objects.bulk_create([ImageBlob(name=name, size=size)], ignore_conflicts=True)
+    ImageBlob.objects.filter(name=name).update(modified_time=timezone.now())
+
+
+def retain_images(names):
+    """
+    Adds a reference to each of the image names (empty names are skipped).
+    """
+    counts = Counter(name for name in names if name)
+    if not counts:
+        return
+    ImageBlob.objects.bulk_create([ImageBlob(name=name) for name in counts], ignore_conflicts=True)
+    now = timezone.now()
+    for name, count in counts.items():
+        ImageBlob.objects.filter(name=name).update(ref_count=F('ref_count') + count, modified_time=now)
+
+
+def release_images(names):
+    """
+    Drops a reference from each of the image names. Files are not deleted
+    here but by `collect_unreferenced_images`, after a grace period.
+    """
+    now = timezone.now()
+    for name, count in Counter(name for name in names if name).items():
+        ImageBlob.objects.filter(name=name).update(
+            ref_count=Greatest(F('ref_count') - count, 0), modified_time=now,
+        )
+
+
+def recount_image_references():
+    """
+    Recomputes every ref_count from the product and archived product tables,
+    e.g. for images stored before reference counting or after QuerySet.update
+    calls that bypassed it. Returns the number of referenced images.
+    """
+    counts = Counter()
+    for model in (Product, ArchivedProduct):
+        rows = model.objects.exclude(image__isnull=True).exclude(image='').values('image').annotate(n=Count('id'))
+        counts.update({row['image']: row['n'] for row in rows})
+    with transaction.atomic():
+        ImageBlob.objects.exclude(name__in=list(counts)).update(ref_count=0)
+        ImageBlob.objects.bulk_create([ImageBlob(name=name) for name in counts], ignore_conflicts=True)
+        for name, count in counts.items():
+            ImageBlob.objects.filter(name=name).exclude(ref_count=count).update(
+                ref_count=count, modified_time=timezone.now(),
+            )
+    return len(counts)
+
+
+def adopt_orphaned_images(grace_seconds):
+    """
+    Registers the image files older than `grace_seconds` that have no
+    ImageBlob row, e.g. files stored by a product save whose transaction
+    rolled back, as unreferenced blobs; `collect_unreferenced_images` then
+    deletes them a grace period later unless they are uploaded again.
+    Inserting the row waits for an upload of the same content that is still
+    registering it. Returns the number of adopted files.
+    """
+    directory = Product._meta.get_field('image').upload_to.strip('/')
+    root = default_storage.path(directory)
+    cutoff = (timezone.now() - timedelta(seconds=grace_seconds)).timestamp()
+    adopted = 0
+    for path, _, filenames in os.walk(root):
+        files = {}
+        for filename in filenames:
+            full_path = os.path.join(path, filename)
+            stat = os.stat(full_path)
+            if stat.st_mtime < cutoff:
+                files[os.path.relpath(full_path, default_storage.location).replace(os.sep, '/')] = stat.st_size
+        if not files:
+            continue
+        known = set(ImageBlob.objects.filter(name__in=list(files)).values_list('name', flat=True))
+        orphans = [ImageBlob(name=name, size=size) for name, size in files.items() if name not in known]
+        ImageBlob.objects.bulk_create(orphans, ignore_conflicts=True)
+        adopted += len(orphans)
+    return adopted
+
+
+def collect_unreferenced_images(grace_seconds):
+    """
+    Deletes the files that have had no reference for `grace_seconds`.
+    Each file is deleted together with its ImageBlob row while the row is
+    locked, so an upload of the same content (which locks the row before
+    checking for the file) either keeps the file or writes it again.
+    Files without a row are adopted first, see `adopt_orphaned_images`.
+    Returns the number of deleted files.
+    """
+    adopt_orphaned_images(grace_seconds)
+    cutoff = timezone.now() - timedelta(seconds=grace_seconds)
+    deleted = 0
+    names = ImageBlob.objects.filter(ref_count=0, modified_time__lt=cutoff).values_list('name', flat=True)
+    for name in list(names.iterator()):
+        with transaction.atomic():
+            # Re-checked under the lock: a concurrent upload or reference keeps the file.
+            blob = ImageBlob.objects.select_for_update().filter(name=name, ref_count=0, modified_time__lt=cutoff)
+            if blob.exists():
+                default_storage.delete(name)
+                blob.delete()
+                deleted += 1
+    return deleted
@@ -0,0 +1,100 @@
+import logging
+import random
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Sum
+
+from .models import OutboxEvent, Product, StockMovement
+from .outbox import product_change_events
+
+logger = logging.getLogger(__name__)
+
+DELETE_CHUNK_SIZE = 1000
+
+
+def record_stock_movement(product_id, delta, reason=''):
+    """
+    Appends a stock movement for the product to the ledger without touching
+    the product row. The movement lands in a random counter slot.
+    """
+    return StockMovement.objects.create(
+        product_id=product_id,
+        delta=delta,
+        reason=reason,
+        slot=random.randrange(settings.INVENTORY_COUNTER_SLOTS),
+    )
+
+
+def pending_stock_delta(product_id):
+    return StockMovement.objects.filter(product_id=product_id).aggregate(total=Sum('delta'))['total'] or 0
+
+
+def available_quantity(product):
+    """
+    Returns the product's stock including movements not yet compacted.
+    A negative result means the product is oversold.
+    """
+    return product.quantity + pending_stock_delta(product.id)
+
+
+def compact_inventory(batch_size=500):
+    """
+    Folds the ledger into Product.quantity and Product.is_active.
+    Only movements up to the current high-water mark are folded, so writers
+    can keep appending while the job runs. Each batch of products is updated
+    in its own transaction together with the outbox events of the stock
+    transitions and the deletion of the folded movements.
+    Quantities never go below zero: movements taking more than the stock
+    (an oversell) are reported with an `oversold` outbox event carrying the
+    shortfall and a warning. A product running out of stock becomes
+    inactive and a product coming back in stock becomes active again.
+    Returns the number of products updated.
+    """
+    high_water = StockMovement.objects.aggregate(high_water=Max('id'))['high_water']
+    if high_water is None:
+        return 0
+
+    product_ids = list(
+        StockMovement.objects.filter(id__lte=high_water)
+        .values_list('product_id', flat=True).distinct().order_by('product_id')
+    )
+    updated = 0
+    for start in range(0, len(product_ids), batch_size):
+        chunk = product_ids[start:start + batch_size]
+        with transaction.atomic():
+            # The folded movements are read row by row and deleted by id: a
+            # movement committed after this read (even with a lower id) is
+            # left for the next run instead of being deleted unapplied.
+            movements = list(
+                StockMovement.objects.select_for_update()
+                .filter(id__lte=high_water, product_id__in=chunk).values_list('id', 'product_id', 'delta')
+            )
+            deltas = defaultdict(int)
+            for _, product_id, delta in movements:
+                deltas[product_id] += delta
+            products = list(Product.objects.select_for_update().filter(id__in=chunk))
+            events = []
+            for product in products:
+                previous = {'quantity': product.quantity}
+                quantity = product.quantity + deltas.get(product.id, 0)
+                product.quantity = max(0, quantity)
+                if quantity < 0:
+                    logger.warning("Product %s is oversold by %d units", product.sku, -quantity)
+                    events.append(OutboxEvent(
+                        event_type=OutboxEvent.EventType.OVERSOLD, sku=product.sku,
+                        payload={'sku': product.sku, 'base_code': product.base_code, 'shortfall': -quantity},
+                    ))
+                if product.quantity <= 0:
+                    product.is_active = False
+                elif previous['quantity'] <= 0:
+                    product.is_active = True
+                events += product_change_events(product, previous)
+            Product.objects.bulk_update(products, ['quantity', 'is_active'])
+            OutboxEvent.objects.bulk_create(events)
+            movement_ids = [movement_id for movement_id, _, _ in movements]
+            for offset in range(0, len(movement_ids), DELETE_CHUNK_SIZE):
+                StockMovement.objects.filter(id__in=movement_ids[offset:offset + DELETE_CHUNK_SIZE]).delete()
+            updated += len(products)
+    return updated
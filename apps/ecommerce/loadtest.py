@@ -0,0 +1,260 @@
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+
+import requests
+
+# (endpoint name, weight) of the simulated storefront traffic.
+DEFAULT_MIX = (
+    ('browse', 40),
+    ('search', 20),
+    ('detail', 35),
+    ('stock_update', 5),
+)
+# Saturates the low priority product list so that admission control sheds
+# it, while the detail lookups measure what the remaining traffic gets.
+LIST_SATURATION_MIX = (
+    ('browse', 90),
+    ('detail', 10),
+)
+SCENARIOS = {
+    'mixed': DEFAULT_MIX,
+    'list-saturation': LIST_SATURATION_MIX,
+}
+SEARCH_TERMS = ['Shirt', 'Jacket', 'Sneaker', 'Hoodie', 'Dress', 'Scarf', 'Boot', 'Coat', 'BC0001', 'BC00002']
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+@dataclass
+class EndpointStats:
+    latencies: list = field(default_factory=list)
+    errors: int = 0
+    shed: int = 0
+
+    def summary(self, duration):
+        latencies = sorted(self.latencies)
+        requests_count = len(latencies) + self.errors
+        return {
+            'requests': requests_count,
+            'rps': requests_count / duration if duration else 0.0,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'error_rate': self.errors / requests_count if requests_count else 0.0,
+            'shed': self.shed,
+        }
+
+
+class LoadDriver:
+    """
+    Drives a weighted request mix against `base_url` from `clients` threads,
+    each with its own keep-alive session, for `duration` seconds. Responses
+    with status >= 400 (or connection failures) count as errors; 429/503 are
+    also reported as shed by admission control.
+    """
+
+    def __init__(self, base_url, product_ids, clients=16, duration=10.0, mix=DEFAULT_MIX, seed=0, timeout=30.0):
+        self.base_url = base_url.rstrip('/')
+        self.product_ids = list(product_ids)
+        self.clients = clients
+        self.duration = duration
+        self.names = [name for name, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.seed = seed
+        self.timeout = timeout
+        self.stats = {name: EndpointStats() for name in self.names}
+        self.lock = threading.Lock()
+
+    def request(self, session, rng, name):
+        if name == 'browse':
+            return session.get(f"{self.base_url}/api/products/", timeout=self.timeout)
+        if name == 'search':
+            return session.get(
+                f"{self.base_url}/api/products/", params={'search': rng.choice(SEARCH_TERMS)}, timeout=self.timeout,
+            )
+        product_id = rng.choice(self.product_ids)
+        if name == 'detail':
+            return session.get(f"{self.base_url}/api/products/{product_id}/", timeout=self.timeout)
+        if name == 'stock_update':
+            return session.patch(
+                f"{self.base_url}/api/products/{product_id}/", json={'quantity': rng.randrange(0, 100)},
+                timeout=self.timeout,
+            )
+        raise ValueError(f"Unknown endpoint {name}")
+
+    def client(self, index, deadline):
+        rng = random.Random(self.seed * 1000 + index)
+        local = {name: EndpointStats() for name in self.names}
+        with requests.Session() as session:
+            while time.perf_counter() < deadline:
+                name = rng.choices(self.names, self.weights)[0]
+                started = time.perf_counter()
+                try:
+                    status = self.request(session, rng, name).status_code
+                except requests.RequestException:
+                    status = None
+                elapsed = time.perf_counter() - started
+                if status is None or status >= 400:
+                    local[name].errors += 1
+                    if status in (429, 503):
+                        local[name].shed += 1
+                else:
+                    local[name].latencies.append(elapsed)
+        with self.lock:
+            for name, stats in local.items():
+                self.stats[name].latencies += stats.latencies
+                self.stats[name].errors += stats.errors
+                self.stats[name].shed += stats.shed
+
+    def run(self):
+        """
+        Runs the load and returns `{endpoint: summary}` plus a `total` entry.
+        """
+        started = time.perf_counter()
+        deadline = started + self.duration
+        threads = [threading.Thread(target=self.client, args=(i, deadline)) for i in range(self.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        total = EndpointStats()
+        results = {}
+        for name, stats in self.stats.items():
+            results[name] = stats.summary(elapsed)
+            total.latencies += stats.latencies
+            total.errors += stats.errors
+            total.shed += stats.shed
+        results['total'] = total.summary(elapsed)
+        return results
+
+
+def list_saturation_violations(results, detail_p99_ms):
+    """
+    Checks the results of a `list-saturation` run: the list must have been
+    shed, while every detail lookup is served within `detail_p99_ms` at p99.
+    Returns the violated expectations as messages.
+    """
+    browse, detail = results['browse'], results['detail']
+    violations = []
+    if not browse['shed']:
+        violations.append("the product list was never shed, add clients to saturate it")
+    if detail['error_rate']:
+        violations.append(f"{detail['error_rate']:.1%} of the detail requests failed")
+    if detail['p99_ms'] > detail_p99_ms:
+        violations.append(f"detail p99 {detail['p99_ms']:.1f} ms exceeds {detail_p99_ms:g} ms")
+    return violations
+
+
+@dataclass
+class ServerConfig:
+    """
+    A server under test, written as `<kind>:<workers>[x<threads>]`, e.g.
+    `gunicorn-sync:4`, `gunicorn-gthread:2x8` or `uvicorn:2`.
+    """
+    kind: str
+    workers: int = 1
+    threads: int = 1
+
+    KINDS = ('gunicorn-sync', 'gunicorn-gthread', 'uvicorn')
+
+    @classmethod
+    def parse(cls, spec):
+        kind, _, size = spec.partition(':')
+        if kind not in cls.KINDS:
+            raise ValueError(f"Unknown server kind {kind!r}, expected one of {', '.join(cls.KINDS)}")
+        workers, _, threads = (size or '1').partition('x')
+        return cls(kind, int(workers), int(threads or 1))
+
+    @property
+    def label(self):
+        return f"{self.kind}:{self.workers}" + (f"x{self.threads}" if self.kind == 'gunicorn-gthread' else '')
+
+    def command(self, port):
+        bind = f"127.0.0.1:{port}"
+        if self.kind == 'uvicorn':
+            return [
+                sys.executable, '-m', 'uvicorn', 'example.asgi:application',
+                '--host', '127.0.0.1', '--port', str(port), '--workers', str(self.workers), '--log-level', 'warning',
+            ]
+        command = [
+            sys.executable, '-m', 'gunicorn', 'example.wsgi:application',
+            '--bind', bind, '--workers', str(self.workers), '--log-level', 'warning',
+        ]
+        if self.kind == 'gunicorn-gthread':
+            command += ['--worker-class', 'gthread', '--threads', str(self.threads)]
+        return command
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class RunningServer:
+    """
+    Starts a server subprocess on a free port and waits until it answers.
+    """
+
+    def __init__(self, config, env, cwd, startup_timeout=30.0):
+        self.config = config
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.process = subprocess.Popen(
+            config.command(self.port), env={**os.environ, **env}, cwd=cwd,
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        self.wait_until_ready(startup_timeout)
+
+    def wait_until_ready(self, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.config.label} exited: {self.process.stderr.read().decode()[-2000:]}")
+            try:
+                requests.get(f"{self.base_url}/api/categories/", timeout=1)
+                return
+            except requests.RequestException:
+                time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"{self.config.label} did not start within {timeout}s")
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def format_report(label, results):
+    lines = [
+        f"== {label}",
+        f"{'endpoint':<14}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}{'shed':>7}",
+    ]
+    for name, summary in results.items():
+        lines.append(
+            f"{name:<14}{summary['requests']:>10}{summary['rps']:>10.1f}{summary['p50_ms']:>10.1f}"
+            f"{summary['p95_ms']:>10.1f}{summary['p99_ms']:>10.1f}{summary['error_rate']:>8.1%}{summary['shed']:>7}"
+        )
+    return '\n'.join(lines)
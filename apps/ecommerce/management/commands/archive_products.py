@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.ecommerce.archive import archive_inactive_products
+
+
+class Command(BaseCommand):
+    help = "Moves long inactive products and their attributes to the archive tables in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.PRODUCT_ARCHIVE_AFTER_DAYS,
+                            help="Archive products inactive for more than this many days.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Products per transaction.")
+        parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between batches.")
+        parser.add_argument('--loop', action='store_true', help="Keep archiving periodically.")
+        parser.add_argument('--interval', type=float, default=3600.0, help="Seconds between runs with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            archived = archive_inactive_products(options['days'], options['batch_size'], options['pause'])
+            self.stdout.write(f"Archived {archived} products.")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,75 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from apps.ecommerce.inventory import available_quantity, compact_inventory, record_stock_movement
+from apps.ecommerce.models import Category, Product
+
+
+def plain_save(product_id):
+    with transaction.atomic():
+        product = Product.objects.select_for_update().get(id=product_id)
+        product.quantity -= 1
+        product.save(update_fields=['quantity', 'is_active'])
+
+
+def ledger(product_id):
+    record_stock_movement(product_id, -1, reason='bench')
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks concurrent stock decrements of a single hot SKU: "
+        "Product.save() under a row lock versus appending to the stock movement ledger."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--operations', type=int, default=200, help="Decrements per thread.")
+
+    def handle(self, *args, **options):
+        category = Category.objects.create(name="bench_inventory")
+        stock = options['threads'] * options['operations'] * 2 + 1
+        product = Product.objects.create(
+            name="Hot SKU", base_code="BENCH-HOT", sku=f"BENCH-HOT-{time.time_ns()}",
+            price=Decimal('1.00'), quantity=stock, category=category,
+        )
+        try:
+            for name, operation in (('save()', plain_save), ('ledger', ledger)):
+                elapsed, errors = self.run(operation, product.id, options['threads'], options['operations'])
+                total = options['threads'] * options['operations']
+                self.stdout.write(
+                    f"{name:8} {total} writes in {elapsed:.2f}s = {total / elapsed:,.0f} writes/s ({errors} errors)"
+                )
+            compact_inventory()
+            product.refresh_from_db()
+            self.stdout.write(f"Final quantity after compaction: {available_quantity(product)}")
+        finally:
+            category.delete()
+
+    def run(self, operation, product_id, threads, operations):
+        errors = []
+        start = threading.Barrier(threads + 1)
+
+        def worker():
+            start.wait()
+            try:
+                for _ in range(operations):
+                    try:
+                        operation(product_id)
+                    except Exception as exc:  # Report lock timeouts etc. instead of aborting the run.
+                        errors.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        start.wait()
+        began = time.perf_counter()
+        for thread in workers:
+            thread.join()
+        return time.perf_counter() - began, len(errors)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.ecommerce.snapshots import build_catalog_snapshots
+
+
+class Command(BaseCommand):
+    help = "Writes precompressed catalog JSON snapshots for nginx to serve directly."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--root', help="Output directory (defaults to CATALOG_SNAPSHOT_ROOT).")
+
+    def handle(self, *args, **options):
+        written = build_catalog_snapshots(options['root'])
+        self.stdout.write(f"Wrote {written} catalog snapshots.")
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.ecommerce.inventory import compact_inventory
+
+
+class Command(BaseCommand):
+    help = "Folds the append-only stock movement ledger into Product.quantity and is_active."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Products per transaction.")
+        parser.add_argument('--loop', action='store_true', help="Keep compacting periodically.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds between compactions with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            updated = compact_inventory(options['batch_size'])
+            self.stdout.write(f"Compacted stock movements of {updated} products.")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
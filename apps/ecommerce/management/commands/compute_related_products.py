@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.ecommerce.related import compute_related_products
+
+
+class Command(BaseCommand):
+    help = "Precomputes the related products of the queued (or, with --full, all) base codes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Recompute every base code.")
+        parser.add_argument('--top-k', type=int, help="Related products per base code (defaults to RELATED_PRODUCTS_TOP_K).")
+        parser.add_argument('--loop', action='store_true', help="Keep processing the refresh queue.")
+        parser.add_argument('--interval', type=float, default=60.0, help="Seconds between runs with --loop.")
+
+    def handle(self, *args, **options):
+        full = options['full']
+        while True:
+            computed = compute_related_products(full=full, top_k=options['top_k'])
+            self.stdout.write(f"Computed related products of {computed} base codes.")
+            if not options['loop']:
+                break
+            full = False
+            time.sleep(options['interval'])
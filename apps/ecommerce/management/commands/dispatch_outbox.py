@@ -0,0 +1,40 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ecommerce.outbox import OutboxDispatcher, lag_metrics
+
+
+class Command(BaseCommand):
+    help = "Delivers pending catalog outbox events to the configured webhook."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Webhook URL (defaults to OUTBOX_WEBHOOK_URL).")
+        parser.add_argument('--batch-size', type=int, help="Coalesced messages per HTTP request.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of running one cycle.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep when the outbox is empty.")
+        parser.add_argument('--stats', action='store_true', help="Only print the outbox lag metrics as JSON.")
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(json.dumps(lag_metrics()))
+            return
+
+        url = options['url'] or settings.OUTBOX_WEBHOOK_URL
+        if not url:
+            raise CommandError("No webhook URL configured; set OUTBOX_WEBHOOK_URL or pass --url.")
+
+        dispatcher = OutboxDispatcher(url=url, batch_size=options['batch_size'])
+        while True:
+            delivered = dispatcher.dispatch_once()
+            metrics = lag_metrics()
+            self.stdout.write(
+                f"delivered={delivered} pending={metrics['pending']} "
+                f"failed={metrics['failed']} lag={metrics['lag_seconds']:.1f}s"
+            )
+            if not options['loop']:
+                break
+            if not delivered:
+                time.sleep(options['interval'])
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.ecommerce.images import collect_unreferenced_images, recount_image_references
+
+
+class Command(BaseCommand):
+    help = "Deletes content-addressed product images that have been unreferenced for the grace period."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-seconds', type=int, default=settings.IMAGE_GC_GRACE_SECONDS,
+                            help="Keep unreferenced images this long (defaults to IMAGE_GC_GRACE_SECONDS).")
+        parser.add_argument('--recount', action='store_true',
+                            help="Recompute reference counts from the product tables first.")
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            referenced = recount_image_references()
+            self.stdout.write(f"Recounted references of {referenced} images.")
+        deleted = collect_unreferenced_images(options['grace_seconds'])
+        self.stdout.write(f"Deleted {deleted} unreferenced images.")
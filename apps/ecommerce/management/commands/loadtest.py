@@ -0,0 +1,116 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ecommerce.loadtest import (
+    SCENARIOS, LoadDriver, RunningServer, ServerConfig, format_report, list_saturation_violations,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Boots the app under gunicorn (sync/gthread) and uvicorn against a freshly seeded catalog "
+        "and reports req/s, p50/p95/p99 and error rates per endpoint and server configuration."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--server', action='append', dest='servers',
+            help="Server configuration <kind>:<workers>[x<threads>], repeatable "
+                 "(default: gunicorn-sync:4, gunicorn-gthread:2x8, uvicorn:4).",
+        )
+        parser.add_argument('--clients', type=int, default=16, help="Concurrent client threads.")
+        parser.add_argument('--duration', type=float, default=20.0, help="Seconds of load per configuration.")
+        parser.add_argument('--base-codes', type=int, default=500)
+        parser.add_argument('--variants', type=int, default=4)
+        parser.add_argument(
+            '--env', action='append', default=[], metavar='KEY=VALUE',
+            help="Extra environment for the servers, e.g. DB_ENGINE=... to test against PostgreSQL.",
+        )
+        parser.add_argument('--admission-control', action='store_true', help="Keep AdmissionControlMiddleware on.")
+        parser.add_argument(
+            '--scenario', choices=sorted(SCENARIOS), default='mixed',
+            help="Request mix. list-saturation floods /api/products/ with admission control on and fails "
+                 "unless the list is shed while detail lookups stay within --detail-p99-ms.",
+        )
+        parser.add_argument(
+            '--detail-p99-ms', type=float, default=250.0,
+            help="Detail p99 bound of the list-saturation scenario.",
+        )
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        try:
+            configs = [ServerConfig.parse(spec) for spec in options['servers'] or
+                       ['gunicorn-sync:4', 'gunicorn-gthread:2x8', 'uvicorn:4']]
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        with tempfile.TemporaryDirectory(prefix='loadtest-') as workdir:
+            env = {
+                'DEBUG': 'True',
+                'DB_ENGINE': 'django.db.backends.sqlite3',
+                'DB_NAME': str(Path(workdir) / 'loadtest.sqlite3'),
+                'ADMISSION_CONTROL_ENABLED': str(options['admission_control']),
+                'PROFILING_SAMPLE_RATE': '0',
+            }
+            saturation = options['scenario'] == 'list-saturation'
+            if saturation:
+                # The driver is a single client IP: lift its token bucket so
+                # that only the route concurrency limits shed requests.
+                env.update({
+                    'ADMISSION_CONTROL_ENABLED': 'True',
+                    'ADMISSION_CLIENT_RATE': '1000000',
+                    'ADMISSION_CLIENT_BURST': '1000000',
+                })
+            for item in options['env']:
+                key, sep, value = item.partition('=')
+                if not sep:
+                    raise CommandError(f"--env expects KEY=VALUE, got {item!r}")
+                env[key] = value
+
+            product_ids = self.prepare_database(env, workdir, options)
+            results = {}
+            violations = []
+            for config in configs:
+                self.stderr.write(f"Running {config.label} for {options['duration']}s ...")
+                with RunningServer(config, env, cwd=settings.BASE_DIR) as server:
+                    driver = LoadDriver(
+                        server.base_url, product_ids, options['clients'], options['duration'],
+                        mix=SCENARIOS[options['scenario']],
+                    )
+                    results[config.label] = driver.run()
+                if not options['json']:
+                    self.stdout.write(format_report(config.label, results[config.label]) + '\n')
+                if saturation:
+                    violations += [
+                        f"{config.label}: {message}"
+                        for message in list_saturation_violations(results[config.label], options['detail_p99_ms'])
+                    ]
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        if violations:
+            raise CommandError('\n'.join(violations))
+
+    def prepare_database(self, env, workdir, options):
+        ids_file = Path(workdir) / 'product_ids.json'
+        manage = [sys.executable, str(Path(settings.BASE_DIR) / 'manage.py')]
+        for command in (
+            ['migrate', '--noinput', '-v', '0'],
+            ['seed_catalog', '--base-codes', str(options['base_codes']),
+             '--variants', str(options['variants']), '--ids-file', str(ids_file)],
+        ):
+            completed = subprocess.run(
+                manage + command, env={**os.environ, **env}, cwd=settings.BASE_DIR,
+                capture_output=True, text=True,
+            )
+            if completed.returncode:
+                raise CommandError(f"{' '.join(command)} failed:\n{completed.stderr}")
+        return json.loads(ids_file.read_text())
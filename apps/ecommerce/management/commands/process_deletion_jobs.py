@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.ecommerce.deletion import process_deletion_jobs
+
+
+class Command(BaseCommand):
+    help = "Runs pending (and stalled) background category/product deletion jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help="Products per transaction (defaults to DELETION_BATCH_SIZE).")
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new jobs.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to sleep when there is no job.")
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_deletion_jobs(options['batch_size'])
+            self.stdout.write(f"Processed {processed} deletion jobs.")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from apps.ecommerce.models import Product
+
+
+class Command(BaseCommand):
+    help = "Deactivates products without stock that are still active, in batches of id ranges."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Id range scanned per UPDATE.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count drifted products.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        max_id = Product.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        fixed = 0
+        for start in range(0, max_id + 1, batch_size):
+            drifted = Product.objects.filter(
+                id__gte=start, id__lt=start + batch_size, quantity__lte=0, is_active=True,
+            )
+            fixed += drifted.count() if options['dry_run'] else drifted.update(is_active=False)
+
+        verb = "Would deactivate" if options['dry_run'] else "Deactivated"
+        self.stdout.write(f"{verb} {fixed} products without stock.")
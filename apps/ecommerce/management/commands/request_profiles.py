@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ecommerce.profiling import ProfileStore, hottest_functions, make_profile_token
+
+
+class Command(BaseCommand):
+    help = "Lists captured request profiles and summarizes their hottest functions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('profile_ids', nargs='*', help="Profiles to summarize (default: all matching).")
+        parser.add_argument('--path', help="Only use profiles whose request path starts with this prefix.")
+        parser.add_argument('--top', type=int, default=0, help="Print the N hottest functions of the selection.")
+        parser.add_argument('--sort', choices=['tottime', 'cumtime'], default='tottime')
+        parser.add_argument('--token', action='store_true', help="Print a signed X-Profile-Token header value.")
+
+    def handle(self, *args, **options):
+        if options['token']:
+            self.stdout.write(make_profile_token())
+            return
+
+        store = ProfileStore()
+        profile_ids = options['profile_ids'] or store.ids()
+        missing = set(profile_ids) - set(store.ids())
+        if missing:
+            raise CommandError(f"Unknown profiles: {', '.join(sorted(missing))}")
+
+        selected = []
+        for profile_id in profile_ids:
+            metadata = store.metadata(profile_id)
+            if options['path'] and not metadata.get('path', '').startswith(options['path']):
+                continue
+            selected.append(profile_id)
+            self.stdout.write(
+                f"{profile_id}  {metadata.get('method', '?'):6} {metadata.get('status', '?')} "
+                f"{metadata.get('duration_ms', 0):9.1f}ms  sql={metadata.get('sql_count', 0)}/"
+                f"{metadata.get('sql_ms', 0):.1f}ms  {metadata.get('path', '')}"
+            )
+
+        if options['top'] and selected:
+            self.stdout.write(f"\nHottest functions by {options['sort']} across {len(selected)} profiles:")
+            for location, calls, tottime, cumtime in hottest_functions(
+                store.stats(selected), options['top'], options['sort'],
+            ):
+                self.stdout.write(f"{tottime * 1000:10.2f}ms {cumtime * 1000:10.2f}ms {calls:8}  {location}")
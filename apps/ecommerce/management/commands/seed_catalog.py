@@ -0,0 +1,72 @@
+import json
+import random
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.ecommerce.models import Attributes, Category, Product, ProductAttribute
+
+COLORS = ['Black', 'White', 'Red', 'Blue', 'Green', 'Grey', 'Navy', 'Beige']
+SIZES = ['XS', 'S', 'M', 'L', 'XL', 'XXL']
+MATERIALS = ['Cotton', 'Wool', 'Linen', 'Polyester', 'Leather', 'Denim']
+NOUNS = ['Shirt', 'Jacket', 'Sneaker', 'Hoodie', 'Dress', 'Scarf', 'Boot', 'Coat', 'Skirt', 'Cap']
+
+
+class Command(BaseCommand):
+    help = "Seeds a synthetic catalog (categories, variant products, attributes) for benchmarks and load tests."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--base-codes', type=int, default=1000, help="Number of product groups.")
+        parser.add_argument('--variants', type=int, default=4, help="Products per base_code.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--ids-file', help="Write the created product ids to this JSON file.")
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+
+        categories = Category.objects.bulk_create([
+            Category(name=f"Category {i}", description=f"Synthetic category {i}")
+            for i in range(options['categories'])
+        ])
+        color, size, material = (
+            Attributes.objects.get_or_create(name=name, defaults={'is_variant': is_variant})[0]
+            for name, is_variant in (('Color', True), ('Size', True), ('Material', False))
+        )
+
+        products = []
+        for i in range(options['base_codes']):
+            noun = rng.choice(NOUNS)
+            category = categories[i % len(categories)]
+            price = Decimal(rng.randrange(500, 50000)) / 100
+            for j in range(options['variants']):
+                quantity = rng.choice([0, rng.randrange(1, 200)]) if rng.random() < 0.2 else rng.randrange(1, 200)
+                products.append(Product(
+                    base_code=f"BC{i:06d}",
+                    sku=f"BC{i:06d}-{j:02d}",
+                    name=f"{noun} {i}",
+                    price=price,
+                    quantity=quantity,
+                    is_active=quantity > 0,
+                    category=category,
+                ))
+        products = Product.objects.bulk_create(products, batch_size=batch_size)
+
+        attributes = []
+        for product in products:
+            variant = int(product.sku.rsplit('-', 1)[1])
+            attributes += [
+                ProductAttribute(product=product, attribute=color, value=COLORS[variant % len(COLORS)]),
+                ProductAttribute(product=product, attribute=size, value=SIZES[variant % len(SIZES)]),
+                ProductAttribute(product=product, attribute=material, value=rng.choice(MATERIALS)),
+            ]
+        ProductAttribute.objects.bulk_create(attributes, batch_size=batch_size)
+
+        if options['ids_file']:
+            with open(options['ids_file'], 'w') as ids_file:
+                json.dump([product.id for product in products], ids_file)
+        self.stdout.write(f"Seeded {len(categories)} categories and {len(products)} products.")
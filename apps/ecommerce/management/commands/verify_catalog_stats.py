@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.ecommerce.stats import verify_catalog_stats
+
+
+class Command(BaseCommand):
+    help = "Compares the catalog stats with the product table and repairs the groups that drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report the drifted groups.")
+        parser.add_argument('--loop', action='store_true', help="Keep verifying periodically.")
+        parser.add_argument('--interval', type=float, default=3600.0, help="Seconds between runs with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            drifted = verify_catalog_stats(repair=not options['dry_run'])
+            for scope, key in drifted:
+                self.stdout.write(f"Drifted: {scope} {key}")
+            action = "found" if options['dry_run'] else "repaired"
+            self.stdout.write(f"{len(drifted)} drifted catalog stats groups {action}.")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
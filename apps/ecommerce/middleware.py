@@ -0,0 +1,221 @@
+import cProfile
+import math
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.signing import BadSignature
+from django.db import connections
+from django.http import JsonResponse
+
+from .profiling import ProfileStore, QueryTimer, is_valid_profile_token
+from .routers import replica_reads
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets safe requests read the catalog from a replica, except for clients
+    that wrote recently: a successful write sets a signed cookie and, while
+    it is younger than `DATABASE_REPLICA_STICKY_SECONDS`, that client's reads
+    stay on the primary so it always reads its own writes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        is_write = request.method not in SAFE_METHODS
+        with replica_reads(not is_write and not self.is_pinned(request)):
+            response = self.get_response(request)
+
+        if is_write and response.status_code < 400:
+            response.set_signed_cookie(
+                settings.DATABASE_REPLICA_STICKY_COOKIE, '1',
+                salt=settings.DATABASE_REPLICA_STICKY_COOKIE,
+                max_age=settings.DATABASE_REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def is_pinned(self, request):
+        try:
+            return request.get_signed_cookie(
+                settings.DATABASE_REPLICA_STICKY_COOKIE,
+                salt=settings.DATABASE_REPLICA_STICKY_COOKIE,
+                max_age=settings.DATABASE_REPLICA_STICKY_SECONDS,
+            ) == '1'
+        except (KeyError, BadSignature):
+            return False
+
+
+class TokenBucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class AdmissionControlMiddleware:
+    """
+    Sheds load before a request reaches Django's heavier middleware and views.
+
+    - Every request is classified by the first matching entry of
+      `ADMISSION_CONTROL['ROUTES']` (method + path regex). A route may cap its
+      own concurrency, has a token cost and a priority.
+    - Low priority (expensive) routes are only admitted while the process has
+      fewer than `LOW_PRIORITY_MAX_INFLIGHT` requests in flight, which keeps
+      worker threads free for cheap lookups. Overload answers 503.
+    - Each client IP has a token bucket refilled at `CLIENT_RATE` tokens per
+      second up to `CLIENT_BURST`. An empty bucket answers 429. The IP is
+      REMOTE_ADDR, or the `CLIENT_IP_HEADER` set by a trusted reverse proxy;
+      headers the client controls are never used. At most
+      `MAX_TRACKED_CLIENTS` buckets are kept, least recently used first out.
+
+    Both rejections carry a `Retry-After` header. Limits are per process, so
+    they only matter for threaded/async workers.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = settings.ADMISSION_CONTROL
+        self.enabled = config.get('ENABLED', True)
+        self.max_inflight = config.get('MAX_INFLIGHT', 64)
+        self.low_priority_max_inflight = config.get('LOW_PRIORITY_MAX_INFLIGHT', self.max_inflight // 2)
+        self.client_rate = float(config.get('CLIENT_RATE', 20.0))
+        self.client_burst = float(config.get('CLIENT_BURST', 40))
+        self.max_clients = config.get('MAX_TRACKED_CLIENTS', 10000)
+        self.client_ip_header = config.get('CLIENT_IP_HEADER') or 'REMOTE_ADDR'
+        self.routes = [
+            {
+                'pattern': re.compile(route['pattern']),
+                'methods': frozenset(route.get('methods', ())),
+                'max_concurrency': route.get('max_concurrency'),
+                'cost': float(route.get('cost', 1)),
+                'low_priority': route.get('priority') == 'low',
+                'inflight': 0,
+            }
+            for route in config.get('ROUTES', ())
+        ]
+        self.default_route = {
+            'max_concurrency': None, 'cost': 1.0, 'low_priority': False, 'inflight': 0,
+        }
+        self.inflight = 0
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        route = self.match(request)
+        rejection = self.admit(request, route)
+        if rejection is not None:
+            return rejection
+        try:
+            return self.get_response(request)
+        finally:
+            with self.lock:
+                self.inflight -= 1
+                route['inflight'] -= 1
+
+    def match(self, request):
+        for route in self.routes:
+            if (not route['methods'] or request.method in route['methods']) and route['pattern'].match(request.path_info):
+                return route
+        return self.default_route
+
+    def client_key(self, request):
+        return request.META.get(self.client_ip_header) or request.META.get('REMOTE_ADDR', '')
+
+    def admit(self, request, route):
+        key = self.client_key(request)
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                while len(self.buckets) >= self.max_clients:
+                    self.buckets.popitem(last=False)
+                bucket = self.buckets[key] = TokenBucket(self.client_burst, now)
+            else:
+                self.buckets.move_to_end(key)
+                bucket.tokens = min(self.client_burst, bucket.tokens + (now - bucket.updated) * self.client_rate)
+                bucket.updated = now
+            if bucket.tokens < route['cost']:
+                retry_after = (route['cost'] - bucket.tokens) / self.client_rate if self.client_rate else 60
+                return self.reject(429, "Request rate limit exceeded.", retry_after)
+
+            limit = self.low_priority_max_inflight if route['low_priority'] else self.max_inflight
+            if self.inflight >= limit or (
+                route['max_concurrency'] is not None and route['inflight'] >= route['max_concurrency']
+            ):
+                return self.reject(503, "Server is busy, please retry.", 1)
+
+            bucket.tokens -= route['cost']
+            self.inflight += 1
+            route['inflight'] += 1
+        return None
+
+    def reject(self, status, detail, retry_after):
+        response = JsonResponse({'detail': detail}, status=status)
+        response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Captures a cProfile profile of a request, including DRF serialization and
+    ORM time, when the request carries a valid signed `X-Profile-Token`
+    header (see `manage.py request_profiles --token`) or is picked by
+    `REQUEST_PROFILING['SAMPLE_RATE']`. Profiles are written to the
+    ProfileStore ring buffer and their id is returned as `X-Profile-Id`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.REQUEST_PROFILING['SAMPLE_RATE']
+        self.store = ProfileStore()
+
+    def should_profile(self, request):
+        token = request.META.get('HTTP_X_PROFILE_TOKEN')
+        if token:
+            return is_valid_profile_token(token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            try:
+                profiler.enable()
+            except ValueError:  # Another profiler is already active in this thread.
+                return self.get_response(request)
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - started
+
+        response['X-Profile-Id'] = self.store.save(profiler, {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 3),
+            'sql_count': timer.count,
+            'sql_ms': round(timer.seconds * 1000, 3),
+            'time': time.time(),
+        })
+        return response
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-19 02:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0004_alter_productattribute_product'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+                ('modified_time', models.DateTimeField(auto_now=True, db_index=True)),
+                ('event_type', models.CharField(choices=[('price_changed', 'Price changed'), ('stock_out', 'Stock out'), ('back_in_stock', 'Back in stock')], max_length=32)),
+                ('sku', models.CharField(db_index=True, max_length=64)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('delivered', 'Delivered'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('available_time', models.DateTimeField(default=django.utils.timezone.now)),
+                ('delivered_time', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'available_time'], name='outbox_status_available_idx')],
+            },
+        ),
+    ]
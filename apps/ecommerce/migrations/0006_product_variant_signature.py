@@ -0,0 +1,55 @@
+# Generated by Django 5.2.3 on 2026-10-19 02:46
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def populate_variant_signatures(apps, schema_editor):
+    Product = apps.get_model('ecommerce', 'Product')
+    ProductAttribute = apps.get_model('ecommerce', 'ProductAttribute')
+
+    product_ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(product_ids), 500):
+        chunk = product_ids[start:start + 500]
+        options = {product_id: {} for product_id in chunk}
+        rows = ProductAttribute.objects.filter(
+            product_id__in=chunk, attribute__is_variant=True,
+        ).values_list('product_id', 'attribute__name', 'value')
+        for product_id, name, value in rows:
+            options[product_id][name.strip().casefold()] = value.strip().casefold()
+
+        products = []
+        for product_id, normalized in options.items():
+            canonical = '|'.join(f"{name}={normalized[name]}" for name in sorted(normalized))
+            products.append(Product(
+                id=product_id,
+                variant_options=normalized,
+                variant_signature=hashlib.sha1(canonical.encode()).hexdigest(),
+            ))
+        Product.objects.bulk_update(products, ['variant_options', 'variant_signature'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0005_outboxevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='variant_options',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='variant_signature',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['base_code', 'variant_signature'], name='product_variant_signature_idx'),
+        ),
+        migrations.RunPython(populate_variant_signatures, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-19 02:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0006_product_variant_signature'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField(default=0)),
+                ('delta', models.IntegerField()),
+                ('reason', models.CharField(blank=True, default='', max_length=32)),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='ecommerce.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'slot'], name='stockmovement_product_slot_idx')],
+            },
+        ),
+    ]
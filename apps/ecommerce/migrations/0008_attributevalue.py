@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-19 03:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0007_stockmovement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttributeValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+                ('modified_time', models.DateTimeField(auto_now=True, db_index=True)),
+                ('value', models.CharField(max_length=128)),
+                ('attribute', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='values', to='ecommerce.attributes')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='attributevalue',
+            constraint=models.UniqueConstraint(fields=('attribute', 'value'), name='attributevalue_attribute_value_uniq'),
+        ),
+        migrations.AddField(
+            model_name='productattribute',
+            name='attribute_value',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='product_attributes', to='ecommerce.attributevalue'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+from django.db import migrations, transaction
+
+BATCH_SIZE = 2000
+
+
+def intern_attribute_values(apps, schema_editor):
+    """
+    Points every ProductAttribute at its interned AttributeValue.
+    Works in batches, each in its own transaction, and only picks rows that
+    are not converted yet, so an interrupted run resumes where it stopped.
+    """
+    AttributeValue = apps.get_model('ecommerce', 'AttributeValue')
+    ProductAttribute = apps.get_model('ecommerce', 'ProductAttribute')
+    db = schema_editor.connection.alias
+
+    while True:
+        with transaction.atomic(using=db):
+            rows = list(
+                ProductAttribute.objects.using(db).filter(attribute_value__isnull=True)
+                .order_by('id').values_list('id', 'attribute_id', 'value')[:BATCH_SIZE]
+            )
+            if not rows:
+                break
+
+            pairs = {(attribute_id, value) for _, attribute_id, value in rows}
+            AttributeValue.objects.using(db).bulk_create(
+                [AttributeValue(attribute_id=attribute_id, value=value) for attribute_id, value in pairs],
+                ignore_conflicts=True,
+            )
+            value_ids = {}
+            for attribute_id in {attribute_id for attribute_id, _ in pairs}:
+                values = [value for pair_attribute_id, value in pairs if pair_attribute_id == attribute_id]
+                for value_id, value in AttributeValue.objects.using(db).filter(
+                    attribute_id=attribute_id, value__in=values,
+                ).values_list('id', 'value'):
+                    value_ids[(attribute_id, value)] = value_id
+
+            rows_by_value = {}
+            for row_id, attribute_id, value in rows:
+                rows_by_value.setdefault(value_ids[(attribute_id, value)], []).append(row_id)
+            for value_id, row_ids in rows_by_value.items():
+                ProductAttribute.objects.using(db).filter(id__in=row_ids).update(attribute_value_id=value_id)
+
+
+def restore_values(apps, schema_editor):
+    ProductAttribute = apps.get_model('ecommerce', 'ProductAttribute')
+    db = schema_editor.connection.alias
+    for product_attribute in ProductAttribute.objects.using(db).select_related('attribute_value').iterator():
+        ProductAttribute.objects.using(db).filter(id=product_attribute.id).update(
+            value=product_attribute.attribute_value.value,
+        )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('ecommerce', '0008_attributevalue'),
+    ]
+
+    operations = [
+        migrations.RunPython(intern_attribute_values, restore_values),
+    ]
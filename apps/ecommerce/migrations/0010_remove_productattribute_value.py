@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-19 03:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0009_intern_attribute_values'),
+    ]
+
+    operations = [
+        # Gives the column a default first so that the migration can be reversed.
+        migrations.AlterField(
+            model_name='productattribute',
+            name='value',
+            field=models.CharField(default='', max_length=128),
+        ),
+        migrations.RemoveField(
+            model_name='productattribute',
+            name='value',
+        ),
+        migrations.AlterField(
+            model_name='productattribute',
+            name='attribute_value',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='product_attributes', to='ecommerce.attributevalue'),
+        ),
+    ]
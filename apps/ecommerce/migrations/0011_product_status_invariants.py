@@ -0,0 +1,52 @@
+# Generated by Django 5.2.3 on 2026-10-19 02:51
+
+from django.db import migrations, models
+
+from apps.ecommerce.triggers import install_product_status_trigger, remove_product_status_trigger
+
+
+def deactivate_products_without_stock(apps, schema_editor):
+    Product = apps.get_model('ecommerce', 'Product')
+    Product.objects.using(schema_editor.connection.alias).filter(quantity__lte=0, is_active=True).update(is_active=False)
+
+
+def check_product_prices(apps, schema_editor):
+    """
+    Stops the migration with a report of the products the price constraint
+    would reject, instead of failing on an IntegrityError. Their prices have
+    to be corrected before migrating.
+    """
+    Product = apps.get_model('ecommerce', 'Product')
+    invalid = Product.objects.using(schema_editor.connection.alias).filter(price__lte=0)
+    count = invalid.count()
+    if count:
+        skus = ', '.join(invalid.order_by('id').values_list('sku', flat=True)[:20])
+        raise RuntimeError(
+            f"{count} products have a non-positive price (e.g. {skus}); "
+            f"set a positive price for them before running this migration."
+        )
+
+
+def install_trigger(apps, schema_editor):
+    install_product_status_trigger(schema_editor.connection, apps.get_model('ecommerce', 'Product')._meta.db_table)
+
+
+def remove_trigger(apps, schema_editor):
+    remove_product_status_trigger(schema_editor.connection, apps.get_model('ecommerce', 'Product')._meta.db_table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0010_remove_productattribute_value'),
+    ]
+
+    operations = [
+        migrations.RunPython(deactivate_products_without_stock, migrations.RunPython.noop),
+        migrations.RunPython(check_product_prices, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.CheckConstraint(condition=models.Q(('price__gt', 0)), name='product_price_gt_zero'),
+        ),
+        migrations.RunPython(install_trigger, remove_trigger),
+    ]
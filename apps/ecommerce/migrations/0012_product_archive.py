@@ -0,0 +1,45 @@
+# Generated by Django 5.2.3 on 2026-10-19 02:54
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0011_product_status_invariants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedProduct',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('base_code', models.CharField(db_index=True, max_length=64)),
+                ('sku', models.CharField(max_length=64, unique=True)),
+                ('image', models.ImageField(null=True, upload_to='media/products/')),
+                ('name', models.CharField(max_length=128)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('is_active', models.BooleanField(default=False)),
+                ('variant_options', models.JSONField(blank=True, default=dict)),
+                ('variant_signature', models.CharField(blank=True, default='', max_length=40)),
+                ('created_time', models.DateTimeField()),
+                ('modified_time', models.DateTimeField()),
+                ('archived_time', models.DateTimeField(default=django.utils.timezone.now)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_products', to='ecommerce.category')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedProductAttribute',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('created_time', models.DateTimeField()),
+                ('modified_time', models.DateTimeField()),
+                ('attribute', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_product_attributes', to='ecommerce.attributes')),
+                ('attribute_value', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_product_attributes', to='ecommerce.attributevalue')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_attributes', to='ecommerce.archivedproduct')),
+            ],
+        ),
+    ]
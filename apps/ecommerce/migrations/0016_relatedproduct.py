@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-19 03:04
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0015_imageblob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedProductRefresh',
+            fields=[
+                ('base_code', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('requested_time', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RelatedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('base_code', models.CharField(max_length=64)),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('computed_time', models.DateTimeField(default=django.utils.timezone.now)),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ecommerce.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('base_code', 'rank'), name='relatedproduct_base_code_rank_uniq')],
+            },
+        ),
+    ]
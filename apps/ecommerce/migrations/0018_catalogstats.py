@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-19 03:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0017_product_image_blank'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('category', 'Category'), ('base_code', 'Base code')], max_length=16)),
+                ('key', models.CharField(max_length=64)),
+                ('product_count', models.IntegerField(default=0)),
+                ('in_stock_count', models.IntegerField(default=0)),
+                ('total_stock', models.BigIntegerField(default=0)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('modified_time', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('scope', 'key'), name='catalogstats_scope_key_uniq')],
+            },
+        ),
+    ]
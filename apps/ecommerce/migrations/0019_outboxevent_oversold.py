@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 03:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0018_catalogstats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outboxevent',
+            name='event_type',
+            field=models.CharField(choices=[('price_changed', 'Price changed'), ('stock_out', 'Stock out'), ('back_in_stock', 'Back in stock'), ('oversold', 'Oversold')], max_length=32),
+        ),
+    ]
@@ -1,4 +1,7 @@
-from django.db import models
+from functools import partial
+
+from django.db import IntegrityError, models, router, transaction
+from django.utils import timezone
 
 
 class BaseModel(models.Model):
@@ -48,6 +51,81 @@ class Attributes(BaseModel):
         return f"{self.name} ({'Variant' if self.is_variant else 'Attribute'})"
 
 
+class AttributeValueManager(models.Manager):
+    def intern(self, attribute_id, value):
+        """
+        Returns the AttributeValue for `(attribute_id, value)`, creating it if needed.
+        """
+        return self.get_or_create(attribute_id=attribute_id, value=value)[0]
+
+    def intern_many(self, pairs, batch_size=500):
+        """
+        Interns many `(attribute_id, value)` pairs at once and returns a
+        `{(attribute_id, value): id}` mapping.
+        """
+        pairs = set(pairs)
+        self.bulk_create(
+            [AttributeValue(attribute_id=attribute_id, value=value) for attribute_id, value in pairs],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        values_by_attribute = {}
+        for attribute_id, value in pairs:
+            values_by_attribute.setdefault(attribute_id, []).append(value)
+        ids = {}
+        for attribute_id, values in values_by_attribute.items():
+            for start in range(0, len(values), batch_size):
+                rows = self.filter(
+                    attribute_id=attribute_id, value__in=values[start:start + batch_size],
+                ).values_list('id', 'value')
+                for value_id, value in rows:
+                    ids[(attribute_id, value)] = value_id
+        return ids
+
+
+class AttributeValue(BaseModel):
+    """
+    AttributeValue stores each distinct value of an attribute once
+    (for example "Red" for Color or "XL" for Size).
+    ProductAttribute rows reference it by id instead of repeating the text,
+    which keeps the table and its indexes small and lets attribute filtering
+    and faceting join and compare on integers.
+    """
+    attribute = models.ForeignKey(Attributes, on_delete=models.CASCADE, related_name='values')
+    value = models.CharField(max_length=128)
+
+    objects = AttributeValueManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['attribute', 'value'], name='attributevalue_attribute_value_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.attribute.name}: {self.value}"
+
+
+class ProductAttributeQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Interns the values assigned through `ProductAttribute.value` before
+        inserting and refreshes the variant signatures of the products
+        afterwards, since bulk_create does not call save() or send signals.
+        """
+        from .variants import refresh_variant_signatures
+
+        objs = list(objs)
+        pending = [obj for obj in objs if obj._pending_value is not None]
+        if pending:
+            ids = AttributeValue.objects.intern_many((obj.attribute_id, obj._pending_value) for obj in pending)
+            for obj in pending:
+                obj.attribute_value_id = ids[(obj.attribute_id, obj._pending_value)]
+                obj._pending_value = None
+        objs = super().bulk_create(objs, *args, **kwargs)
+        refresh_variant_signatures({obj.product_id for obj in objs if obj.product_id is not None})
+        return objs
+
+
 class ProductAttribute(BaseModel):
     """
     ProductAttribute is used to link products with their attributes.
@@ -55,10 +133,37 @@ class ProductAttribute(BaseModel):
     such as color, size, or material.
     Each product can have multiple attributes, and each attribute can be linked to multiple products.
     This model is essential for managing product variations and attributes in an e-commerce system.
+    The value itself is interned in AttributeValue; the `value` property reads
+    and assigns it as plain text and the value is interned on save.
     """
     product = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='product_attributes', null=True)
     attribute = models.ForeignKey(Attributes, on_delete=models.CASCADE, related_name='product_attributes')
-    value = models.CharField(max_length=128)
+    attribute_value = models.ForeignKey(AttributeValue, on_delete=models.PROTECT, related_name='product_attributes')
+
+    objects = ProductAttributeQuerySet.as_manager()
+
+    _pending_value = None
+
+    @property
+    def value(self):
+        if self._pending_value is not None:
+            return self._pending_value
+        if self.attribute_value_id is None:
+            return None
+        return self.attribute_value.value
+
+    @value.setter
+    def value(self, value):
+        self._pending_value = value
+
+    def save(self, *args, **kwargs):
+        if self._pending_value is not None:
+            self.attribute_value = AttributeValue.objects.intern(self.attribute_id, self._pending_value)
+            self._pending_value = None
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None and "attribute_value" not in update_fields:
+                kwargs["update_fields"] = [*update_fields, "attribute_value"]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.product.name} - {self.attribute.name}: {self.value}"
@@ -77,6 +182,56 @@ class Category(BaseModel):
         return self.name
     
 
+PRICE_CONSTRAINT_NAME = 'product_price_gt_zero'
+PRICE_ERROR_MESSAGE = "Product price must be greater than zero."
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    Bulk write paths skip the pre_save receiver, so the price rule is enforced
+    by the `product_price_gt_zero` check constraint. Its violation is raised
+    as the same ValueError that Product.save() raises.
+    They also skip the post_save receivers, so updates touching category,
+    base_code, price or quantity apply their CatalogStats deltas here, and
+    auto_now, so updates (and bulk_update) set modified_time here.
+    """
+
+    def _translate_price_error(self, method, *args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        except IntegrityError as exc:
+            if PRICE_CONSTRAINT_NAME in str(exc):
+                raise ValueError(PRICE_ERROR_MESSAGE) from exc
+            raise
+
+    def update(self, **kwargs):
+        from .stats import STATE_FIELDS, update_with_stats
+
+        # Like auto_now on save(): the archive job and the suggest index sync
+        # rely on modified_time moving with every write.
+        kwargs.setdefault('modified_time', timezone.now())
+        update = partial(self._translate_price_error, super().update, **kwargs)
+        if not STATE_FIELDS.intersection(kwargs):
+            return update()
+        return update_with_stats(self, update)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .stats import apply_stats_changes, product_state, refresh_catalog_stats, stats_keys
+
+        objs = self._translate_price_error(super().bulk_create, objs, *args, **kwargs)
+        states = [product_state(obj) for obj in objs]
+        if kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts'):
+            # It is unknown which rows were inserted, so the groups are recounted.
+            refresh_catalog_stats({key for state in states for key in stats_keys(state)}, using=self.db)
+        else:
+            apply_stats_changes([(None, state) for state in states], using=self.db)
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        # Runs through update(), which applies the CatalogStats deltas.
+        return self._translate_price_error(super().bulk_update, objs, fields, *args, **kwargs)
+
+
 class Product(BaseModel):
     """
     The base code is used to group similar or identical products together.
@@ -90,14 +245,306 @@ class Product(BaseModel):
     """
     base_code = models.CharField(max_length=64, db_index=True)
     sku = models.CharField(max_length=64, unique=True)
-    image = models.ImageField(upload_to='media/products/', null=True)
+    image = models.ImageField(upload_to='media/products/', null=True, blank=True)
     name = models.CharField(max_length=128)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField(default=0)
     is_active = models.BooleanField(default=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     attributes = models.ManyToManyField(Attributes, through='ProductAttribute', related_name='products')
+    # Normalized variant options ({"color": "red", "size": "m"}) and their sha1 signature,
+    # maintained from ProductAttribute writes so that a variant can be resolved by index.
+    variant_options = models.JSONField(default=dict, blank=True)
+    variant_signature = models.CharField(max_length=40, blank=True, default='')
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['base_code', 'variant_signature'], name='product_variant_signature_idx'),
+        ]
+        # is_active is additionally forced to False for zero stock by a database
+        # trigger, see apps.ecommerce.triggers.
+        constraints = [
+            models.CheckConstraint(condition=models.Q(price__gt=0), name=PRICE_CONSTRAINT_NAME),
+        ]
 
     def __str__(self):
         return self.name + f" ({self.sku})"
-    
\ No newline at end of file
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Keeps the values loaded from the database so that receivers can tell
+        which fields actually changed on save (price, quantity, ...).
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the product inside a transaction so that the rows written by the
+        post_save receivers (outbox events) commit or roll back together with it.
+        """
+        using = kwargs.get("using") or router.db_for_write(self.__class__, instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields
+        }
+
+
+class StockMovement(models.Model):
+    """
+    StockMovement is an append-only inventory ledger entry.
+    Stock changes of hot products are recorded as inserts instead of
+    overwriting Product.quantity under a row lock, so concurrent writers do not
+    serialize on the product row. Each movement is written to one of
+    `INVENTORY_COUNTER_SLOTS` slots of its product, which spreads concurrent
+    inserts of a single SKU over separate index ranges.
+    The `compact_inventory` command periodically folds the movements back into
+    Product.quantity and Product.is_active and removes them.
+    Unlike BaseModel it has no modified_time, since rows are never updated.
+    """
+    product = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='stock_movements')
+    slot = models.PositiveSmallIntegerField(default=0)
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=32, blank=True, default='')
+    created_time = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'slot'], name='stockmovement_product_slot_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.delta:+d}"
+
+
+class OutboxEvent(BaseModel):
+    """
+    OutboxEvent is a transactional outbox row describing a catalog change
+    (stock out, price change, ...) that other services must be told about.
+    Rows are written in the same transaction as the Product change and are
+    delivered later by the `dispatch_outbox` management command, so saving a
+    product never waits on the network.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        DELIVERED = 'delivered', 'Delivered'
+        FAILED = 'failed', 'Failed'
+
+    class EventType(models.TextChoices):
+        PRICE_CHANGED = 'price_changed', 'Price changed'
+        STOCK_OUT = 'stock_out', 'Stock out'
+        BACK_IN_STOCK = 'back_in_stock', 'Back in stock'
+        OVERSOLD = 'oversold', 'Oversold'
+
+    event_type = models.CharField(max_length=32, choices=EventType.choices)
+    sku = models.CharField(max_length=64, db_index=True)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    available_time = models.DateTimeField(default=timezone.now)
+    delivered_time = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_time'], name='outbox_status_available_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} {self.sku} ({self.status})"
+
+
+class ArchivedProduct(models.Model):
+    """
+    ArchivedProduct is the cold copy of a Product that has been inactive for a
+    long time. The `archive_products` command moves such products (with their
+    attributes) out of the hot product table in batches, so listings, indexes
+    and signature lookups only scan the live catalog.
+    Rows keep the original product id, so an archived product is restored
+    under its old id (see apps.ecommerce.archive).
+    """
+    id = models.BigIntegerField(primary_key=True)
+    base_code = models.CharField(max_length=64, db_index=True)
+    sku = models.CharField(max_length=64, unique=True)
+    image = models.ImageField(upload_to='media/products/', null=True)
+    name = models.CharField(max_length=128)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity = models.PositiveIntegerField(default=0)
+    is_active = models.BooleanField(default=False)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='archived_products')
+    variant_options = models.JSONField(default=dict, blank=True)
+    variant_signature = models.CharField(max_length=40, blank=True, default='')
+    created_time = models.DateTimeField()
+    modified_time = models.DateTimeField()
+    archived_time = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.name + f" ({self.sku}, archived)"
+
+
+class ArchivedProductAttribute(models.Model):
+    """
+    ArchivedProductAttribute is the cold copy of a ProductAttribute of an
+    archived product, keeping the original id and interned value.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    product = models.ForeignKey(ArchivedProduct, on_delete=models.CASCADE, related_name='product_attributes')
+    attribute = models.ForeignKey(Attributes, on_delete=models.CASCADE, related_name='archived_product_attributes')
+    attribute_value = models.ForeignKey(
+        AttributeValue, on_delete=models.PROTECT, related_name='archived_product_attributes',
+    )
+    created_time = models.DateTimeField()
+    modified_time = models.DateTimeField()
+
+    @property
+    def value(self):
+        return self.attribute_value.value
+
+    def __str__(self):
+        return f"{self.product_id}: {self.attribute_id}"
+
+
+class ReferenceDataVersion(models.Model):
+    """
+    ReferenceDataVersion holds one counter per cached reference table
+    (categories, attributes). It is bumped in the transaction that changes the
+    table, so every worker process can tell from a single primary key lookup
+    that its in-process copy is stale (see apps.ecommerce.reference_cache).
+    """
+    name = models.CharField(max_length=64, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+class DeletionJob(BaseModel):
+    """
+    DeletionJob is a category or bulk product deletion running in the
+    background. Instead of one cascade collecting every related row in a
+    single transaction, the products are deleted in bounded chunks, each in
+    its own transaction, and `deleted` is advanced after every chunk so the
+    progress can be followed through the API (see apps.ecommerce.deletion).
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    class Target(models.TextChoices):
+        CATEGORY = 'category', 'Category'
+        PRODUCTS = 'products', 'Products'
+
+    target = models.CharField(max_length=16, choices=Target.choices)
+    # Plain ids, since the rows are gone once the job is done.
+    category_id = models.BigIntegerField(null=True, blank=True)
+    product_ids = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    total = models.PositiveIntegerField(default=0)
+    deleted = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    finished_time = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'modified_time'], name='deletionjob_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.target} deletion {self.deleted}/{self.total} ({self.status})"
+
+
+class ImageBlob(BaseModel):
+    """
+    ImageBlob is a content-addressed image file under MEDIA_ROOT, shared by
+    every product (and archived product) referencing it. `ref_count` is kept
+    by the product write paths; files that stay unreferenced are removed by
+    `manage.py gc_images` after a grace period (see apps.ecommerce.images).
+    """
+    name = models.CharField(max_length=255, primary_key=True)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'modified_time'], name='imageblob_unreferenced_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+
+class RelatedProduct(models.Model):
+    """
+    RelatedProduct is a precomputed "similar items" entry: for the products of
+    `base_code`, `related` (the main active product of another base code) at
+    position `rank` with the cosine similarity `score` of their attribute
+    values and category. Rows are written by `manage.py compute_related_products`
+    (see apps.ecommerce.related) and only read by the API.
+    """
+    base_code = models.CharField(max_length=64)
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    computed_time = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['base_code', 'rank'], name='relatedproduct_base_code_rank_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.base_code} #{self.rank}: {self.related_id} ({self.score:.3f})"
+
+
+class RelatedProductRefresh(models.Model):
+    """
+    RelatedProductRefresh queues base codes whose attributes, category or
+    availability changed, so the related products job only recomputes those.
+    """
+    base_code = models.CharField(max_length=64, primary_key=True)
+    requested_time = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.base_code
+
+
+class CatalogStats(models.Model):
+    """
+    CatalogStats holds the product count, in-stock count, total stock and
+    price range of one category or one base_code. Rows are maintained with
+    deltas in the transactions writing the products (saves, deletes,
+    bulk_create and QuerySet.update/bulk_update; see apps.ecommerce.stats),
+    so reading them never aggregates over Product. Stock movements count
+    once `compact_inventory` folds them into Product.quantity, so the stock
+    figures lag the ledger by up to one compaction interval.
+    `manage.py verify_catalog_stats` periodically detects and repairs drift
+    left by writes outside the ORM.
+    """
+    class Scope(models.TextChoices):
+        CATEGORY = 'category', 'Category'
+        BASE_CODE = 'base_code', 'Base code'
+
+    scope = models.CharField(max_length=16, choices=Scope.choices)
+    # The category id or the base code.
+    key = models.CharField(max_length=64)
+    product_count = models.IntegerField(default=0)
+    in_stock_count = models.IntegerField(default=0)
+    total_stock = models.BigIntegerField(default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    modified_time = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='catalogstats_scope_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key}: {self.product_count} products"
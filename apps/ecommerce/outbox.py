@@ -0,0 +1,187 @@
+import logging
+import random
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+
+def product_change_events(product, previous):
+    """
+    Returns the unsaved outbox events for a product whose previous field
+    values were `previous` (attname -> value): a price change and/or a
+    stock out / back in stock transition.
+    """
+    payload = {
+        'sku': product.sku,
+        'base_code': product.base_code,
+        'price': str(product.price),
+        'quantity': product.quantity,
+        'is_active': product.is_active,
+    }
+    events = []
+    if 'price' in previous and previous['price'] != product.price:
+        events.append(OutboxEvent(
+            event_type=OutboxEvent.EventType.PRICE_CHANGED,
+            sku=product.sku,
+            payload={**payload, 'previous_price': str(previous['price'])},
+        ))
+    if 'quantity' in previous:
+        was_in_stock = previous['quantity'] > 0
+        is_in_stock = product.quantity > 0
+        if was_in_stock and not is_in_stock:
+            events.append(OutboxEvent(
+                event_type=OutboxEvent.EventType.STOCK_OUT, sku=product.sku, payload=payload,
+            ))
+        elif is_in_stock and not was_in_stock:
+            events.append(OutboxEvent(
+                event_type=OutboxEvent.EventType.BACK_IN_STOCK, sku=product.sku, payload=payload,
+            ))
+    return events
+
+
+def coalesce_events(events):
+    """
+    Groups outbox events by SKU into a single message per SKU.
+    The latest payload wins, every event type is reported once in the
+    order it first happened and all source event ids are kept so the rows
+    can be marked delivered together.
+    """
+    messages = {}
+    for event in sorted(events, key=lambda e: e.id):
+        message = messages.setdefault(event.sku, {
+            'sku': event.sku,
+            'events': [],
+            'state': {},
+            'event_ids': [],
+        })
+        if event.event_type not in message['events']:
+            message['events'].append(event.event_type)
+        message['state'] = event.payload
+        message['event_ids'].append(event.id)
+    return list(messages.values())
+
+
+def lag_metrics():
+    """
+    Returns the current outbox backlog: pending/failed counts and the age in
+    seconds of the oldest pending event (0 when the outbox is drained).
+    """
+    stats = OutboxEvent.objects.aggregate(
+        pending=Count('id', filter=Q(status=OutboxEvent.Status.PENDING)),
+        failed=Count('id', filter=Q(status=OutboxEvent.Status.FAILED)),
+        oldest_pending=Min('created_time', filter=Q(status=OutboxEvent.Status.PENDING)),
+    )
+    oldest = stats.pop('oldest_pending')
+    stats['lag_seconds'] = (timezone.now() - oldest).total_seconds() if oldest else 0.0
+    return stats
+
+
+class OutboxDispatcher:
+    """
+    OutboxDispatcher delivers pending outbox events to the webhook endpoint.
+    Events are claimed with a short lease (so several dispatchers can run side
+    by side), coalesced per SKU and posted in batches over a pooled HTTP
+    session. Failed batches are retried with exponential backoff until
+    `max_attempts` is reached, after which the events are marked failed.
+    """
+
+    def __init__(self, url=None, batch_size=None, fetch_size=None, max_attempts=None,
+                 timeout=None, backoff_base=None, backoff_max=None, lease_seconds=None, session=None):
+        self.url = url or settings.OUTBOX_WEBHOOK_URL
+        self.batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        self.fetch_size = fetch_size or self.batch_size * 10
+        self.max_attempts = max_attempts or settings.OUTBOX_MAX_ATTEMPTS
+        self.timeout = timeout or settings.OUTBOX_TIMEOUT
+        self.backoff_base = backoff_base if backoff_base is not None else settings.OUTBOX_BACKOFF_BASE
+        self.backoff_max = backoff_max if backoff_max is not None else settings.OUTBOX_BACKOFF_MAX
+        self.lease_seconds = lease_seconds or settings.OUTBOX_LEASE_SECONDS
+        self.session = session or self._build_session()
+
+    def _build_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['Content-Type'] = 'application/json'
+        return session
+
+    def claim(self):
+        """
+        Selects due pending events and pushes their `available_time` forward by
+        the lease so that a concurrent dispatcher does not pick them up too.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            events = list(
+                OutboxEvent.objects.select_for_update(skip_locked=True)
+                .filter(status=OutboxEvent.Status.PENDING, available_time__lte=now)
+                .order_by('id')[:self.fetch_size]
+            )
+            if events:
+                OutboxEvent.objects.filter(id__in=[e.id for e in events]).update(
+                    available_time=now + timedelta(seconds=self.lease_seconds),
+                )
+        return events
+
+    def backoff(self, attempts):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def send(self, messages):
+        response = self.session.post(self.url, json={'messages': messages}, timeout=self.timeout)
+        response.raise_for_status()
+
+    def deliver(self, messages):
+        event_ids = [event_id for message in messages for event_id in message['event_ids']]
+        body = [{key: value for key, value in m.items() if key != 'event_ids'} for m in messages]
+        try:
+            self.send(body)
+        except requests.RequestException as exc:
+            self._mark_failed_attempt(event_ids, exc)
+            return False
+        OutboxEvent.objects.filter(id__in=event_ids).update(
+            status=OutboxEvent.Status.DELIVERED,
+            delivered_time=timezone.now(),
+            last_error='',
+        )
+        return True
+
+    def _mark_failed_attempt(self, event_ids, exc):
+        logger.warning("Outbox delivery failed for %d events: %s", len(event_ids), exc)
+        now = timezone.now()
+        fields = ['attempts', 'last_error', 'status', 'available_time']
+        # Every written field is loaded: bulk_update would read deferred ones per event.
+        events = list(OutboxEvent.objects.filter(id__in=event_ids).only('id', *fields))
+        for event in events:
+            event.attempts += 1
+            event.last_error = str(exc)[:1000]
+            if event.attempts >= self.max_attempts:
+                event.status = OutboxEvent.Status.FAILED
+            else:
+                event.available_time = now + timedelta(seconds=self.backoff(event.attempts))
+        OutboxEvent.objects.bulk_update(events, fields)
+
+    def dispatch_once(self):
+        """
+        Runs a single claim/coalesce/deliver cycle.
+        Returns the number of events that were delivered.
+        """
+        events = self.claim()
+        if not events:
+            return 0
+        messages = coalesce_events(events)
+        delivered = 0
+        for start in range(0, len(messages), self.batch_size):
+            batch = messages[start:start + self.batch_size]
+            if self.deliver(batch):
+                delivered += sum(len(m['event_ids']) for m in batch)
+        return delivered
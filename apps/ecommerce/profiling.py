@@ -0,0 +1,107 @@
+import json
+import pstats
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+
+TOKEN_SALT = 'request-profile'
+
+
+def make_profile_token():
+    """
+    Returns a signed value for the `X-Profile-Token` header that makes
+    ProfilingMiddleware profile the request. Valid for `TOKEN_MAX_AGE` seconds.
+    """
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign('profile')
+
+
+def is_valid_profile_token(token):
+    try:
+        value = signing.TimestampSigner(salt=TOKEN_SALT).unsign(
+            token, max_age=settings.REQUEST_PROFILING['TOKEN_MAX_AGE'],
+        )
+    except signing.BadSignature:
+        return False
+    return value == 'profile'
+
+
+class QueryTimer:
+    """
+    Database execute wrapper that accumulates the number of queries and the
+    time spent in them while a profiled request runs.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+
+
+class ProfileStore:
+    """
+    Keeps captured profiles on disk as `<id>.prof` (cProfile/pstats data) plus
+    `<id>.json` metadata. Ids start with a timestamp, and once more than
+    `max_profiles` are stored the oldest ones are deleted (ring buffer).
+    """
+
+    def __init__(self, root=None, max_profiles=None):
+        config = settings.REQUEST_PROFILING
+        self.root = Path(root or config['ROOT'])
+        self.max_profiles = max_profiles or config['MAX_PROFILES']
+
+    def save(self, profiler, metadata):
+        self.root.mkdir(parents=True, exist_ok=True)
+        now = time.time_ns()
+        stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime(now // 10**9))
+        profile_id = f"{stamp}.{now % 10**9:09d}-{uuid.uuid4().hex[:6]}"
+        profiler.dump_stats(self.root / f"{profile_id}.prof")
+        (self.root / f"{profile_id}.json").write_text(json.dumps({'id': profile_id, **metadata}))
+        self.trim()
+        return profile_id
+
+    def ids(self):
+        if not self.root.exists():
+            return []
+        return sorted(path.stem for path in self.root.glob('*.prof'))
+
+    def trim(self):
+        ids = self.ids()
+        for profile_id in ids[:max(0, len(ids) - self.max_profiles)]:
+            for suffix in ('.prof', '.json'):
+                (self.root / f"{profile_id}{suffix}").unlink(missing_ok=True)
+
+    def metadata(self, profile_id):
+        try:
+            return json.loads((self.root / f"{profile_id}.json").read_text())
+        except FileNotFoundError:
+            return {'id': profile_id}
+
+    def stats(self, profile_ids):
+        """
+        Returns a pstats.Stats object merging the given profiles.
+        """
+        paths = [str(self.root / f"{profile_id}.prof") for profile_id in profile_ids]
+        return pstats.Stats(*paths) if paths else None
+
+
+def hottest_functions(stats, limit=20, sort='tottime'):
+    """
+    Returns `(location, calls, tottime, cumtime)` rows for the functions with
+    the highest `sort` time in a pstats.Stats object.
+    """
+    index = {'tottime': 2, 'cumtime': 3}[sort]
+    rows = []
+    for (filename, line, name), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        rows.append((f"{filename}:{line}({name})", calls, tottime, cumtime))
+    rows.sort(key=lambda row: row[index], reverse=True)
+    return rows[:limit]
@@ -0,0 +1,124 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import router, transaction
+from django.db.models import F
+from rest_framework import serializers
+
+from .models import Attributes, Category, ReferenceDataVersion
+
+
+class ReferenceDataCache:
+    """
+    Per-process read-through cache of a small, rarely changing table.
+    The whole table is loaded on first use and kept until the shared
+    ReferenceDataVersion counter of the table changes; the counter is checked
+    at most once every REFERENCE_DATA_CACHE_CHECK_SECONDS, so product requests
+    do not query the table itself. Writes bump the counter (`invalidate`),
+    which makes every other worker reload on its next check.
+    Cached instances are shared between threads and must not be modified.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.name = model._meta.label_lower
+        self._lock = threading.Lock()
+        self._objects = None
+        self._version = None
+        self._checked = 0.0
+
+    def __deepcopy__(self, memo):
+        # Serializer fields are deep-copied per serializer instance; they all
+        # share the process-wide cache.
+        return self
+
+    def _stored_version(self, using):
+        versions = ReferenceDataVersion.objects.using(using).filter(name=self.name)
+        return versions.values_list('version', flat=True).first() or 0
+
+    def _load(self):
+        objects = self._objects
+        if objects is not None and time.monotonic() - self._checked < settings.REFERENCE_DATA_CACHE_CHECK_SECONDS:
+            return objects
+        with self._lock:
+            # The version is read before the rows, so rows changed in between
+            # are reloaded again on the next check instead of being kept.
+            # Both are read from the primary: replicas may lag differently.
+            using = router.db_for_write(self.model)
+            version = self._stored_version(using)
+            if self._objects is None or version != self._version:
+                self._objects = {obj.pk: obj for obj in self.model._base_manager.using(using).order_by('pk')}
+                self._version = version
+            self._checked = time.monotonic()
+            return self._objects
+
+    def get(self, pk):
+        return self._load().get(pk)
+
+    def all(self):
+        return list(self._load().values())
+
+    def clear(self):
+        with self._lock:
+            self._objects = None
+
+    def invalidate(self, using=None):
+        """
+        Bumps the shared version in the current transaction and drops the
+        local copy, so the writing process reloads right away.
+        """
+        using = using or router.db_for_write(ReferenceDataVersion)
+        with transaction.atomic(using=using):
+            versions = ReferenceDataVersion.objects.using(using)
+            if not versions.filter(name=self.name).update(version=F('version') + 1):
+                versions.bulk_create([ReferenceDataVersion(name=self.name, version=1)], ignore_conflicts=True)
+        self.clear()
+        transaction.on_commit(self.clear, using=using)
+
+    def prime(self, instance, field_name):
+        """
+        Sets the related object of the foreign key `field_name` on `instance`
+        from the cache, unless it is loaded already, so that accessing it does
+        not query the database.
+        """
+        field = instance._meta.get_field(field_name)
+        if not field.is_cached(instance):
+            related = self.get(getattr(instance, field.attname))
+            if related is not None:
+                field.set_cached_value(instance, related)
+        return instance
+
+
+category_cache = ReferenceDataCache(Category)
+attribute_cache = ReferenceDataCache(Attributes)
+
+
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField validating the primary key against a
+    ReferenceDataCache; `queryset` is only queried for keys the cache does
+    not know.
+    """
+
+    def __init__(self, cache, **kwargs):
+        self.cache = cache
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = self.cache.model._meta.pk.to_python(data)
+        except (TypeError, ValueError, ValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        instance = self.cache.get(pk)
+        if instance is None:
+            # The cache may predate the row (created moments ago by another
+            # worker); check the table before failing and reload on a hit.
+            instance = self.get_queryset().filter(pk=pk).first()
+            if instance is None:
+                self.fail('does_not_exist', pk_value=data)
+            self.cache.clear()
+        return instance
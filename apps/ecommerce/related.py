@@ -0,0 +1,162 @@
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from scipy import sparse
+
+from .models import Product, ProductAttribute, RelatedProduct, RelatedProductRefresh
+from .reference_cache import attribute_cache
+
+
+def build_feature_matrix():
+    """
+    Builds the sparse base_code x feature matrix of the active catalog. The
+    features of a base code are the interned values of its visible attributes
+    (over all active variants) and its category, weighted by inverse document
+    frequency so that rare values count more; rows are L2 normalized, so the
+    product of two rows is their cosine similarity.
+    Returns `(matrix, base_codes, main_product_ids)`.
+    """
+    index = {}
+    base_codes = []
+    main_product_ids = []
+    categories = []
+    rows = Product.objects.filter(is_active=True).order_by('id').values_list('id', 'base_code', 'category_id')
+    for product_id, base_code, category_id in rows.iterator(chunk_size=2000):
+        if base_code not in index:
+            index[base_code] = len(base_codes)
+            base_codes.append(base_code)
+            main_product_ids.append(product_id)
+            categories.append(category_id)
+
+    values = ProductAttribute.objects.filter(product__is_active=True).values_list(
+        'product__base_code', 'attribute_id', 'attribute_value_id',
+    )
+    row_ids, value_ids = [], []
+    for base_code, attribute_id, value_id in values.iterator(chunk_size=2000):
+        row = index.get(base_code)
+        if row is None:
+            continue  # Activated after the products were read.
+        attribute = attribute_cache.get(attribute_id)
+        if attribute is not None and attribute.is_visible:
+            row_ids.append(row)
+            value_ids.append(value_id)
+
+    # Columns: attribute values first, then categories.
+    value_columns, value_ids = np.unique(np.array(value_ids, dtype=np.int64), return_inverse=True)
+    category_columns, category_ids = np.unique(np.array(categories, dtype=np.int64), return_inverse=True)
+    n_rows, n_values = len(base_codes), len(value_columns)
+    matrix = sparse.coo_matrix(
+        (
+            np.ones(len(row_ids) + n_rows, dtype=np.float32),
+            (np.concatenate([row_ids, np.arange(n_rows)]).astype(np.int64),
+             np.concatenate([value_ids, category_ids + n_values]).astype(np.int64)),
+        ),
+        shape=(n_rows, n_values + len(category_columns)),
+    ).tocsr()
+    matrix.data[:] = 1.0  # Repeated values across variants count once.
+
+    document_frequency = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = np.log((1 + n_rows) / (1 + document_frequency)).astype(np.float32) + 1.0
+    idf[n_values:] *= settings.RELATED_PRODUCTS_CATEGORY_WEIGHT
+    matrix = matrix @ sparse.diags(idf)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    matrix = sparse.diags(1.0 / norms) @ matrix
+    return matrix.tocsr().astype(np.float32), base_codes, main_product_ids
+
+
+def top_neighbours(matrix, rows, top_k, block_cells=None):
+    """
+    Yields `(row, neighbour_rows, scores)` for the given rows: the `top_k`
+    most similar other rows with a positive score, best first. Similarities
+    are computed for blocks of rows at once as dense arrays of at most
+    `block_cells` cells.
+    """
+    n = matrix.shape[0]
+    top_k = min(top_k, n - 1)
+    if top_k <= 0:
+        return
+    block_size = max(1, (block_cells or settings.RELATED_PRODUCTS_BLOCK_CELLS) // n)
+    transposed = matrix.T.tocsc()
+    for start in range(0, len(rows), block_size):
+        block_rows = np.asarray(rows[start:start + block_size])
+        similarity = (matrix[block_rows] @ transposed).toarray()
+        similarity[np.arange(len(block_rows)), block_rows] = -1.0  # Not related to itself.
+        candidates = np.argpartition(-similarity, top_k - 1, axis=1)[:, :top_k]
+        scores = np.take_along_axis(similarity, candidates, axis=1)
+        order = np.argsort(-scores, axis=1, kind='stable')
+        candidates = np.take_along_axis(candidates, order, axis=1)
+        scores = np.take_along_axis(scores, order, axis=1)
+        for row, neighbours, row_scores in zip(block_rows, candidates, scores):
+            positive = row_scores > 0
+            yield int(row), neighbours[positive], row_scores[positive]
+
+
+def compute_related_products(full=False, top_k=None):
+    """
+    Recomputes the related products of the base codes queued in
+    RelatedProductRefresh, or of every base code with `full=True`.
+    The feature matrix always covers the whole active catalog, so queued base
+    codes are compared against every other one; the lists of base codes that
+    did not change are refreshed by the next full run.
+    Returns the number of base codes recomputed.
+    """
+    top_k = top_k or settings.RELATED_PRODUCTS_TOP_K
+    started = timezone.now()
+    queued = None if full else set(RelatedProductRefresh.objects.values_list('base_code', flat=True))
+    if queued is not None and not queued:
+        return 0
+
+    matrix, base_codes, main_product_ids = build_feature_matrix()
+    if full:
+        rows = list(range(len(base_codes)))
+    else:
+        rows = [row for row, base_code in enumerate(base_codes) if base_code in queued]
+
+    computed_codes = []
+    entries = []
+    for row, neighbours, scores in top_neighbours(matrix, rows, top_k):
+        computed_codes.append(base_codes[row])
+        entries += [
+            RelatedProduct(
+                base_code=base_codes[row], related_id=main_product_ids[neighbour], rank=rank, score=float(score),
+                computed_time=started,
+            )
+            for rank, (neighbour, score) in enumerate(zip(neighbours, scores))
+        ]
+        if len(computed_codes) >= 500:
+            _store(computed_codes, entries)
+            computed_codes, entries = [], []
+    _store(computed_codes, entries)
+
+    with transaction.atomic():
+        # Lists not rewritten by this run belong to base codes without an
+        # active product anymore.
+        if full:
+            RelatedProduct.objects.filter(computed_time__lt=started).delete()
+        else:
+            RelatedProduct.objects.filter(base_code__in=queued - set(base_codes)).delete()
+        refreshes = RelatedProductRefresh.objects.filter(requested_time__lte=started)
+        if not full:
+            refreshes = refreshes.filter(base_code__in=queued)
+        refreshes.delete()
+    return len(rows)
+
+
+def _store(base_codes, entries):
+    with transaction.atomic():
+        RelatedProduct.objects.filter(base_code__in=base_codes).delete()
+        RelatedProduct.objects.bulk_create(entries)
+
+
+def request_related_refresh(base_codes):
+    """
+    Queues base codes for the next incremental related products run.
+    """
+    now = timezone.now()
+    codes = {code for code in base_codes if code}
+    RelatedProductRefresh.objects.bulk_create(
+        [RelatedProductRefresh(base_code=code, requested_time=now) for code in codes],
+        update_conflicts=True, unique_fields=['base_code'], update_fields=['requested_time'],
+    )
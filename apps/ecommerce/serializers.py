@@ -1,6 +1,12 @@
 from rest_framework import serializers
 
-from .models import Product, Category, ProductAttribute, Attributes
+from .models import (
+    Product, Category, ProductAttribute, Attributes, StockMovement, AttributeValue,
+    ArchivedProduct, ArchivedProductAttribute, DeletionJob, RelatedProduct, CatalogStats, PRICE_ERROR_MESSAGE,
+)
+from .reference_cache import CachedPrimaryKeyRelatedField, attribute_cache, category_cache
+from .related import request_related_refresh
+from .stats import catalog_stats
 
 
 class AttributesSerializer(serializers.ModelSerializer):
@@ -9,54 +15,191 @@ class AttributesSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class AttributeValueSerializer(serializers.ModelSerializer):
+    product_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = AttributeValue
+        fields = ('id', 'attribute', 'value', 'product_count')
+
+
 class ProductAttributeSerializer(serializers.ModelSerializer):
     attribute = AttributesSerializer(read_only=True)
-    attribute_id = serializers.PrimaryKeyRelatedField(
+    attribute_id = CachedPrimaryKeyRelatedField(
+        cache=attribute_cache,
         queryset=Attributes.objects.all(),
         source='attribute'  # Map to the `attribute` field in the model
     )
+    value = serializers.CharField(max_length=128)  # Interned into AttributeValue on save
+    attribute_value = serializers.PrimaryKeyRelatedField(read_only=True)
 
     class Meta:
         model = ProductAttribute
         fields = '__all__'
 
+    def to_representation(self, instance):
+        return super().to_representation(attribute_cache.prime(instance, 'attribute'))
+
+
+class CatalogStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CatalogStats
+        fields = ('product_count', 'in_stock_count', 'total_stock', 'min_price', 'max_price', 'modified_time')
+
+
+EMPTY_CATALOG_STATS = CatalogStats(product_count=0, in_stock_count=0, total_stock=0, modified_time=None)
+
 
 class CategorySerializer(serializers.ModelSerializer):
+    stats = serializers.SerializerMethodField()
+
     class Meta:
         model = Category
         fields = '__all__'
 
+    def get_fields(self):
+        # Categories nested in other serializers (e.g. products) do not embed
+        # their stats.
+        fields = super().get_fields()
+        parent = getattr(self, 'parent', None)
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            fields.pop('stats')
+        return fields
+
+    def get_stats(self, obj):
+        # The stats of every category in the response are loaded with one query.
+        root = self.root
+        stats = self.context.get('_catalog_stats')
+        if stats is None:
+            instances = root.instance if isinstance(root, serializers.ListSerializer) else [obj]
+            stats = catalog_stats(CatalogStats.Scope.CATEGORY, [category.id for category in instances])
+            self.context['_catalog_stats'] = stats
+        return CatalogStatsSerializer(stats.get(str(obj.id), EMPTY_CATALOG_STATS)).data
+
 
 class ProductSerializer(serializers.ModelSerializer):
     product_attributes = ProductAttributeSerializer(many=True)  # Nested serializer
     category = CategorySerializer(read_only=True)  # Read-only serializer
-    category_id = serializers.PrimaryKeyRelatedField(
+    category_id = CachedPrimaryKeyRelatedField(
+        cache=category_cache,
         queryset=Category.objects.all(),
         source='category'  # Map to the `category` field in the model
     )
+    # Attribute ids taken from the (prefetched) product attributes instead of
+    # querying the many-to-many relation for every product.
+    attributes = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = '__all__'
+        read_only_fields = ('variant_options', 'variant_signature')
+
+    def to_representation(self, instance):
+        return super().to_representation(category_cache.prime(instance, 'category'))
+
+    def get_attributes(self, obj):
+        return [product_attribute.attribute_id for product_attribute in obj.product_attributes.all()]
+
+    def validate_price(self, value):
+        if value <= 0:
+            raise serializers.ValidationError(PRICE_ERROR_MESSAGE)
+        return value
 
     def create(self, validated_data):
         product_attributes_data = validated_data.pop('product_attributes', [])
 
         product = Product.objects.create(**validated_data)
-        # TODO: bulk create for performance
-        for attribute_data in product_attributes_data:
-            ProductAttribute.objects.create(product=product, **attribute_data)
+        ProductAttribute.objects.bulk_create(
+            ProductAttribute(product=product, **attribute_data) for attribute_data in product_attributes_data
+        )
+        product.refresh_from_db(fields=['variant_options', 'variant_signature'])
 
         return product
 
     def update(self, instance, validated_data):
-        product_attributes_data = validated_data.pop('product_attributes', [])
+        product_attributes_data = validated_data.pop('product_attributes', None)
         instance = super().update(instance, validated_data)
+        if product_attributes_data is None:  # Partial update without attributes, e.g. a stock change.
+            return instance
 
         instance.product_attributes.all().delete()
-        # TODO: bulk create for performance
-        for attribute_data in product_attributes_data:
-            ProductAttribute.objects.create(product=instance, **attribute_data)
+        ProductAttribute.objects.bulk_create(
+            ProductAttribute(product=instance, **attribute_data) for attribute_data in product_attributes_data
+        )
+        request_related_refresh([instance.base_code])
+        instance.refresh_from_db(fields=['variant_options', 'variant_signature'])
 
         return instance
-    
\ No newline at end of file
+    
+
+
+class StockMovementSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StockMovement
+        fields = ('id', 'product', 'delta', 'reason', 'created_time')
+        read_only_fields = ('product',)
+
+
+class ArchivedProductAttributeSerializer(serializers.ModelSerializer):
+    attribute = AttributesSerializer(read_only=True)
+    value = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = ArchivedProductAttribute
+        fields = '__all__'
+
+    def to_representation(self, instance):
+        return super().to_representation(attribute_cache.prime(instance, 'attribute'))
+
+
+class ArchivedProductSerializer(serializers.ModelSerializer):
+    """
+    Read-only representation of an archived product, in the same shape as
+    ProductSerializer plus `is_archived` and `archived_time`.
+    """
+    product_attributes = ArchivedProductAttributeSerializer(many=True, read_only=True)
+    category = CategorySerializer(read_only=True)
+    is_archived = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ArchivedProduct
+        fields = '__all__'
+
+    def to_representation(self, instance):
+        return super().to_representation(category_cache.prime(instance, 'category'))
+
+    def get_is_archived(self, obj):
+        return True
+
+
+class DeletionJobSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DeletionJob
+        exclude = ('product_ids',)
+
+    def get_progress(self, obj):
+        if obj.status == DeletionJob.Status.DONE or not obj.total:
+            return 1.0 if obj.status == DeletionJob.Status.DONE else 0.0
+        return round(min(obj.deleted / obj.total, 1.0), 4)
+
+
+class ProductBulkDeleteSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+
+class RelatedProductSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='related_id')
+    sku = serializers.CharField(source='related.sku')
+    name = serializers.CharField(source='related.name')
+    base_code = serializers.CharField(source='related.base_code')
+    price = serializers.DecimalField(source='related.price', max_digits=10, decimal_places=2)
+    image = serializers.ImageField(source='related.image')
+
+    class Meta:
+        model = RelatedProduct
+        fields = ('id', 'sku', 'name', 'base_code', 'price', 'image', 'score')
+
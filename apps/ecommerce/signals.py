@@ -1,8 +1,20 @@
-from django.db.models.signals import pre_save
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate
 
 from django.dispatch import receiver
 
-from .models import Product
+from .models import Product, OutboxEvent, Category, ProductAttribute, Attributes, CatalogStats, PRICE_ERROR_MESSAGE
+from .images import release_images, retain_images
+from .outbox import product_change_events
+from .reference_cache import attribute_cache, category_cache
+from .related import request_related_refresh
+from .snapshots import snapshot_scheduler
+from .stats import apply_stats_changes, product_state, refresh_catalog_stats, stats_keys
+from .suggest import suggest_index
+from .triggers import install_product_status_trigger
+from .variants import refresh_attribute_variant_signatures, refresh_variant_signatures
 
 
 @receiver(pre_save, sender=Product)
@@ -13,7 +25,183 @@ def update_product_status(sender, instance, **kwargs):
     Eğer ürün fiyatı sıfır ise ValueError fırlatılır.
     """
     if instance.price <= 0:
-        raise ValueError("Product price must be greater than zero.")
-    
+        raise ValueError(PRICE_ERROR_MESSAGE)
+
     if instance.quantity <= 0:
-        instance.is_active = False
\ No newline at end of file
+        instance.is_active = False
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Attributes)
+@receiver(post_delete, sender=Attributes)
+def invalidate_reference_cache(sender, **kwargs):
+    """
+    Kategori veya özellik değiştiğinde ortak sürüm sayacını artırır; böylece
+    tüm worker süreçleri kendi bellek içi önbelleklerini yeniden yükler.
+    """
+    cache = category_cache if sender is Category else attribute_cache
+    cache.invalidate(using=kwargs.get('using'))
+
+
+@receiver(post_save, sender=Product)
+def write_outbox_events(sender, instance, created, raw=False, **kwargs):
+    """
+    Ürün fiyatı veya stok durumu değiştiğinde outbox tablosuna olay yazar.
+    Product.save bir transaction içinde çalıştığı için olaylar ürün değişikliğiyle
+    birlikte commit edilir; teslimat `dispatch_outbox` komutu ile yapılır.
+    """
+    previous = getattr(instance, '_loaded_values', None)
+    if created or raw or not previous:
+        return
+
+    events = product_change_events(instance, previous)
+    if events:
+        OutboxEvent.objects.using(kwargs.get('using')).bulk_create(events)
+
+
+@receiver(post_save, sender=Product)
+def update_image_references(sender, instance, created, **kwargs):
+    """
+    Ürün görseli değiştiğinde paylaşılan görsel dosyasının referans sayısını
+    günceller: yeni dosyaya referans eklenir, eskisinden düşülür.
+    """
+    previous = None if created else getattr(instance, '_loaded_values', {}).get('image')
+    current = instance.image.name or None
+    if previous != current:
+        retain_images([current])
+        release_images([previous])
+
+
+@receiver(post_delete, sender=Product)
+def release_image_reference(sender, instance, **kwargs):
+    release_images([instance.image.name])
+
+
+@receiver(post_save, sender=Product)
+def update_catalog_stats(sender, instance, created, **kwargs):
+    """
+    Ürünün kategori, base_code, fiyat veya stok değişikliğini aynı transaction
+    içinde CatalogStats satırlarına fark (delta) olarak uygular. Önceki değerler
+    bilinmiyorsa ürünün gruplarını yeniden sayar.
+    """
+    using = kwargs.get('using')
+    current = product_state(instance)
+    previous = None if created else product_state(getattr(instance, '_loaded_values', None) or {})
+    if created or previous is not None:
+        apply_stats_changes([(previous, current)], using=using)
+    else:
+        refresh_catalog_stats(stats_keys(current), using=using)
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_catalog_stats(sender, instance, **kwargs):
+    apply_stats_changes([(product_state(instance), None)], using=kwargs.get('using'))
+
+
+@receiver(post_delete, sender=Category)
+def delete_category_stats(sender, instance, **kwargs):
+    CatalogStats.objects.using(kwargs.get('using')).filter(
+        scope=CatalogStats.Scope.CATEGORY, key=str(instance.id),
+    ).delete()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=ProductAttribute)
+@receiver(post_delete, sender=ProductAttribute)
+def refresh_catalog_snapshots(sender, raw=False, **kwargs):
+    """
+    CATALOG_SNAPSHOTS_ON_WRITE açıksa katalog değişikliği commit edildikten sonra
+    nginx'in doğrudan sunduğu statik katalog dosyalarını arka planda yeniden üretir.
+    """
+    if raw or not settings.CATALOG_SNAPSHOTS_ON_WRITE:
+        return
+    transaction.on_commit(snapshot_scheduler.request, using=kwargs.get('using'))
+
+
+@receiver(post_save, sender=Product)
+def update_suggest_index(sender, instance, raw=False, **kwargs):
+    """
+    Ürün adı, SKU'su, base_code'u veya aktifliği değiştiğinde commit sonrasında
+    bu sürecin öneri (suggest) indeksini günceller.
+    """
+    if raw:
+        return
+    row = (instance.id, instance.name, instance.sku, instance.base_code, instance.is_active)
+    transaction.on_commit(lambda: suggest_index.apply([row]), using=kwargs.get('using'))
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_suggest_index(sender, instance, **kwargs):
+    product_id = instance.id
+    transaction.on_commit(lambda: suggest_index.remove(product_id), using=kwargs.get('using'))
+
+
+@receiver(post_save, sender=ProductAttribute)
+@receiver(post_delete, sender=ProductAttribute)
+def update_variant_signature(sender, instance, raw=False, **kwargs):
+    """
+    Ürün özelliği eklendiğinde, değiştiğinde veya silindiğinde ürünün varyant
+    imzasını (variant_signature) yeniden hesaplar.
+    """
+    if raw or instance.product_id is None:
+        return
+    refresh_variant_signatures([instance.product_id])
+
+
+@receiver(post_save, sender=Product)
+def queue_related_refresh_for_product(sender, instance, created, raw=False, **kwargs):
+    """
+    Yeni ürün eklendiğinde veya ürünün base_code, kategori ya da aktiflik
+    durumu değiştiğinde ilgili base_code'ları benzer ürün hesaplaması için kuyruğa ekler.
+    """
+    if raw:
+        return
+    previous = getattr(instance, '_loaded_values', None) or {}
+    fields = ('base_code', 'category_id', 'is_active')
+    if created or any(name in previous and previous[name] != getattr(instance, name) for name in fields):
+        request_related_refresh([instance.base_code, previous.get('base_code')])
+
+
+@receiver(post_delete, sender=Product)
+def queue_related_refresh_for_deleted_product(sender, instance, **kwargs):
+    request_related_refresh([instance.base_code])
+
+
+@receiver(post_save, sender=ProductAttribute)
+@receiver(post_delete, sender=ProductAttribute)
+def queue_related_refresh_for_attribute(sender, instance, raw=False, **kwargs):
+    """
+    Ürün özelliği değiştiğinde ürünün base_code'unu benzer ürün hesaplaması için kuyruğa ekler.
+    """
+    if raw or instance.product_id is None:
+        return
+    request_related_refresh(Product.objects.filter(id=instance.product_id).values_list('base_code', flat=True))
+
+
+@receiver(post_save, sender=Attributes)
+def update_attribute_variant_signatures(sender, instance, created, raw=False, **kwargs):
+    """
+    Bir özelliğin adı veya is_variant değeri değişebileceği için o özelliği
+    kullanan tüm ürünlerin varyant imzalarını yeniden hesaplar.
+    """
+    if raw or created:
+        return
+    refresh_attribute_variant_signatures(instance.id)
+
+
+@receiver(post_migrate)
+def reinstall_product_status_trigger(sender, using, **kwargs):
+    """
+    SQLite şema değişikliklerinde tabloyu yeniden oluşturduğu için tetikleyiciler
+    silinebilir; her migrate sonrasında stok/aktiflik tetikleyicisini yeniden kurar.
+    """
+    if sender.label != 'ecommerce' or not router.allow_migrate_model(using, Product):
+        return
+    connection = connections[using]
+    applied = MigrationRecorder(connection).applied_migrations()
+    if ('ecommerce', '0011_product_status_invariants') in applied:
+        install_product_status_trigger(connection, Product._meta.db_table)
@@ -0,0 +1,118 @@
+import gzip
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+
+from .catalog import group_by_base_code
+from .models import Category, Product
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; only the .gz variants are written without it.
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+def write_atomic(path, data):
+    """
+    Writes `data` to a temporary file next to `path` and renames it into place,
+    so nginx never serves a partially written snapshot.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_snapshot(path, payload):
+    """
+    Writes a JSON snapshot together with its precompressed variants.
+    The compressed files are replaced first so that, once the plain JSON is
+    updated, `gzip_static`/`brotli_static` already find matching variants.
+    """
+    data = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    write_atomic(path.with_name(path.name + '.gz'), gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        write_atomic(path.with_name(path.name + '.br'), brotli.compress(data, quality=11))
+    write_atomic(path, data)
+
+
+def build_catalog_snapshots(root=None):
+    """
+    Regenerates `catalog.json` and `categories/<id>.json` under the snapshot
+    root. The payloads are the same as `GET /api/products/` and
+    `GET /api/products/?category=<id>`. Files of deleted categories are removed.
+    Returns the number of snapshots written.
+    """
+    root = Path(root or settings.CATALOG_SNAPSHOT_ROOT)
+    products = Product.objects.prefetch_related('product_attributes__attribute_value')
+
+    write_snapshot(root / 'catalog.json', group_by_base_code(products, products))
+    written = 1
+
+    category_ids = set(Category.objects.values_list('id', flat=True))
+    for category_id in sorted(category_ids):
+        payload = group_by_base_code(products.filter(category_id=category_id), products)
+        write_snapshot(root / 'categories' / f"{category_id}.json", payload)
+        written += 1
+
+    for stale in (root / 'categories').glob('*.json*'):
+        stem = stale.name.split('.', 1)[0]
+        if stem.isdigit() and int(stem) not in category_ids:
+            stale.unlink()
+    return written
+
+
+class SnapshotScheduler:
+    """
+    Rebuilds the snapshots in a background thread after catalog writes.
+    Requests that arrive while a rebuild is running are coalesced into a
+    single follow-up rebuild, so a burst of writes costs at most two builds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._running = False
+
+    def request(self):
+        with self._lock:
+            self._dirty = True
+            if self._running:
+                return
+            self._running = True
+        threading.Thread(target=self._run, name='catalog-snapshots', daemon=True).start()
+
+    def _run(self):
+        try:
+            while True:
+                with self._lock:
+                    if not self._dirty:
+                        self._running = False
+                        return
+                    self._dirty = False
+                try:
+                    build_catalog_snapshots()
+                except Exception:
+                    logger.exception("Catalog snapshot rebuild failed")
+        finally:
+            connections.close_all()
+
+
+snapshot_scheduler = SnapshotScheduler()
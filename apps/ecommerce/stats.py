@@ -0,0 +1,247 @@
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Count, DecimalField, F, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+
+from .models import CatalogStats, Product
+
+ProductState = namedtuple('ProductState', ['category_id', 'base_code', 'price', 'quantity'])
+
+PRICE_FIELD = DecimalField(max_digits=10, decimal_places=2)
+STATS_FIELDS = ('product_count', 'in_stock_count', 'total_stock', 'min_price', 'max_price')
+# Product fields whose writes change the stats.
+STATE_FIELDS = frozenset({'category', 'category_id', 'base_code', 'price', 'quantity'})
+GROUP_FIELDS = {
+    CatalogStats.Scope.CATEGORY: 'category_id',
+    CatalogStats.Scope.BASE_CODE: 'base_code',
+}
+
+
+def product_state(values):
+    """
+    Returns the ProductState of a product instance or of a dict of its
+    attnames (e.g. `Product._loaded_values`), or None if a field is missing.
+    """
+    if isinstance(values, dict):
+        if not all(field in values for field in ProductState._fields):
+            return None
+        return ProductState(*(values[field] for field in ProductState._fields))
+    return ProductState(*(getattr(values, field) for field in ProductState._fields))
+
+
+def product_states(queryset, chunk_size=1000):
+    """
+    Returns `{id: ProductState}` of the products of `queryset`.
+    """
+    rows = queryset.order_by().values_list('id', *ProductState._fields)
+    return {row[0]: ProductState(*row[1:]) for row in rows.iterator(chunk_size=chunk_size)}
+
+
+def reread_product_states(ids, using, chunk_size=1000):
+    """
+    Returns `{id: ProductState}` of the products `ids`, read in chunks.
+    """
+    states = {}
+    for start in range(0, len(ids), chunk_size):
+        states.update(product_states(Product.objects.using(using).filter(id__in=ids[start:start + chunk_size])))
+    return states
+
+
+def stats_keys(state):
+    if state is None:
+        return []
+    return [(CatalogStats.Scope.CATEGORY, str(state.category_id)), (CatalogStats.Scope.BASE_CODE, state.base_code)]
+
+
+def _group_products(scope, key):
+    return Product.objects.filter(**{GROUP_FIELDS[scope]: key})
+
+
+def _aggregate(products):
+    return products.aggregate(
+        product_count=Coalesce(Count('id'), 0),
+        in_stock_count=Coalesce(Count('id', filter=Q(quantity__gt=0)), 0),
+        total_stock=Coalesce(Sum('quantity'), 0),
+        min_price=Min('price'),
+        max_price=Max('price'),
+    )
+
+
+def _new_deltas():
+    return defaultdict(lambda: {'product_count': 0, 'in_stock_count': 0, 'total_stock': 0})
+
+
+def apply_stats_changes(changes, using=None):
+    """
+    Applies product changes, given as `(old_state, new_state)` pairs (None for
+    a created / deleted product), to the CatalogStats rows as deltas in the
+    current transaction. Counts and stock are added; the price range is
+    widened with LEAST/GREATEST and only recomputed from the group when a
+    removed price was one of its bounds. Rows of emptied groups are deleted.
+    """
+    deltas = _new_deltas()
+    added_prices = defaultdict(set)
+    removed_prices = defaultdict(set)
+    for old, new in changes:
+        for state, sign in ((old, -1), (new, 1)):
+            for key in stats_keys(state):
+                delta = deltas[key]
+                delta['product_count'] += sign
+                delta['in_stock_count'] += sign * (state.quantity > 0)
+                delta['total_stock'] += sign * state.quantity
+                (added_prices if sign > 0 else removed_prices)[key].add(Decimal(state.price))
+    _apply_deltas(deltas, added_prices, removed_prices, using)
+
+
+def group_aggregates(products):
+    """
+    Returns the stats of `products` per `(category_id, base_code)` pair.
+    """
+    groups = products.order_by().values_list('category_id', 'base_code').annotate(
+        product_count=Count('id'),
+        in_stock_count=Count('id', filter=Q(quantity__gt=0)),
+        total_stock=Coalesce(Sum('quantity'), 0),
+        min_price=Min('price'),
+        max_price=Max('price'),
+    )
+    return {(row[0], row[1]): row[2:] for row in groups}
+
+
+def apply_group_changes(before, after, using=None):
+    """
+    Applies the difference between two `group_aggregates` results of the
+    same products to the CatalogStats rows, like `apply_stats_changes`.
+    Only the bounds of a group's prices can move the stored price range, so
+    they stand for all of its prices.
+    """
+    deltas = _new_deltas()
+    added_prices = defaultdict(set)
+    removed_prices = defaultdict(set)
+    for groups, sign, prices in ((before, -1, removed_prices), (after, 1, added_prices)):
+        for (category_id, base_code), (count, in_stock, stock, low, high) in groups.items():
+            for key in stats_keys(ProductState(category_id, base_code, None, None)):
+                delta = deltas[key]
+                delta['product_count'] += sign * count
+                delta['in_stock_count'] += sign * in_stock
+                delta['total_stock'] += sign * stock
+                prices[key].update((Decimal(low), Decimal(high)))
+    _apply_deltas(deltas, added_prices, removed_prices, using)
+
+
+def _apply_deltas(deltas, added_prices, removed_prices, using):
+    using = using or router.db_for_write(CatalogStats)
+    now = timezone.now()
+    for key, delta in deltas.items():
+        added = added_prices[key]
+        removed = removed_prices[key] - added
+        if not any(delta.values()) and not removed and added <= removed_prices[key]:
+            continue  # e.g. a renamed product: nothing to change.
+        updates = {name: F(name) + value for name, value in delta.items()}
+        if added:
+            low, high = Value(min(added), output_field=PRICE_FIELD), Value(max(added), output_field=PRICE_FIELD)
+            updates['min_price'] = Least(Coalesce(F('min_price'), low), low)
+            updates['max_price'] = Greatest(Coalesce(F('max_price'), high), high)
+        rows = CatalogStats.objects.using(using).filter(scope=key[0], key=key[1])
+        if not rows.update(**updates, modified_time=now):
+            CatalogStats.objects.using(using).bulk_create(
+                [CatalogStats(scope=key[0], key=key[1])], ignore_conflicts=True,
+            )
+            rows.update(**updates, modified_time=now)
+        if delta['product_count'] < 0 and rows.filter(product_count__lte=0).delete()[0]:
+            continue  # The group is empty now.
+        if removed and rows.filter(Q(min_price__in=removed) | Q(max_price__in=removed)).exists():
+            rows.update(**_group_products(*key).using(using).aggregate(min_price=Min('price'), max_price=Max('price')))
+
+
+def update_with_stats(queryset, update):
+    """
+    Runs `update()` (an UPDATE of the products of `queryset`) and applies its
+    CatalogStats deltas in the same transaction. Up to
+    CATALOG_STATS_ROW_DELTA_LIMIT products are locked and read before and
+    after the UPDATE. Larger updates (e.g. an admin action on "select all")
+    compare per group aggregates of the id range they cover instead, so the
+    work stays a handful of queries; writes of other transactions landing
+    in that range meanwhile are left to `verify_catalog_stats`.
+    """
+    using = queryset.db
+    limit = settings.CATALOG_STATS_ROW_DELTA_LIMIT
+    with transaction.atomic(using=using):
+        rows = list(queryset.select_for_update().order_by('id').values_list('id', *ProductState._fields)[:limit + 1])
+        if len(rows) <= limit:
+            before = {row[0]: ProductState(*row[1:]) for row in rows}
+            updated = update()
+            after = reread_product_states(list(before), using)
+            apply_stats_changes([(state, after.get(pk)) for pk, state in before.items()], using=using)
+            return updated
+        bounds = queryset.aggregate(low=Min('id'), high=Max('id'))
+        window = Product.objects.using(using).filter(id__gte=bounds['low'], id__lte=bounds['high'])
+        before = group_aggregates(window)
+        updated = update()
+        apply_group_changes(before, group_aggregates(window), using=using)
+        return updated
+
+
+def refresh_catalog_stats(keys, using=None):
+    """
+    Recomputes the CatalogStats rows of the given `(scope, key)` pairs from
+    the products, locking each row while it is rewritten.
+    """
+    using = using or router.db_for_write(CatalogStats)
+    for scope, key in keys:
+        with transaction.atomic(using=using):
+            CatalogStats.objects.using(using).bulk_create([CatalogStats(scope=scope, key=key)], ignore_conflicts=True)
+            rows = CatalogStats.objects.using(using).select_for_update().filter(scope=scope, key=key)
+            list(rows)  # Locks the row until the recount is written.
+            values = _aggregate(_group_products(scope, key).using(using))
+            if values['product_count']:
+                rows.update(**values, modified_time=timezone.now())
+            else:
+                rows.delete()
+
+
+def verify_catalog_stats(repair=True):
+    """
+    Compares every CatalogStats row with the aggregates of the Product table
+    and returns the `(scope, key)` pairs that drifted (including missing and
+    stale rows). With `repair`, those groups are recomputed.
+    """
+    expected = {}
+    for scope, field in GROUP_FIELDS.items():
+        groups = Product.objects.values(field).annotate(
+            product_count=Count('id'),
+            in_stock_count=Count('id', filter=Q(quantity__gt=0)),
+            total_stock=Sum('quantity'),
+            min_price=Min('price'),
+            max_price=Max('price'),
+        ).order_by()
+        for group in groups.iterator():
+            expected[(scope, str(group.pop(field)))] = group
+
+    drifted = []
+    stored = CatalogStats.objects.values('scope', 'key', *STATS_FIELDS)
+    seen = set()
+    for row in stored.iterator():
+        key = (row.pop('scope'), row.pop('key'))
+        seen.add(key)
+        values = expected.get(key)
+        if values is None:
+            if row['product_count']:
+                drifted.append(key)
+        elif any(row[name] != values[name] for name in STATS_FIELDS):
+            drifted.append(key)
+    drifted += [key for key in expected if key not in seen]
+
+    if repair:
+        refresh_catalog_stats(drifted)
+    return drifted
+
+
+def catalog_stats(scope, keys):
+    """
+    Returns `{key: CatalogStats}` for the given keys of a scope.
+    """
+    return {row.key: row for row in CatalogStats.objects.filter(scope=scope, key__in=[str(key) for key in keys])}
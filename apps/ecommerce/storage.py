@@ -0,0 +1,97 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import transaction
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams every upload to a temporary file chunk by chunk (instead of
+    buffering small ones in memory) and computes its sha256 on the way, so
+    ContentAddressedStorage does not have to read the file again.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.hasher.hexdigest()
+        return file
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage naming files after the sha256 of their content:
+    `<upload_to>/ab/cd/abcd...<ext>`. Identical uploads end up as one file,
+    shared through ImageBlob reference counting. Content is streamed to a
+    temporary file in chunks while hashing, then moved into place atomically.
+    """
+    chunk_size = 64 * 1024
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in _save.
+        return name
+
+    def content_name(self, name, digest):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return '/'.join(part for part in (directory, digest[:2], digest[2:4], digest + extension) if part)
+
+    def _stream_to_temporary_file(self, content):
+        incoming = os.path.join(self.location, '.incoming')
+        os.makedirs(incoming, exist_ok=True)
+        hasher = hashlib.sha256()
+        fd, path = tempfile.mkstemp(dir=incoming)
+        try:
+            with os.fdopen(fd, 'wb') as temporary:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks(self.chunk_size):
+                    hasher.update(chunk)
+                    temporary.write(chunk)
+        except BaseException:
+            os.unlink(path)
+            raise
+        return path, hasher.hexdigest()
+
+    def _save(self, name, content):
+        from .images import register_image_blob
+
+        digest = getattr(content, 'sha256', None)
+        if digest and hasattr(content, 'temporary_file_path'):
+            source, owned = content.temporary_file_path(), False
+        else:
+            (source, digest), owned = self._stream_to_temporary_file(content), True
+
+        name = self.content_name(name, digest)
+        path = self.path(name)
+        size = os.path.getsize(source)
+        with transaction.atomic():
+            # Registering locks the blob row first, so the image garbage
+            # collector cannot delete the file between the check and the use.
+            register_image_blob(name, size)
+            if os.path.exists(path):
+                if owned:
+                    os.unlink(source)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if owned:
+                    os.replace(source, path)
+                else:
+                    try:
+                        file_move_safe(source, path)
+                    except FileExistsError:
+                        pass  # Stored by a concurrent upload of the same content.
+                if self.file_permissions_mode is not None:
+                    os.chmod(path, self.file_permissions_mode)
+        return name
@@ -0,0 +1,198 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+INDEX_FIELDS = ('id', 'name', 'sku', 'base_code', 'is_active')
+
+# Rows modified shortly before a sync may still be committing; every sync
+# re-reads this window, applying a row twice is harmless.
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+def index_keys(name, sku, base_code):
+    """
+    Returns the casefolded keys a product is found by: its full name, every
+    word of the name, its SKU and its base code.
+    """
+    name = name.casefold()
+    keys = {name, sku.casefold(), base_code.casefold(), *name.split()}
+    keys.discard('')
+    return sorted(keys)
+
+
+class SuggestIndex:
+    """
+    In-memory prefix index of the active products for typeahead suggestions.
+    Keys are kept in a sorted list of `(key, product_id)` pairs, so a prefix
+    lookup is a binary search followed by a short scan; hits are small dicts
+    built once per product.
+    The index is updated right away by the product write signals of this
+    process; everything else happens in a per-process maintenance thread
+    (`start`): it builds the index from a streaming query, syncs the writes
+    of other processes through the indexed `modified_time` column every
+    SUGGEST_INDEX_SYNC_SECONDS and rebuilds it every
+    SUGGEST_INDEX_REBUILD_SECONDS, which picks up rows changed without
+    touching modified_time (QuerySet.update, deletes in other processes).
+    Searches never query the database; until the first build finishes they
+    find nothing.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = []
+        self._products = {}
+        self._built = False
+        self._built_at = 0.0
+        self._synced_at = 0.0
+        self._watermark = None
+        self._thread = None
+        self._pid = None
+
+    def build(self):
+        """
+        Rebuilds the index from the database, streaming the products in chunks.
+        """
+        started = timezone.now()
+        products = {}
+        entries = []
+        rows = Product.objects.filter(is_active=True).values_list(*INDEX_FIELDS).iterator(chunk_size=2000)
+        for product_id, name, sku, base_code, _ in rows:
+            keys = index_keys(name, sku, base_code)
+            products[product_id] = ({'id': product_id, 'name': name, 'sku': sku, 'base_code': base_code}, keys)
+            entries.extend((key, product_id) for key in keys)
+        entries.sort()
+        with self._lock:
+            self._entries = entries
+            self._products = products
+            self._built = True
+            self._built_at = self._synced_at = time.monotonic()
+            self._watermark = started - SYNC_OVERLAP
+        return len(products)
+
+    def start(self):
+        """
+        Starts the maintenance thread of this process unless it is running.
+        A forked worker does not inherit the thread of its parent, so the
+        process id is checked as well.
+        """
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return self._thread
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='suggest-index', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+        return self._thread
+
+    def _run(self):
+        while True:
+            close_old_connections()
+            try:
+                self.maintain()
+            except DatabaseError:
+                logger.warning("Maintaining the suggest index failed", exc_info=True)
+            time.sleep(settings.SUGGEST_INDEX_SYNC_SECONDS)
+
+    def _remove(self, product_id):
+        current = self._products.pop(product_id, None)
+        if current is None:
+            return
+        for key in current[1]:
+            position = bisect_left(self._entries, (key, product_id))
+            if position < len(self._entries) and self._entries[position] == (key, product_id):
+                del self._entries[position]
+
+    def apply(self, rows):
+        """
+        Applies `(id, name, sku, base_code, is_active)` rows to the index:
+        active products are (re)indexed, inactive ones removed.
+        """
+        with self._lock:
+            if not self._built:
+                return
+            for product_id, name, sku, base_code, is_active in rows:
+                self._remove(product_id)
+                if not is_active:
+                    continue
+                keys = index_keys(name, sku, base_code)
+                self._products[product_id] = (
+                    {'id': product_id, 'name': name, 'sku': sku, 'base_code': base_code}, keys,
+                )
+                for key in keys:
+                    insort(self._entries, (key, product_id))
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+
+    def sync(self):
+        """
+        Applies the products modified since the last sync.
+        """
+        started = timezone.now()
+        rows = list(Product.objects.filter(modified_time__gte=self._watermark).values_list(*INDEX_FIELDS))
+        self.apply(rows)
+        with self._lock:
+            self._synced_at = time.monotonic()
+            self._watermark = started - SYNC_OVERLAP
+        return len(rows)
+
+    def maintain(self):
+        """
+        Builds the index when it is missing or due for a rebuild, otherwise
+        syncs it. Called by the maintenance thread.
+        """
+        if not self._built or time.monotonic() - self._built_at > settings.SUGGEST_INDEX_REBUILD_SECONDS:
+            self.build()
+        else:
+            self.sync()
+
+    def search(self, query, limit=10):
+        """
+        Returns up to `limit` products having a key starting with `query`,
+        ordered by the matching key.
+        """
+        prefix = query.strip().casefold()
+        if not prefix:
+            return []
+        hits = []
+        seen = set()
+        with self._lock:
+            position = bisect_left(self._entries, (prefix,))
+            while position < len(self._entries) and len(hits) < limit:
+                key, product_id = self._entries[position]
+                if not key.startswith(prefix):
+                    break
+                if product_id not in seen:
+                    seen.add(product_id)
+                    hits.append(self._products[product_id][0])
+                position += 1
+        return hits
+
+
+suggest_index = SuggestIndex()
+
+
+def _start_suggest_index(sender, **kwargs):
+    suggest_index.start()
+
+
+def start_suggest_index_in_workers():
+    """
+    Starts the suggest index maintenance thread of each worker process with
+    its first request. Called by the WSGI and ASGI entry points; no thread
+    is started at import time, so preloading servers fork without one.
+    """
+    request_started.connect(_start_suggest_index, dispatch_uid='start_suggest_index')
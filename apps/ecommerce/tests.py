@@ -1,9 +1,52 @@
-from django.test import TestCase
+import gzip
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.core.management import call_command
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.db.migrations.executor import MigrationExecutor
+from django.test.utils import CaptureQueriesContext
+from django.test import LiveServerTestCase, RequestFactory, TestCase, TransactionTestCase, override_settings
 from decimal import Decimal 
+from PIL import Image
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.urls import reverse
-from .models import Product, Category, Attributes, ProductAttribute
+from django.utils import timezone
+from .triggers import install_product_status_trigger, remove_product_status_trigger
+from .loadtest import LIST_SATURATION_MIX, LoadDriver, ServerConfig, list_saturation_violations, percentile
+from .middleware import AdmissionControlMiddleware
+from .inventory import available_quantity, compact_inventory, record_stock_movement
+from .models import (
+    Product, Category, Attributes, ProductAttribute, OutboxEvent, StockMovement, AttributeValue,
+    ArchivedProduct, ArchivedProductAttribute, DeletionJob, ImageBlob, RelatedProductRefresh,
+    CatalogStats,
+)
+from .archive import archive_inactive_products
+from .reference_cache import ReferenceDataCache
+from .routers import replica_reads
+from .suggest import SuggestIndex, suggest_index
+from .deletion import process_deletion_jobs
+from .images import collect_unreferenced_images
+from .related import compute_related_products
+from .stats import verify_catalog_stats
+from .profiling import ProfileStore, make_profile_token
+from .outbox import OutboxDispatcher, coalesce_events, lag_metrics
+from .snapshots import brotli, build_catalog_snapshots
 
 
 class ProductSignalTest(TestCase):
@@ -421,3 +464,1378 @@ class ProductAPITest(APITestCase):
         self.assertTrue(any(item['base_code'] == 'PHONE001' for item in data))
         self.assertFalse(any(item['base_code'] == 'SHIRT001' for item in data))
 
+
+class StubWebhookServer:
+    """
+    Minimal local HTTP server that records posted JSON bodies and answers with
+    the queued status codes (200 once the queue is empty).
+    """
+
+    def __init__(self, statuses=None):
+        self.requests = []
+        self.statuses = list(statuses or [])
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                stub.requests.append(json.loads(body))
+                code = stub.statuses.pop(0) if stub.statuses else 200
+                self.send_response(code)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/events"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class OutboxTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Outbox")
+        self.product = Product.objects.create(
+            name="Mug", base_code="MUG", sku="MUG-1", price=Decimal("10.00"), quantity=3, category=self.category
+        )
+
+    def test_events_written_for_price_change_and_stock_out(self):
+        self.product.price = Decimal("12.00")
+        self.product.quantity = 0
+        self.product.save()
+
+        events = OutboxEvent.objects.order_by('id')
+        self.assertEqual(
+            [e.event_type for e in events],
+            [OutboxEvent.EventType.PRICE_CHANGED, OutboxEvent.EventType.STOCK_OUT],
+        )
+        self.assertEqual(events[0].payload['previous_price'], '10.00')
+        self.assertFalse(events[1].payload['is_active'])
+
+    def test_no_event_for_unrelated_change_or_creation(self):
+        self.product.name = "Big Mug"
+        self.product.save()
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_event_rolls_back_with_product(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.product.price = Decimal("11.00")
+                self.product.save()
+                raise RuntimeError
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_coalesce_events_per_sku(self):
+        for price in ("11.00", "12.00", "13.00"):
+            self.product.price = Decimal(price)
+            self.product.save()
+        messages = coalesce_events(OutboxEvent.objects.all())
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0]['events'], [OutboxEvent.EventType.PRICE_CHANGED])
+        self.assertEqual(messages[0]['state']['price'], '13.00')
+        self.assertEqual(len(messages[0]['event_ids']), 3)
+
+    def test_dispatch_batches_and_marks_delivered(self):
+        for i in range(3):
+            Product.objects.create(
+                name=f"Cup {i}", base_code="CUP", sku=f"CUP-{i}", price=Decimal("5.00"), quantity=1,
+                category=self.category,
+            )
+        for product in Product.objects.all():
+            product.price += 1
+            product.save()
+
+        with StubWebhookServer() as stub:
+            delivered = OutboxDispatcher(url=stub.url, batch_size=2).dispatch_once()
+
+        self.assertEqual(delivered, 4)
+        self.assertEqual([len(r['messages']) for r in stub.requests], [2, 2])
+        self.assertFalse(OutboxEvent.objects.exclude(status=OutboxEvent.Status.DELIVERED).exists())
+        self.assertEqual(lag_metrics()['pending'], 0)
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        self.product.price = Decimal("20.00")
+        self.product.save()
+
+        with StubWebhookServer(statuses=[503]) as stub:
+            dispatcher = OutboxDispatcher(url=stub.url, backoff_base=60, max_attempts=2)
+            with self.assertLogs('apps.ecommerce.outbox', 'WARNING'):
+                self.assertEqual(dispatcher.dispatch_once(), 0)
+            event = OutboxEvent.objects.get()
+            self.assertEqual(event.status, OutboxEvent.Status.PENDING)
+            self.assertEqual(event.attempts, 1)
+            # Not due yet because of the backoff.
+            self.assertEqual(dispatcher.dispatch_once(), 0)
+
+            OutboxEvent.objects.update(available_time=event.created_time)
+            self.assertEqual(dispatcher.dispatch_once(), 1)
+
+        self.assertEqual(len(stub.requests), 2)
+        self.assertEqual(OutboxEvent.objects.get().status, OutboxEvent.Status.DELIVERED)
+
+    def test_failed_attempt_queries_do_not_grow_with_batch(self):
+        dispatcher = OutboxDispatcher(url="http://outbox.invalid/", max_attempts=2)
+
+        def mark_failed(count):
+            events = OutboxEvent.objects.bulk_create(
+                OutboxEvent(event_type=OutboxEvent.EventType.PRICE_CHANGED, sku=f"MUG-{i}") for i in range(count)
+            )
+            with self.assertLogs('apps.ecommerce.outbox', 'WARNING'):
+                with CaptureQueriesContext(connections['default']) as queries:
+                    dispatcher._mark_failed_attempt([event.id for event in events], RuntimeError("down"))
+            return len(queries.captured_queries)
+
+        self.assertEqual(mark_failed(1), mark_failed(50))
+        self.assertEqual(set(OutboxEvent.objects.values_list('attempts', flat=True)), {1})
+
+    def test_event_marked_failed_after_max_attempts(self):
+        self.product.quantity = 0
+        self.product.save()
+
+        with StubWebhookServer(statuses=[500]) as stub, self.assertLogs('apps.ecommerce.outbox', 'WARNING'):
+            OutboxDispatcher(url=stub.url, max_attempts=1).dispatch_once()
+
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.status, OutboxEvent.Status.FAILED)
+        self.assertEqual(lag_metrics()['failed'], 1)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], DATABASE_REPLICA_STICKY_SECONDS=60)
+class ReplicaRoutingTest(APITestCase):
+    """
+    Uses the `replica` SQLite database of the settings as a stand-in replica.
+    Rows are written to each database separately so the response tells which
+    one served the read.
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        Category.objects.create(name="Primary")
+        Category.objects.using('replica').create(name="Replica")
+        self.list_url = reverse('api:category-list')
+
+    def category_names(self):
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [c['name'] for c in response.json()['results']]
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.category_names(), ["Replica"])
+
+    def test_writes_go_to_primary_and_stick(self):
+        response = self.client.post(self.list_url, {'name': "Written"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Category.objects.filter(name="Written").exists())
+        self.assertFalse(Category.objects.using('replica').filter(name="Written").exists())
+
+        # The client's signed pin cookie keeps its reads on the primary.
+        self.assertEqual(self.category_names(), ["Primary", "Written"])
+
+    def test_stickiness_expires(self):
+        self.client.post(self.list_url, {'name': "Written"}, format='json')
+        with override_settings(DATABASE_REPLICA_STICKY_SECONDS=0):
+            self.assertEqual(self.category_names(), ["Replica"])
+
+    def test_forged_pin_cookie_is_ignored(self):
+        self.client.cookies['db_primary_pin'] = '1'
+        self.assertEqual(self.category_names(), ["Replica"])
+
+    def test_reference_cache_reads_primary(self):
+        cache = ReferenceDataCache(Category)
+        with replica_reads():
+            self.assertEqual([category.name for category in cache.all()], ["Primary"])
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertEqual(list(Category.objects.values_list('name', flat=True)), ["Primary"])
+
+
+class CatalogSnapshotTest(APITestCase):
+    def setUp(self):
+        self.shoes = Category.objects.create(name="Shoes")
+        self.hats = Category.objects.create(name="Hats")
+        Product.objects.create(name="Runner", base_code="RUN", sku="RUN-42", price=Decimal("90.00"), quantity=3, category=self.shoes)
+        Product.objects.create(name="Runner", base_code="RUN", sku="RUN-43", price=Decimal("90.00"), quantity=0, category=self.shoes)
+        Product.objects.create(name="Cap", base_code="CAP", sku="CAP-1", price=Decimal("15.00"), quantity=9, category=self.hats)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_snapshots_match_api_listing(self):
+        self.assertEqual(build_catalog_snapshots(self.root), 3)
+
+        catalog = json.loads((self.root / 'catalog.json').read_bytes())
+        self.assertEqual(catalog, self.client.get(reverse('api:product-list')).json())
+        self.assertEqual(json.loads(gzip.decompress((self.root / 'catalog.json.gz').read_bytes())), catalog)
+        if brotli is not None:
+            self.assertEqual(json.loads(brotli.decompress((self.root / 'catalog.json.br').read_bytes())), catalog)
+
+        shoes = json.loads((self.root / 'categories' / f"{self.shoes.id}.json").read_bytes())
+        self.assertEqual(shoes, self.client.get(reverse('api:product-list'), {'category': self.shoes.id}).json())
+        self.assertEqual([v['sku'] for v in shoes[0]['variants']], ["RUN-42"])
+
+    def test_stale_category_snapshots_are_removed(self):
+        build_catalog_snapshots(self.root)
+        hats_id = self.hats.id
+        Product.objects.filter(category=self.hats).delete()
+        self.hats.delete()
+        build_catalog_snapshots(self.root)
+
+        self.assertFalse((self.root / 'categories' / f"{hats_id}.json").exists())
+        self.assertFalse((self.root / 'categories' / f"{hats_id}.json.gz").exists())
+        self.assertEqual([p.name for p in self.root.rglob('.*')], [])
+
+
+ADMISSION_TEST_CONFIG = {
+    'MAX_INFLIGHT': 4,
+    'LOW_PRIORITY_MAX_INFLIGHT': 2,
+    'CLIENT_RATE': 1000.0,
+    'CLIENT_BURST': 1000,
+    'ROUTES': [
+        {'pattern': r'^/api/products/$', 'methods': ['GET'], 'max_concurrency': 2, 'cost': 5, 'priority': 'low'},
+    ],
+}
+
+
+class AdmissionControlTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def middleware(self, get_response=None, **overrides):
+        with override_settings(ADMISSION_CONTROL={**ADMISSION_TEST_CONFIG, **overrides}):
+            return AdmissionControlMiddleware(get_response or (lambda request: HttpResponse()))
+
+    def test_client_token_bucket_returns_429(self):
+        middleware = self.middleware(CLIENT_RATE=1.0, CLIENT_BURST=2)
+        statuses = [middleware(self.factory.get('/api/products/1/')).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        response = middleware(self.factory.get('/api/products/1/'))
+        self.assertEqual(response['Retry-After'], '1')
+
+        other_client = self.factory.get('/api/products/1/', REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(middleware(other_client).status_code, 200)
+
+    def test_expensive_route_costs_more_tokens(self):
+        middleware = self.middleware(CLIENT_RATE=1.0, CLIENT_BURST=5)
+        self.assertEqual(middleware(self.factory.get('/api/products/')).status_code, 200)
+        response = middleware(self.factory.get('/api/products/'))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '5')
+
+    def test_route_concurrency_limit_returns_503(self):
+        release = threading.Event()
+        started = threading.Semaphore(0)
+
+        def slow(request):
+            started.release()
+            release.wait(5)
+            return HttpResponse()
+
+        middleware = self.middleware(slow)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            running = [pool.submit(middleware, self.factory.get('/api/products/')) for _ in range(2)]
+            started.acquire()
+            started.acquire()
+            response = middleware(self.factory.get('/api/products/'))
+            release.set()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual([f.result().status_code for f in running], [200, 200])
+        # Slots are released once the requests finish.
+        self.assertEqual(middleware(self.factory.get('/api/products/')).status_code, 200)
+
+    def test_detail_requests_are_admitted_while_list_is_saturated(self):
+        release = threading.Event()
+        started = threading.Semaphore(0)
+
+        def view(request):
+            if request.path == '/api/products/':
+                started.release()
+                release.wait(5)
+            return HttpResponse()
+
+        middleware = self.middleware(view)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            running = [pool.submit(middleware, self.factory.get('/api/products/')) for _ in range(2)]
+            started.acquire()
+            started.acquire()
+            list_status = middleware(self.factory.get('/api/products/')).status_code
+            detail_statuses = [middleware(self.factory.get(f'/api/products/{i}/')).status_code for i in range(10)]
+            release.set()
+        self.assertEqual(list_status, 503)
+        self.assertEqual(detail_statuses, [200] * 10)
+        self.assertEqual([f.result().status_code for f in running], [200, 200])
+
+    def test_client_supplied_headers_do_not_reset_the_bucket(self):
+        middleware = self.middleware(CLIENT_RATE=1.0, CLIENT_BURST=1)
+        statuses = [
+            middleware(self.factory.get(
+                '/api/products/1/', HTTP_X_REAL_IP=f'10.0.0.{i}', HTTP_AUTHORIZATION=f'Token {i}',
+            )).status_code
+            for i in range(3)
+        ]
+        self.assertEqual(statuses, [200, 429, 429])
+
+        proxied = self.middleware(CLIENT_RATE=1.0, CLIENT_BURST=1, CLIENT_IP_HEADER='HTTP_X_REAL_IP')
+        statuses = [proxied(self.factory.get('/api/products/1/', HTTP_X_REAL_IP=ip)).status_code
+                    for ip in ('10.0.0.1', '10.0.0.2', '10.0.0.1')]
+        self.assertEqual(statuses, [200, 200, 429])
+
+    def test_least_recently_used_clients_are_evicted(self):
+        middleware = self.middleware(CLIENT_RATE=1.0, CLIENT_BURST=1, MAX_TRACKED_CLIENTS=2)
+        request = lambda ip: middleware(self.factory.get('/api/products/1/', REMOTE_ADDR=ip)).status_code
+        self.assertEqual([request('10.0.0.1'), request('10.0.0.2')], [200, 200])
+        self.assertEqual(request('10.0.0.1'), 429)  # 10.0.0.1 is now the most recently used.
+        self.assertEqual(request('10.0.0.3'), 200)  # Evicts 10.0.0.2 only.
+        self.assertEqual(request('10.0.0.1'), 429)
+
+
+class RequestProfilingTest(APITestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(REQUEST_PROFILING={
+            'SAMPLE_RATE': 0.0, 'ROOT': self.tmp.name, 'MAX_PROFILES': 2, 'TOKEN_MAX_AGE': 60,
+        })
+        self.settings_override.enable()
+        category = Category.objects.create(name="Profiled")
+        Product.objects.create(name="Lamp", base_code="LAMP", sku="LAMP-1", price=Decimal("30.00"), quantity=1, category=category)
+        self.list_url = reverse('api:product-list')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.tmp.cleanup()
+
+    def test_requests_are_not_profiled_by_default(self):
+        response = self.client.get(self.list_url)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(ProfileStore().ids(), [])
+
+    def test_invalid_token_is_ignored(self):
+        response = self.client.get(self.list_url, HTTP_X_PROFILE_TOKEN='profile:forged:token')
+        self.assertNotIn('X-Profile-Id', response)
+
+    def test_signed_token_captures_profile_with_sql_time(self):
+        response = self.client.get(self.list_url, HTTP_X_PROFILE_TOKEN=make_profile_token())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        store = ProfileStore()
+        self.assertEqual(store.ids(), [response['X-Profile-Id']])
+        metadata = store.metadata(response['X-Profile-Id'])
+        self.assertEqual(metadata['path'], self.list_url)
+        self.assertGreater(metadata['sql_count'], 0)
+
+        out = StringIO()
+        call_command('request_profiles', '--top', '5', stdout=out)
+        self.assertIn(response['X-Profile-Id'], out.getvalue())
+        self.assertIn("Hottest functions", out.getvalue())
+
+    def test_sampled_profiles_are_kept_in_a_bounded_ring_buffer(self):
+        with self.settings(REQUEST_PROFILING={**settings.REQUEST_PROFILING, 'SAMPLE_RATE': 1.0}):
+            profile_ids = [self.client.get(self.list_url)['X-Profile-Id'] for _ in range(3)]
+        self.assertEqual(ProfileStore().ids(), profile_ids[1:])
+
+
+class LoadTestHarnessTest(LiveServerTestCase):
+    def test_server_config_parsing(self):
+        config = ServerConfig.parse('gunicorn-gthread:2x8')
+        self.assertEqual((config.workers, config.threads), (2, 8))
+        self.assertIn('gthread', config.command(8000))
+        self.assertEqual(ServerConfig.parse('uvicorn').label, 'uvicorn:1')
+        with self.assertRaises(ValueError):
+            ServerConfig.parse('waitress:2')
+
+    def test_percentile(self):
+        values = [i / 100 for i in range(1, 101)]
+        self.assertEqual(percentile(values, 0.5), 0.5)
+        self.assertEqual(percentile(values, 0.99), 0.99)
+        self.assertEqual(percentile([], 0.99), 0.0)
+
+    def test_driver_reports_every_endpoint(self):
+        call_command('seed_catalog', '--categories', '2', '--base-codes', '5', '--variants', '2', stdout=StringIO())
+        product_ids = list(Product.objects.values_list('id', flat=True))
+
+        results = LoadDriver(self.live_server_url, product_ids, clients=2, duration=1.0).run()
+
+        self.assertEqual(set(results), {'browse', 'search', 'detail', 'stock_update', 'total'})
+        self.assertGreater(results['total']['requests'], 0)
+        self.assertEqual(results['total']['error_rate'], 0.0)
+        # Stock updates are partial and must keep the product's attributes.
+        self.assertEqual(ProductAttribute.objects.filter(product__isnull=False).count(), 30)
+
+
+@override_settings(ADMISSION_CONTROL={
+    **settings.ADMISSION_CONTROL, 'CLIENT_RATE': 1e6, 'CLIENT_BURST': 10 ** 6,
+    'ROUTES': [{'pattern': r'^/api/products/$', 'methods': ['GET'], 'max_concurrency': 1, 'cost': 5, 'priority': 'low'}],
+})
+class ListSaturationLoadTest(LiveServerTestCase):
+    def test_detail_p99_is_bounded_while_list_is_shed(self):
+        call_command('seed_catalog', '--categories', '2', '--base-codes', '5', '--variants', '2', stdout=StringIO())
+        product_ids = list(Product.objects.values_list('id', flat=True))
+
+        results = LoadDriver(self.live_server_url, product_ids, clients=8, duration=1.0, mix=LIST_SATURATION_MIX).run()
+
+        self.assertGreater(results['browse']['shed'], 0)
+        self.assertEqual(results['detail']['error_rate'], 0.0)
+        self.assertEqual(list_saturation_violations(results, detail_p99_ms=5000), [])
+        self.assertEqual(
+            list_saturation_violations(results, detail_p99_ms=0),
+            [f"detail p99 {results['detail']['p99_ms']:.1f} ms exceeds 0 ms"],
+        )
+
+
+class VariantResolverTest(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Apparel")
+        self.color = Attributes.objects.create(name="Color", is_variant=True)
+        self.size = Attributes.objects.create(name="Size", is_variant=True)
+        self.material = Attributes.objects.create(name="Material", is_variant=False)
+        self.products = {}
+        for sku, color, size, quantity in (
+            ("TEE-RED-M", "Red", "M", 5),
+            ("TEE-RED-L", "Red", "L", 0),
+            ("TEE-BLUE-M", "Blue", "M", 2),
+        ):
+            product = Product.objects.create(
+                name="Tee", base_code="TEE", sku=sku, price=Decimal("9.90"), quantity=quantity, category=self.category,
+            )
+            ProductAttribute.objects.create(product=product, attribute=self.color, value=color)
+            ProductAttribute.objects.create(product=product, attribute=self.size, value=size)
+            ProductAttribute.objects.create(product=product, attribute=self.material, value="Cotton")
+            self.products[sku] = product
+        self.url = reverse('api:product-resolve')
+
+    def test_signature_maintained_from_attribute_writes(self):
+        product = Product.objects.get(sku="TEE-RED-M")
+        self.assertEqual(product.variant_options, {'color': 'red', 'size': 'm'})
+
+        ProductAttribute.objects.filter(product=product, attribute=self.size).get().delete()
+        product.refresh_from_db()
+        self.assertEqual(product.variant_options, {'color': 'red'})
+
+        self.material.is_variant = True
+        self.material.save()
+        product.refresh_from_db()
+        self.assertEqual(product.variant_options, {'color': 'red', 'material': 'cotton'})
+
+    def test_resolve_variant_and_in_stock_combinations(self):
+        response = self.client.get(self.url, {'base_code': "TEE", 'color': " red", 'Size': "M"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['product']['sku'], "TEE-RED-M")
+        self.assertTrue(data['in_stock'])
+        self.assertEqual(
+            [a['options'] for a in data['available']],
+            [{'color': 'red', 'size': 'm'}, {'color': 'blue', 'size': 'm'}],
+        )
+
+    def test_out_of_stock_and_missing_combinations(self):
+        data = self.client.get(self.url, {'base_code': "TEE", 'color': "Red", 'size': "L"}).json()
+        self.assertEqual(data['product']['sku'], "TEE-RED-L")
+        self.assertFalse(data['in_stock'])
+
+        data = self.client.get(self.url, {'base_code': "TEE", 'color': "Blue", 'size': "L"}).json()
+        self.assertIsNone(data['product'])
+        self.assertEqual(len(data['available']), 2)
+
+    def test_resolve_errors(self):
+        self.assertEqual(self.client.get(self.url, {'color': "Red"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'base_code': "NOPE"}).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_api_create_sets_signature(self):
+        response = self.client.post(reverse('api:product-list'), {
+            "base_code": "TEE", "sku": "TEE-BLUE-L", "name": "Tee", "price": "9.90", "quantity": 1,
+            "category_id": self.category.id,
+            "product_attributes": [
+                {"attribute_id": self.color.id, "value": "Blue"},
+                {"attribute_id": self.size.id, "value": "L"},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+        self.assertEqual(response.json()['variant_options'], {'color': 'blue', 'size': 'l'})
+
+        data = self.client.get(self.url, {'base_code': "TEE", 'color': "blue", 'size': "l"}).json()
+        self.assertEqual(data['product']['sku'], "TEE-BLUE-L")
+
+    def test_bulk_created_attributes_set_signature(self):
+        call_command('seed_catalog', '--categories', '1', '--base-codes', '2', '--variants', '2', stdout=StringIO())
+        seeded = Product.objects.filter(base_code="BC000000").order_by('sku')
+        self.assertEqual(
+            [product.variant_options for product in seeded],
+            [{'color': 'black', 'size': 'xs'}, {'color': 'white', 'size': 's'}],
+        )
+        data = self.client.get(self.url, {'base_code': "BC000000", 'color': "White", 'size': "S"}).json()
+        self.assertEqual(data['product']['sku'], "BC000000-01")
+
+
+class InventoryLedgerTest(APITestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Flash sale")
+        self.hot = Product.objects.create(
+            name="Console", base_code="CON", sku="CON-1", price=Decimal("499.00"), quantity=3, category=category,
+        )
+        self.empty = Product.objects.create(
+            name="Controller", base_code="CTL", sku="CTL-1", price=Decimal("59.00"), quantity=0, category=category,
+        )
+
+    def test_movements_do_not_touch_product_until_compaction(self):
+        for _ in range(2):
+            record_stock_movement(self.hot.id, -1)
+        self.hot.refresh_from_db()
+        self.assertEqual(self.hot.quantity, 3)
+        self.assertEqual(available_quantity(self.hot), 1)
+
+        self.assertEqual(compact_inventory(), 1)
+        self.hot.refresh_from_db()
+        self.assertEqual(self.hot.quantity, 1)
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_compaction_updates_is_active_and_writes_outbox_events(self):
+        for _ in range(3):
+            record_stock_movement(self.hot.id, -1)
+        record_stock_movement(self.empty.id, 10, reason='restock')
+        compact_inventory(batch_size=1)
+
+        self.hot.refresh_from_db()
+        self.empty.refresh_from_db()
+        self.assertEqual((self.hot.quantity, self.hot.is_active), (0, False))
+        self.assertEqual((self.empty.quantity, self.empty.is_active), (10, True))
+        self.assertEqual(
+            set(OutboxEvent.objects.values_list('sku', 'event_type')),
+            {("CON-1", OutboxEvent.EventType.STOCK_OUT), ("CTL-1", OutboxEvent.EventType.BACK_IN_STOCK)},
+        )
+
+    def test_movement_committed_during_compaction_is_kept(self):
+        late_id = [record_stock_movement(self.hot.id, -1).id for _ in range(3)][1]
+        StockMovement.objects.filter(id=late_id).delete()
+
+        def commit_late_movement(*args, **kwargs):
+            # Commits below the high-water mark after the movements were read.
+            StockMovement.objects.create(id=late_id, product=self.hot, delta=-1, slot=0)
+            return bulk_create(*args, **kwargs)
+
+        bulk_create = OutboxEvent.objects.bulk_create
+        with mock.patch.object(OutboxEvent.objects, 'bulk_create', side_effect=commit_late_movement):
+            compact_inventory()
+        self.hot.refresh_from_db()
+        self.assertEqual(self.hot.quantity, 1)
+        self.assertEqual(list(StockMovement.objects.values_list('id', flat=True)), [late_id])
+        self.assertEqual(available_quantity(self.hot), 0)
+
+    def test_oversell_is_reported_not_dropped(self):
+        for _ in range(5):
+            record_stock_movement(self.hot.id, -1)
+        self.assertEqual(available_quantity(self.hot), -2)
+
+        with self.assertLogs('apps.ecommerce.inventory', 'WARNING'):
+            compact_inventory()
+        self.hot.refresh_from_db()
+        self.assertEqual(self.hot.quantity, 0)
+        oversold = OutboxEvent.objects.get(event_type=OutboxEvent.EventType.OVERSOLD)
+        self.assertEqual((oversold.sku, oversold.payload['shortfall']), ("CON-1", 2))
+
+    def test_movements_spread_over_counter_slots(self):
+        with self.settings(INVENTORY_COUNTER_SLOTS=4):
+            slots = {record_stock_movement(self.hot.id, 1).slot for _ in range(50)}
+        self.assertTrue(slots <= {0, 1, 2, 3})
+        self.assertGreater(len(slots), 1)
+
+    def test_stock_movement_endpoint(self):
+        url = reverse('api:product-stock-movements', kwargs={'pk': self.hot.id})
+        response = self.client.post(url, {'delta': -2, 'reason': 'order'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED, response.content)
+        self.assertEqual(available_quantity(self.hot), 1)
+
+        missing = reverse('api:product-stock-movements', kwargs={'pk': 0})
+        self.assertEqual(self.client.post(missing, {'delta': 1}, format='json').status_code, status.HTTP_404_NOT_FOUND)
+        invalid = reverse('api:product-stock-movements', kwargs={'pk': 'abc'})
+        self.assertEqual(self.client.post(invalid, {'delta': 1}, format='json').status_code, status.HTTP_404_NOT_FOUND)
+
+
+class AttributeValueInterningTest(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Knitwear")
+        self.color = Attributes.objects.create(name="Color", is_variant=True)
+        self.products = [
+            Product.objects.create(
+                name="Sweater", base_code="SW", sku=f"SW-{i}", price=Decimal("40.00"), quantity=1, category=self.category,
+            )
+            for i in range(3)
+        ]
+
+    def test_values_are_shared_between_product_attributes(self):
+        for product in self.products:
+            ProductAttribute.objects.create(product=product, attribute=self.color, value="Red")
+        ProductAttribute.objects.bulk_create([
+            ProductAttribute(product=self.products[0], attribute=self.color, value="Red"),
+            ProductAttribute(product=self.products[1], attribute=self.color, value="Blue"),
+        ])
+        self.assertEqual(ProductAttribute.objects.count(), 5)
+        self.assertEqual(sorted(AttributeValue.objects.values_list('value', flat=True)), ["Blue", "Red"])
+
+        product_attribute = ProductAttribute.objects.filter(attribute_value__value="Blue").get()
+        self.assertEqual(product_attribute.value, "Blue")
+        product_attribute.value = "Green"
+        product_attribute.save(update_fields=['modified_time'])
+        product_attribute.refresh_from_db()
+        self.assertEqual(product_attribute.value, "Green")
+
+    def test_api_payloads_stay_backward_compatible_and_filter_by_value_id(self):
+        url = reverse('api:product-attribute-list')
+        response = self.client.post(url, {
+            'product': self.products[0].id, 'attribute_id': self.color.id, 'value': "Red",
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+        self.assertEqual(response.json()['value'], "Red")
+        red = AttributeValue.objects.get(value="Red")
+        self.assertEqual(response.json()['attribute_value'], red.id)
+
+        data = self.client.get(reverse('api:product-list'), {'product_attributes__attribute_value': red.id}).json()
+        self.assertEqual([group['base_code'] for group in data], ["SW"])
+        self.assertEqual(data[0]['variants'][0]['product_attributes'][0]['value'], "Red")
+
+        facets = self.client.get(reverse('api:attribute-value-list'), {'attribute': self.color.id}).json()
+        self.assertEqual(facets['results'], [
+            {'id': red.id, 'attribute': self.color.id, 'value': "Red", 'product_count': 1},
+        ])
+
+
+class InternAttributeValuesMigrationTest(TransactionTestCase):
+    before = [('ecommerce', '0008_attributevalue')]
+    after = [('ecommerce', '0010_remove_productattribute_value')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connections['default'])
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_values_are_interned_in_batches(self):
+        executor = MigrationExecutor(connections['default'])
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        Category = apps.get_model('ecommerce', 'Category')
+        Product = apps.get_model('ecommerce', 'Product')
+        HistoricalAttributes = apps.get_model('ecommerce', 'Attributes')
+        HistoricalProductAttribute = apps.get_model('ecommerce', 'ProductAttribute')
+
+        category = Category.objects.create(name="Legacy")
+        size = HistoricalAttributes.objects.create(name="Size")
+        products = [
+            Product.objects.create(base_code="L", sku=f"L-{i}", name="Legacy", price=1, quantity=1, category=category)
+            for i in range(3)
+        ]
+        for product, value in zip(products, ["M", "M", "XL"]):
+            HistoricalProductAttribute.objects.create(product=product, attribute=size, value=value)
+
+        executor = MigrationExecutor(connections['default'])
+        executor.loader.build_graph()
+        executor.migrate(self.after)
+
+        self.assertEqual(sorted(AttributeValue.objects.values_list('value', flat=True)), ["M", "XL"])
+        self.assertEqual(
+            sorted(ProductAttribute.objects.values_list('attribute_value__value', flat=True)), ["M", "M", "XL"],
+        )
+
+
+class ProductStatusInvariantsMigrationTest(TransactionTestCase):
+    before = [('ecommerce', '0010_remove_productattribute_value')]
+    after = [('ecommerce', '0011_product_status_invariants')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connections['default'])
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_non_positive_prices_are_reported_before_the_constraint(self):
+        executor = MigrationExecutor(connections['default'])
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        category = apps.get_model('ecommerce', 'Category').objects.create(name="Legacy")
+        HistoricalProduct = apps.get_model('ecommerce', 'Product')
+        free = HistoricalProduct.objects.create(
+            base_code="F", sku="FREE-1", name="Free", price=0, quantity=1, category=category,
+        )
+
+        executor = MigrationExecutor(connections['default'])
+        executor.loader.build_graph()
+        with self.assertRaisesMessage(RuntimeError, "1 products have a non-positive price (e.g. FREE-1)"):
+            executor.migrate(self.after)
+
+        HistoricalProduct.objects.filter(id=free.id).update(price=1)
+        executor = MigrationExecutor(connections['default'])
+        executor.loader.build_graph()
+        executor.migrate(self.after)
+
+
+class ProductStatusInvariantTest(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Bulk")
+        self.product = Product.objects.create(
+            name="Pen", base_code="PEN", sku="PEN-1", price=Decimal("2.00"), quantity=10, category=self.category,
+        )
+
+    def test_bulk_paths_deactivate_products_without_stock(self):
+        Product.objects.bulk_create([Product(
+            name="Pencil", base_code="PCL", sku="PCL-1", price=Decimal("1.00"), quantity=0, is_active=True,
+            category=self.category,
+        )])
+        self.assertFalse(Product.objects.get(sku="PCL-1").is_active)
+
+        Product.objects.filter(id=self.product.id).update(quantity=0)
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.is_active)
+
+        # Restocking does not force activation.
+        Product.objects.filter(id=self.product.id).update(quantity=5, is_active=True)
+        self.product.refresh_from_db()
+        self.assertTrue(self.product.is_active)
+
+    def test_bulk_paths_raise_value_error_for_non_positive_price(self):
+        with self.assertRaisesMessage(ValueError, "Product price must be greater than zero."):
+            with transaction.atomic():
+                Product.objects.filter(id=self.product.id).update(price=0)
+
+        self.product.price = Decimal("-1.00")
+        with self.assertRaisesMessage(ValueError, "Product price must be greater than zero."):
+            with transaction.atomic():
+                Product.objects.bulk_update([self.product], ['price'])
+
+    def test_api_rejects_non_positive_price(self):
+        url = reverse('api:product-detail', kwargs={'pk': self.product.id})
+        response = self.client.patch(url, {'price': "0.00"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['price'], ["Product price must be greater than zero."])
+
+    def test_reconcile_command_fixes_existing_drift(self):
+        remove_product_status_trigger(connections['default'])
+        try:
+            Product.objects.filter(id=self.product.id).update(quantity=0)
+        finally:
+            install_product_status_trigger(connections['default'])
+
+        out = StringIO()
+        call_command('reconcile_product_status', '--dry-run', stdout=out)
+        self.assertIn("Would deactivate 1 products", out.getvalue())
+        call_command('reconcile_product_status', '--batch-size', '1', stdout=out)
+        self.assertIn("Deactivated 1 products", out.getvalue())
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.is_active)
+
+
+class ProductArchiveTest(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Archive")
+        self.color = Attributes.objects.create(name="color", is_variant=True)
+        self.live = Product.objects.create(
+            name="Mug", base_code="MUG", sku="MUG-RED", price=Decimal("5.00"), quantity=3, category=self.category,
+        )
+        self.old = Product.objects.create(
+            name="Mug", base_code="MUG", sku="MUG-BLUE", price=Decimal("5.00"), quantity=0, category=self.category,
+        )
+        ProductAttribute.objects.create(product=self.old, attribute=self.color, value="blue")
+        self.old.refresh_from_db()
+        self.long_ago = timezone.now() - timedelta(days=400)
+        Product.objects.filter(id=self.old.id).update(modified_time=self.long_ago, created_time=self.long_ago)
+
+    def test_archives_long_inactive_products_with_attributes(self):
+        recent = Product.objects.create(
+            name="Cup", base_code="CUP", sku="CUP-1", price=Decimal("3.00"), quantity=0, category=self.category,
+        )
+        self.assertEqual(archive_inactive_products(days=180, batch_size=1), 1)
+
+        self.assertFalse(Product.objects.filter(id=self.old.id).exists())
+        self.assertTrue(Product.objects.filter(id=recent.id).exists())
+        archived = ArchivedProduct.objects.get(id=self.old.id)
+        self.assertEqual(archived.sku, "MUG-BLUE")
+        self.assertEqual(archived.variant_signature, self.old.variant_signature)
+        self.assertEqual([a.value for a in ArchivedProductAttribute.objects.filter(product=archived)], ["blue"])
+        self.assertFalse(ProductAttribute.objects.filter(product_id=self.old.id).exists())
+
+    def test_product_sold_out_by_compaction_is_not_archived(self):
+        Product.objects.filter(id=self.live.id).update(modified_time=self.long_ago)
+        record_stock_movement(self.live.id, -3)
+        compact_inventory()
+        self.assertEqual(archive_inactive_products(days=180), 1)  # Only the old product.
+        self.assertTrue(Product.objects.filter(id=self.live.id, is_active=False).exists())
+
+    def test_include_archived_read_path(self):
+        archive_inactive_products(days=180)
+        url = reverse('api:product-detail', kwargs={'pk': self.old.id})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get(url, {'include_archived': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.json()['is_archived'])
+        self.assertEqual(response.json()['product_attributes'][0]['value'], "blue")
+
+        groups = self.client.get(reverse('api:product-list'), {'include_archived': 'true'}).json()
+        self.assertEqual([p['sku'] for p in groups[0]['archived']], ["MUG-BLUE"])
+        self.assertNotIn('archived', self.client.get(reverse('api:product-list')).json()[0])
+
+    def test_restock_restores_archived_product(self):
+        archive_inactive_products(days=180)
+        url = reverse('api:product-detail', kwargs={'pk': self.old.id})
+        response = self.client.patch(url, {'quantity': 4}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(ArchivedProduct.objects.filter(id=self.old.id).exists())
+        product = Product.objects.get(id=self.old.id)
+        self.assertEqual(product.quantity, 4)
+        self.assertEqual(product.created_time, self.long_ago)
+        self.assertEqual([a.value for a in product.product_attributes.all()], ["blue"])
+        self.assertTrue(OutboxEvent.objects.filter(
+            sku="MUG-BLUE", event_type=OutboxEvent.EventType.BACK_IN_STOCK,
+        ).exists())
+
+    def test_stock_movement_restores_archived_product(self):
+        archive_inactive_products(days=180)
+        url = reverse('api:product-stock-movements', kwargs={'pk': self.old.id})
+        response = self.client.post(url, {'delta': 2}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(Product.objects.filter(id=self.old.id).exists())
+
+
+class ReferenceDataCacheTest(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Cached")
+        self.color = Attributes.objects.create(name="color", is_variant=True)
+        self.product = Product.objects.create(
+            name="Scarf", base_code="SCF", sku="SCF-1", price=Decimal("9.00"), quantity=2, category=self.category,
+        )
+        ProductAttribute.objects.create(product=self.product, attribute=self.color, value="red")
+
+    def assertNoReferenceQueries(self, queries):
+        tables = (Category._meta.db_table, Attributes._meta.db_table)
+        for query in queries:
+            self.assertFalse(any(f'"{table}"' in query['sql'] for table in tables), query['sql'])
+
+    def test_product_reads_and_writes_use_cached_reference_data(self):
+        self.client.get(reverse('api:product-detail', kwargs={'pk': self.product.id}))  # Warms the cache.
+
+        with CaptureQueriesContext(connections['default']) as queries:
+            detail = self.client.get(reverse('api:product-detail', kwargs={'pk': self.product.id})).json()
+            created = self.client.post(reverse('api:product-list'), {
+                'name': "Scarf", 'base_code': "SCF", 'sku': "SCF-2", 'price': "9.00", 'quantity': 1,
+                'category_id': self.category.id,
+                'product_attributes': [{'attribute_id': self.color.id, 'value': "blue"}],
+            }, format='json')
+        self.assertEqual(created.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(detail['category']['name'], "Cached")
+        self.assertEqual(detail['product_attributes'][0]['attribute']['name'], "color")
+        self.assertEqual(created.json()['variant_options'], {'color': "blue"})
+        self.assertNoReferenceQueries(queries.captured_queries)
+
+    def test_unknown_category_is_rejected(self):
+        response = self.client.post(reverse('api:product-list'), {
+            'name': "Scarf", 'base_code': "SCF", 'sku': "SCF-3", 'price': "9.00", 'quantity': 1,
+            'category_id': self.category.id + 100, 'product_attributes': [],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('category_id', response.json())
+
+    def test_category_missing_from_a_stale_cache_is_found(self):
+        self.client.get(reverse('api:product-detail', kwargs={'pk': self.product.id}))  # Warms the cache.
+        # Created by another worker: this worker's cache has not reloaded yet.
+        fresh = Category.objects.bulk_create([Category(name="Fresh")])[0]
+        with override_settings(REFERENCE_DATA_CACHE_CHECK_SECONDS=3600):
+            response = self.client.post(reverse('api:product-list'), {
+                'name': "Scarf", 'base_code': "SCF", 'sku': "SCF-4", 'price': "9.00", 'quantity': 1,
+                'category_id': fresh.id, 'product_attributes': [],
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+        self.assertEqual(response.json()['category']['name'], "Fresh")
+
+    def test_writes_invalidate_other_workers_through_version_counter(self):
+        other_worker = ReferenceDataCache(Category)
+        self.assertEqual(other_worker.get(self.category.id).name, "Cached")
+
+        self.category.name = "Renamed"
+        self.category.save()
+
+        with override_settings(REFERENCE_DATA_CACHE_CHECK_SECONDS=3600):
+            self.assertEqual(other_worker.get(self.category.id).name, "Cached")
+        with override_settings(REFERENCE_DATA_CACHE_CHECK_SECONDS=0):
+            self.assertEqual(other_worker.get(self.category.id).name, "Renamed")
+
+
+@override_settings(SUGGEST_INDEX_SYNC_SECONDS=3600, SUGGEST_INDEX_REBUILD_SECONDS=3600)
+class SuggestTest(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Suggest")
+        self.shirt = Product.objects.create(
+            name="Blue Shirt", base_code="SHIRT", sku="SH-BLU", price=Decimal("20.00"), quantity=5,
+            category=self.category,
+        )
+        self.shoe = Product.objects.create(
+            name="Shoe", base_code="SHOE", sku="SO-1", price=Decimal("50.00"), quantity=5, category=self.category,
+        )
+        Product.objects.create(
+            name="Shorts", base_code="SHORTS", sku="SR-1", price=Decimal("15.00"), quantity=0, category=self.category,
+        )
+        suggest_index.build()
+        self.url = reverse('api:product-suggest')
+
+    def suggest(self, q, **params):
+        response = self.client.get(self.url, {'q': q, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [hit['sku'] for hit in response.json()['results']]
+
+    def test_prefix_matches_name_words_sku_and_base_code(self):
+        self.assertEqual(self.suggest("sh"), ["SH-BLU", "SO-1"])  # Inactive shorts are not suggested.
+        self.assertEqual(self.suggest("shirt"), ["SH-BLU"])
+        self.assertEqual(self.suggest("so-"), ["SO-1"])
+        self.assertEqual(self.suggest("sh", limit=1), ["SH-BLU"])
+        self.assertEqual(self.suggest(""), [])
+        hit = self.client.get(self.url, {'q': "blue"}).json()['results'][0]
+        self.assertEqual(hit, {'id': self.shirt.id, 'name': "Blue Shirt", 'sku': "SH-BLU", 'base_code': "SHIRT"})
+
+    def test_writes_update_the_index(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shirt.name = "Red Tee"
+            self.shirt.save()
+        self.assertEqual(self.suggest("blue"), [])
+        self.assertEqual(self.suggest("tee"), ["SH-BLU"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shoe.delete()
+        self.assertEqual(self.suggest("sho"), [])
+
+    def test_sync_picks_up_writes_of_other_processes(self):
+        Product.objects.filter(sku="SR-1").update(quantity=3, is_active=True, modified_time=timezone.now())
+        self.assertEqual(self.suggest("shorts"), [])
+        suggest_index.maintain()
+        self.assertEqual(self.suggest("shorts"), ["SR-1"])
+
+    def test_search_never_queries_the_database(self):
+        index = SuggestIndex()
+        with self.assertNumQueries(0):
+            self.assertEqual(index.search("sh"), [])  # Not built yet.
+        index.build()
+        with self.assertNumQueries(0):
+            self.assertEqual([hit['sku'] for hit in index.search("sh")], ["SH-BLU", "SO-1"])
+
+
+class DeletionJobTest(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Doomed")
+        self.other = Category.objects.create(name="Kept")
+        self.color = Attributes.objects.create(name="color", is_variant=True)
+        self.products = []
+        for i in range(5):
+            product = Product.objects.create(
+                name="Lamp", base_code="LAMP", sku=f"LAMP-{i}", price=Decimal("12.00"), quantity=1,
+                category=self.category,
+            )
+            ProductAttribute.objects.create(product=product, attribute=self.color, value=f"c{i}")
+            self.products.append(product)
+        record_stock_movement(self.products[0].id, -1)
+        self.kept = Product.objects.create(
+            name="Desk", base_code="DESK", sku="DESK-1", price=Decimal("99.00"), quantity=1, category=self.other,
+        )
+
+    def test_category_delete_returns_job_and_deletes_in_chunks(self):
+        ArchivedProduct.objects.create(
+            id=9999, base_code="LAMP", sku="LAMP-OLD", name="Lamp", price=Decimal("12.00"),
+            category=self.category, created_time=timezone.now(), modified_time=timezone.now(),
+        )
+        response = self.client.delete(reverse('api:category-detail', kwargs={'pk': self.category.id}))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.json()['total'], 5)
+        self.assertEqual(response.json()['status'], 'pending')
+        self.assertTrue(Category.objects.filter(id=self.category.id).exists())
+
+        self.assertEqual(process_deletion_jobs(batch_size=2), 1)
+
+        job = self.client.get(reverse('api:deletion-job-detail', kwargs={'pk': response.json()['id']})).json()
+        self.assertEqual((job['status'], job['deleted'], job['progress']), ('done', 5, 1.0))
+        self.assertFalse(Category.objects.filter(id=self.category.id).exists())
+        self.assertFalse(Product.objects.filter(category_id=self.category.id).exists())
+        self.assertFalse(ProductAttribute.objects.filter(attribute=self.color).exists())
+        self.assertFalse(StockMovement.objects.exists())
+        self.assertFalse(ArchivedProduct.objects.exists())
+        self.assertTrue(Product.objects.filter(id=self.kept.id).exists())
+
+    def test_bulk_product_delete(self):
+        ids = [self.products[0].id, self.products[1].id, self.kept.id]
+        response = self.client.post(reverse('api:product-bulk-delete'), {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        process_deletion_jobs(batch_size=2)
+
+        self.assertEqual(DeletionJob.objects.get().status, DeletionJob.Status.DONE)
+        self.assertFalse(Product.objects.filter(id__in=ids).exists())
+        self.assertEqual(Product.objects.count(), 3)
+
+    def test_bulk_delete_requires_ids(self):
+        response = self.client.post(reverse('api:product-bulk-delete'), {'ids': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ContentAddressedImageTest(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        media = override_settings(MEDIA_ROOT=self.media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.category = Category.objects.create(name="Images")
+        self.red, self.blue = (
+            Product.objects.create(
+                name="Tee", base_code="TEE", sku=f"TEE-{color}", price=Decimal("10.00"), quantity=1,
+                category=self.category,
+            )
+            for color in ("RED", "BLUE")
+        )
+
+    def png(self, color="red"):
+        buffer = BytesIO()
+        Image.new('RGB', (4, 4), color).save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def upload(self, product, content, name="photo.png"):
+        url = reverse('api:product-detail', kwargs={'pk': product.id})
+        response = self.client.patch(url, {'image': SimpleUploadedFile(name, content)}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        product.refresh_from_db()
+        return product.image.name
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.upload(self.red, self.png())
+        second = self.upload(self.blue, self.png(), name="other.PNG")
+
+        self.assertEqual(first, second)
+        digest = first.rsplit('/', 1)[1].split('.')[0]
+        self.assertEqual(first, f"media/products/{digest[:2]}/{digest[2:4]}/{digest}.png")
+        self.assertEqual(len(list(Path(self.media_root.name).rglob('*.png'))), 1)
+        self.assertEqual(ImageBlob.objects.get(name=first).ref_count, 2)
+
+    def test_unreferenced_images_are_collected_after_grace_period(self):
+        old = self.upload(self.red, self.png("red"))
+        self.upload(self.blue, self.png("red"))
+        new = self.upload(self.red, self.png("green"))
+        self.assertEqual(ImageBlob.objects.get(name=old).ref_count, 1)
+        self.assertEqual(ImageBlob.objects.get(name=new).ref_count, 1)
+
+        self.blue.delete()
+        self.assertEqual(ImageBlob.objects.get(name=old).ref_count, 0)
+        self.assertEqual(collect_unreferenced_images(grace_seconds=3600), 0)
+
+        self.assertEqual(collect_unreferenced_images(grace_seconds=-1), 1)
+        self.assertFalse((Path(self.media_root.name) / old).exists())
+        self.assertTrue((Path(self.media_root.name) / new).exists())
+
+        # Uploading the collected content again stores the file again.
+        self.assertEqual(self.upload(self.red, self.png("red")), old)
+        self.assertTrue((Path(self.media_root.name) / old).exists())
+        self.assertEqual(ImageBlob.objects.get(name=old).ref_count, 1)
+
+    def test_file_of_rolled_back_save_is_collected(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.red.image = SimpleUploadedFile("photo.png", self.png("blue"))
+            self.red.save()
+            name = self.red.image.name
+            raise RuntimeError
+        path = Path(self.media_root.name) / name
+        self.assertTrue(path.exists())
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+
+        self.assertEqual(collect_unreferenced_images(grace_seconds=3600), 0)
+        self.assertTrue(path.exists())
+        self.assertEqual(collect_unreferenced_images(grace_seconds=-1), 1)
+        self.assertFalse(path.exists())
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+
+    def test_concurrently_stored_file_counts_as_stored(self):
+        stored = self.upload(self.red, self.png())
+        upload = TemporaryUploadedFile("photo.png", 'image/png', 0, None)
+        upload.write(self.png())
+        upload.flush()
+        upload.sha256 = stored.rsplit('/', 1)[1].split('.')[0]
+        self.addCleanup(upload.close)
+        # The identical file appears right after the existence check.
+        with mock.patch('apps.ecommerce.storage.os.path.exists', return_value=False):
+            self.assertEqual(default_storage.save("media/products/photo.png", upload), stored)
+        self.assertTrue((Path(self.media_root.name) / stored).exists())
+
+
+class RelatedProductsTest(APITestCase):
+    def setUp(self):
+        clothes = Category.objects.create(name="Clothes")
+        self.tools = Category.objects.create(name="Tools")
+        self.color = Attributes.objects.create(name="color", is_variant=True)
+        self.material = Attributes.objects.create(name="material")
+        self.shirt = self.create("SHIRT", clothes, red="cotton", blue="cotton")
+        self.polo = self.create("POLO", clothes, red="cotton")
+        self.dress = self.create("DRESS", clothes, green="silk")
+        self.hammer = self.create("HAMMER", self.tools, black="steel")
+
+    def create(self, base_code, category, **variants):
+        first = None
+        for color, material in variants.items():
+            product = Product.objects.create(
+                name=base_code.title(), base_code=base_code, sku=f"{base_code}-{color}", price=Decimal("10.00"),
+                quantity=1, category=category,
+            )
+            ProductAttribute.objects.create(product=product, attribute=self.color, value=color)
+            ProductAttribute.objects.create(product=product, attribute=self.material, value=material)
+            first = first or product
+        return first
+
+    def related(self, product):
+        response = self.client.get(reverse('api:product-related', kwargs={'pk': product.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [hit['sku'] for hit in response.json()]
+
+    def test_full_run_ranks_by_attribute_and_category_similarity(self):
+        self.assertEqual(compute_related_products(full=True), 4)
+
+        self.assertEqual(self.related(self.polo), ["SHIRT-red", "DRESS-green"])
+        self.assertEqual(self.related(self.shirt)[0], "POLO-red")
+        self.assertNotIn("HAMMER-black", self.related(self.shirt))
+        self.assertEqual(self.related(self.hammer), [])
+        self.assertFalse(RelatedProductRefresh.objects.exists())
+
+    def test_incremental_run_recomputes_changed_base_codes(self):
+        compute_related_products(full=True)
+        self.assertEqual(compute_related_products(), 0)
+
+        self.hammer.product_attributes.filter(attribute=self.material).delete()
+        ProductAttribute.objects.create(product=self.hammer, attribute=self.material, value="cotton")
+        self.assertEqual(set(RelatedProductRefresh.objects.values_list('base_code', flat=True)), {"HAMMER"})
+
+        self.assertEqual(compute_related_products(), 1)
+        self.assertEqual(self.related(self.hammer)[0], "POLO-red")
+
+    def test_inactive_products_are_not_served(self):
+        compute_related_products(full=True)
+        Product.objects.filter(id=self.shirt.id).update(quantity=0)
+        self.assertEqual(self.related(self.polo), ["DRESS-green"])
+        for pk in (0, 'abc'):
+            self.assertEqual(
+                self.client.get(reverse('api:product-related', kwargs={'pk': pk})).status_code,
+                status.HTTP_404_NOT_FOUND,
+            )
+
+    def test_product_activated_during_the_run_is_skipped(self):
+        lamp = self.create("LAMP", self.tools, white="steel")
+        Product.objects.filter(id=lamp.id).update(quantity=0)
+        filter_attributes = ProductAttribute.objects.filter
+
+        def activate_lamp(*args, **kwargs):
+            Product.objects.filter(id=lamp.id).update(quantity=1, is_active=True)
+            return filter_attributes(*args, **kwargs)
+
+        with mock.patch.object(ProductAttribute.objects, 'filter', side_effect=activate_lamp):
+            self.assertEqual(compute_related_products(full=True), 4)
+        self.assertEqual(self.related(self.polo), ["SHIRT-red", "DRESS-green"])
+
+
+@override_settings(ADMIN_EXACT_COUNT_LIMIT=3)
+class ProductAdminTest(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        self.category = Category.objects.create(name="Admin")
+        self.color = Attributes.objects.create(name="color", is_variant=True)
+
+    def create_products(self, count, start=0):
+        for i in range(start, start + count):
+            product = Product.objects.create(
+                name="Sock", base_code="SOCK", sku=f"SOCK-{i}", price=Decimal("3.00"), quantity=4,
+                category=self.category,
+            )
+            ProductAttribute.objects.create(product=product, attribute=self.color, value=f"c{i}")
+
+    def changelist_queries(self, url_name):
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return len(queries.captured_queries)
+
+    def test_changelists_do_not_query_per_row(self):
+        self.create_products(2)
+        product_queries = self.changelist_queries('admin:ecommerce_product_changelist')
+        attribute_queries = self.changelist_queries('admin:ecommerce_productattribute_changelist')
+        self.create_products(5, start=2)
+        self.assertEqual(self.changelist_queries('admin:ecommerce_product_changelist'), product_queries)
+        self.assertEqual(self.changelist_queries('admin:ecommerce_productattribute_changelist'), attribute_queries)
+
+    def test_count_is_bounded(self):
+        self.create_products(5)
+        response = self.client.get(reverse('admin:ecommerce_product_changelist'))
+        self.assertEqual(response.context['cl'].result_count, 3)
+
+    def test_add_product_with_attribute_inline(self):
+        response = self.client.post(reverse('admin:ecommerce_product_add'), {
+            'base_code': "SOCK", 'sku': "SOCK-NEW", 'name': "Sock", 'price': "3.00", 'quantity': 2,
+            'is_active': 'on', 'category': self.category.id,
+            'product_attributes-TOTAL_FORMS': 1, 'product_attributes-INITIAL_FORMS': 0,
+            'product_attributes-0-attribute': self.color.id, 'product_attributes-0-value': "Navy",
+        })
+        self.assertEqual(response.status_code, 302, response.content)
+        product = Product.objects.get(sku="SOCK-NEW")
+        self.assertEqual(product.variant_options, {'color': "navy"})
+        self.assertEqual(product.product_attributes.get().attribute_value.value, "Navy")
+
+    def test_mark_out_of_stock_action_is_single_update_with_outbox_events(self):
+        self.create_products(3)
+        ids = list(Product.objects.values_list('id', flat=True))
+        response = self.client.post(reverse('admin:ecommerce_product_changelist'), {
+            'action': 'mark_out_of_stock', '_selected_action': ids,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Product.objects.filter(quantity__gt=0).exists())
+        self.assertFalse(Product.objects.filter(is_active=True).exists())
+        self.assertEqual(OutboxEvent.objects.filter(event_type=OutboxEvent.EventType.STOCK_OUT).count(), 3)
+        self.assertEqual(verify_catalog_stats(repair=False), [])
+
+    def mark_out_of_stock_queries(self):
+        ids = list(Product.objects.filter(quantity__gt=0).values_list('id', flat=True))
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.post(reverse('admin:ecommerce_product_changelist'), {
+                'action': 'mark_out_of_stock', '_selected_action': ids,
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(verify_catalog_stats(repair=False), [])
+        return len(queries.captured_queries)
+
+    def test_mark_out_of_stock_queries_do_not_grow_with_selection(self):
+        self.create_products(3)
+        queries = self.mark_out_of_stock_queries()
+        self.create_products(6, start=3)
+        self.assertEqual(self.mark_out_of_stock_queries(), queries)
+
+    @override_settings(CATALOG_STATS_ROW_DELTA_LIMIT=2)
+    def test_mark_out_of_stock_applies_group_deltas_to_large_selections(self):
+        self.create_products(3)
+        queries = self.mark_out_of_stock_queries()
+        self.create_products(6, start=3)
+        Product.objects.filter(sku="SOCK-5").update(price=Decimal("9.00"))
+        self.assertEqual(self.mark_out_of_stock_queries(), queries)
+        self.assertEqual(CatalogStats.objects.get(scope=CatalogStats.Scope.BASE_CODE, key="SOCK").in_stock_count, 0)
+
+    def test_category_delete_starts_background_job(self):
+        self.create_products(2)
+        url = reverse('admin:ecommerce_category_delete', args=[self.category.id])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.post(url, {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(DeletionJob.objects.get().category_id, self.category.id)
+        self.assertTrue(Category.objects.filter(id=self.category.id).exists())
+
+
+
+class CatalogStatsTest(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Stats")
+        self.other = Category.objects.create(name="Other")
+
+    def create_product(self, sku, price, quantity, category=None, base_code="TEE"):
+        return Product.objects.create(
+            name="Tee", base_code=base_code, sku=sku, price=Decimal(price), quantity=quantity,
+            category=category or self.category,
+        )
+
+    def stats(self, scope=CatalogStats.Scope.CATEGORY, key=None):
+        key = str(self.category.id) if key is None else key
+        return CatalogStats.objects.get(scope=scope, key=key)
+
+    def test_product_writes_apply_deltas(self):
+        cheap = self.create_product("TEE-1", "10.00", 3)
+        self.create_product("TEE-2", "30.00", 0)
+        stats = self.stats()
+        self.assertEqual((stats.product_count, stats.in_stock_count, stats.total_stock), (2, 1, 3))
+        self.assertEqual((stats.min_price, stats.max_price), (Decimal("10.00"), Decimal("30.00")))
+
+        cheap = Product.objects.get(id=cheap.id)
+        cheap.price = Decimal("20.00")
+        cheap.save()
+        self.assertEqual(self.stats().min_price, Decimal("20.00"))
+
+        cheap.category = self.other
+        cheap.save()
+        self.assertEqual(self.stats().product_count, 1)
+        self.assertEqual(self.stats(key=str(self.other.id)).total_stock, 3)
+        self.assertEqual(self.stats(CatalogStats.Scope.BASE_CODE, "TEE").product_count, 2)
+
+        cheap.delete()
+        self.assertFalse(CatalogStats.objects.filter(key=str(self.other.id)).exists())
+        self.assertEqual(verify_catalog_stats(repair=False), [])
+
+    def test_bulk_create_and_compaction(self):
+        Product.objects.bulk_create([
+            Product(name="Tee", base_code="TEE", sku=f"TEE-{i}", price=Decimal("5.00") + i, quantity=i,
+                    is_active=i > 0, category=self.category)
+            for i in range(4)
+        ])
+        self.assertEqual(self.stats().product_count, 4)
+        self.assertEqual(self.stats().total_stock, 6)
+
+        record_stock_movement(Product.objects.get(sku="TEE-3").id, -3)
+        record_stock_movement(Product.objects.get(sku="TEE-0").id, 2)
+        compact_inventory()
+        stats = self.stats()
+        self.assertEqual((stats.in_stock_count, stats.total_stock), (3, 5))
+        self.assertEqual(verify_catalog_stats(repair=False), [])
+
+    def test_queryset_updates_apply_deltas(self):
+        self.create_product("TEE-1", "10.00", 3)
+        self.create_product("TEE-2", "30.00", 1)
+        Product.objects.filter(sku="TEE-1").update(quantity=F('quantity') + 2, category=self.other)
+        Product.objects.filter(sku="TEE-2").update(price=Decimal("5.00"))
+        stats = self.stats()
+        self.assertEqual((stats.product_count, stats.total_stock, stats.min_price), (1, 1, Decimal("5.00")))
+        self.assertEqual(self.stats(key=str(self.other.id)).total_stock, 5)
+        self.assertEqual(verify_catalog_stats(repair=False), [])
+
+    def test_stock_movements_reach_stats_with_compaction(self):
+        product = self.create_product("TEE-1", "10.00", 3)
+        url = reverse('api:product-stock-movements', kwargs={'pk': product.id})
+        self.client.post(url, {'delta': -3}, format='json')
+        # The ledger is not applied to the stats until it is compacted.
+        response = self.client.get(reverse('api:category-stats', args=[self.category.id]))
+        self.assertEqual((response.data['in_stock_count'], response.data['total_stock']), (1, 3))
+
+        compact_inventory()
+        response = self.client.get(reverse('api:category-stats', args=[self.category.id]))
+        self.assertEqual((response.data['in_stock_count'], response.data['total_stock']), (0, 0))
+
+    def test_category_stats_endpoint_and_embedded_stats(self):
+        product = self.create_product("TEE-1", "10.00", 3)
+        response = self.client.get(reverse('api:category-stats', args=[self.category.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['product_count'], 1)
+        self.assertEqual(response.data['min_price'], "10.00")
+
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.get(reverse('api:category-list'))
+        stats = {row['id']: row['stats'] for row in response.data['results']}
+        self.assertEqual(stats[self.category.id]['total_stock'], 3)
+        self.assertEqual(stats[self.other.id]['product_count'], 0)
+        self.assertEqual(len([q for q in queries.captured_queries if 'catalogstats' in q['sql']]), 1)
+
+        response = self.client.get(reverse('api:product-detail', kwargs={'pk': product.id}))
+        self.assertNotIn('stats', response.data['category'])
+
+    def test_verification_repairs_drift(self):
+        self.create_product("TEE-1", "10.00", 3)
+        CatalogStats.objects.filter(scope=CatalogStats.Scope.CATEGORY).update(total_stock=99)
+        with connections['default'].cursor() as cursor:  # A write bypassing the ORM.
+            cursor.execute("UPDATE ecommerce_product SET base_code = 'POLO' WHERE sku = 'TEE-1'")
+        out = StringIO()
+        call_command('verify_catalog_stats', stdout=out)
+        self.assertIn("3 drifted", out.getvalue())
+        self.assertEqual(self.stats().total_stock, 3)
+        self.assertFalse(CatalogStats.objects.filter(scope=CatalogStats.Scope.BASE_CODE, key="TEE").exists())
+        self.assertEqual(verify_catalog_stats(repair=False), [])
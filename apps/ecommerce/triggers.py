@@ -0,0 +1,52 @@
+"""
+Database triggers keeping `Product.is_active` false while `quantity` is zero.
+The pre_save receiver only covers Model.save(); the trigger also covers
+bulk_create, bulk_update, QuerySet.update and raw SQL.
+"""
+TRIGGER_NAME = 'ecommerce_product_inactive_without_stock'
+
+
+def install_product_status_trigger(connection, table='ecommerce_product'):
+    """
+    Creates the trigger on SQLite or PostgreSQL. Safe to run repeatedly.
+    """
+    quoted = connection.ops.quote_name(table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"""
+                CREATE OR REPLACE FUNCTION {TRIGGER_NAME}() RETURNS trigger AS $$
+                BEGIN
+                    IF NEW.quantity <= 0 THEN
+                        NEW.is_active := FALSE;
+                    END IF;
+                    RETURN NEW;
+                END;
+                $$ LANGUAGE plpgsql
+            """)
+            cursor.execute(f"DROP TRIGGER IF EXISTS {TRIGGER_NAME} ON {quoted}")
+            cursor.execute(f"""
+                CREATE TRIGGER {TRIGGER_NAME} BEFORE INSERT OR UPDATE ON {quoted}
+                FOR EACH ROW EXECUTE FUNCTION {TRIGGER_NAME}()
+            """)
+        elif connection.vendor == 'sqlite':
+            # SQLite cannot modify NEW, so the row is corrected right after the write.
+            for event in ('INSERT', 'UPDATE OF quantity, is_active'):
+                suffix = event.split()[0].lower()
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS {TRIGGER_NAME}_{suffix} AFTER {event} ON {quoted}
+                    WHEN NEW.quantity <= 0 AND NEW.is_active
+                    BEGIN
+                        UPDATE {quoted} SET is_active = 0 WHERE id = NEW.id;
+                    END
+                """)
+
+
+def remove_product_status_trigger(connection, table='ecommerce_product'):
+    quoted = connection.ops.quote_name(table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"DROP TRIGGER IF EXISTS {TRIGGER_NAME} ON {quoted}")
+            cursor.execute(f"DROP FUNCTION IF EXISTS {TRIGGER_NAME}()")
+        elif connection.vendor == 'sqlite':
+            for suffix in ('insert', 'update'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {TRIGGER_NAME}_{suffix}")
@@ -0,0 +1,89 @@
+import hashlib
+
+from .models import Product, ProductAttribute
+from .reference_cache import attribute_cache
+
+REFRESH_CHUNK_SIZE = 500
+
+
+def normalize_options(options):
+    """
+    Normalizes variant options so that `{"Color": " Red "}` and
+    `{"color": "red"}` describe the same variant.
+    """
+    return {str(name).strip().casefold(): str(value).strip().casefold() for name, value in options.items()}
+
+
+def variant_signature(options):
+    """
+    Returns the signature stored in `Product.variant_signature`: a sha1 of the
+    normalized, name-sorted `name=value` pairs of the variant attributes.
+    """
+    normalized = normalize_options(options)
+    canonical = '|'.join(f"{name}={normalized[name]}" for name in sorted(normalized))
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+def refresh_variant_signatures(product_ids):
+    """
+    Recomputes `variant_options` and `variant_signature` of the given products
+    from their ProductAttribute rows whose attribute has `is_variant=True`.
+    Uses bulk_update, so no save signals are fired.
+    """
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), REFRESH_CHUNK_SIZE):
+        chunk = product_ids[start:start + REFRESH_CHUNK_SIZE]
+        options = {product_id: {} for product_id in chunk}
+        rows = ProductAttribute.objects.filter(
+            product_id__in=chunk,
+        ).values_list('product_id', 'attribute_id', 'attribute_value__value')
+        for product_id, attribute_id, value in rows:
+            attribute = attribute_cache.get(attribute_id)
+            if attribute is not None and attribute.is_variant:
+                options[product_id][attribute.name] = value
+
+        products = []
+        for product_id, product_options in options.items():
+            normalized = normalize_options(product_options)
+            products.append(Product(
+                id=product_id, variant_options=normalized, variant_signature=variant_signature(normalized),
+            ))
+        Product.objects.bulk_update(products, ['variant_options', 'variant_signature'])
+
+
+def refresh_attribute_variant_signatures(attribute_id):
+    """
+    Recomputes the signatures of every product using the attribute, e.g. after
+    its name or `is_variant` flag changed.
+    """
+    product_ids = ProductAttribute.objects.filter(
+        attribute_id=attribute_id, product__isnull=False,
+    ).values_list('product_id', flat=True).distinct()
+    refresh_variant_signatures(product_ids.iterator())
+
+
+def resolve_variant(base_code, options):
+    """
+    Looks up the product of `base_code` with exactly the given variant options
+    through the `(base_code, variant_signature)` index. Also returns the
+    option combinations of the base code that are currently in stock.
+    Returns `(product or None, available)`, or `(None, None)` for an unknown base code.
+    """
+    siblings = list(
+        Product.objects.filter(base_code=base_code)
+        .values('id', 'sku', 'price', 'quantity', 'is_active', 'variant_options')
+        .order_by('id')
+    )
+    if not siblings:
+        return None, None
+
+    product = Product.objects.prefetch_related(
+        'product_attributes__attribute_value',
+    ).filter(base_code=base_code, variant_signature=variant_signature(options)).first()
+
+    available = [
+        {'id': sibling['id'], 'sku': sibling['sku'], 'price': str(sibling['price']), 'options': sibling['variant_options']}
+        for sibling in siblings
+        if sibling['is_active'] and sibling['quantity'] > 0
+    ]
+    return product, available
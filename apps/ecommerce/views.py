@@ -1,6 +1,10 @@
-from rest_framework import viewsets
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
 
-from django.http import JsonResponse
+from django.conf import settings
+from django.db.models import Count
+from django.http import Http404, JsonResponse
 
 # Serializer'ları import ediyoruz
 from .serializers import (
@@ -8,52 +12,162 @@ from .serializers import (
     CategorySerializer,
     AttributesSerializer,
     ProductAttributeSerializer,
+    StockMovementSerializer,
+    AttributeValueSerializer,
+    ArchivedProductSerializer,
+    DeletionJobSerializer,
+    ProductBulkDeleteSerializer,
+    RelatedProductSerializer,
+    CatalogStatsSerializer,
+    EMPTY_CATALOG_STATS,
 )
-from .models import Product, Category, Attributes, ProductAttribute
-from django.db.models import Min # Aggregation için
+from .models import (
+    Product, Category, Attributes, ProductAttribute, AttributeValue, ArchivedProduct, DeletionJob, RelatedProduct,
+    CatalogStats,
+)
+from .archive import restore_archived_product
+from .catalog import add_archived_variants, group_by_base_code
+from .deletion import start_category_deletion, start_product_deletion
+from .inventory import record_stock_movement
+from .stats import catalog_stats
+from .suggest import suggest_index
+from .variants import normalize_options, resolve_variant
 
 
 class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.select_related(
-        'category',
-    ).prefetch_related(
-        'product_attributes__attribute',
-    )
+    # Categories and attributes come from the per-process reference cache.
+    queryset = Product.objects.prefetch_related('product_attributes__attribute_value')
     serializer_class = ProductSerializer
     search_fields = ['name', 'sku', 'base_code']
-    filterset_fields = ['category', 'is_active', 'base_code']
+    filterset_fields = ['category', 'is_active', 'base_code', 'product_attributes__attribute_value']
     ordering_fields = ['name']
 
+    def include_archived(self):
+        return self.request.query_params.get('include_archived', '').lower() in ('1', 'true', 'yes')
+
+    def get_archived_queryset(self):
+        return ArchivedProduct.objects.prefetch_related('product_attributes__attribute_value')
+
+    def restore_archived(self, pk):
+        """
+        Restores the archived product `pk` back into the catalog.
+        Returns False when there is no such archived product.
+        """
+        try:
+            return restore_archived_product(int(pk)) is not None
+        except (TypeError, ValueError):
+            return False
+
+    def get_object(self):
+        """
+        Writes to an archived product (e.g. restocking it) transparently move
+        it back from the archive first.
+        """
+        try:
+            return super().get_object()
+        except Http404:
+            if self.request.method not in ('PUT', 'PATCH') or not self.restore_archived(self.kwargs['pk']):
+                raise
+        return super().get_object()
+
     def list(self, request, *args, **kwargs):
-        initial_queryset = self.filter_queryset(self.get_queryset())
-
-        unique_base_codes_ids = initial_queryset.values('base_code').annotate(
-            min_id=Min('id')
-        ).values_list('min_id', flat=True)
-
-        main_products = initial_queryset.filter(id__in=list(unique_base_codes_ids)).order_by('id')
-
-        results = []
-        for main_product in main_products:
-            validated_data = ProductSerializer(main_product).data
-            data = [validated_data]
-            if not validated_data.get('is_active'):
-                data = []
-
-            product_data = {
-                'base_code': main_product.base_code,
-                'variants': data
-            }
-            variants_queryset = self.get_queryset().filter(base_code=main_product.base_code).exclude(id=main_product.id)
-            for variant in variants_queryset:
-                variant_data = ProductSerializer(variant).data
-                if not variant_data.get('is_active'):
-                    continue
-                product_data['variants'].append(variant_data)
-
-            results.append(product_data)
+        results = group_by_base_code(self.filter_queryset(self.get_queryset()), self.get_queryset())
+        if self.include_archived():
+            add_archived_variants(results, self.filter_queryset(self.get_archived_queryset()))
         return JsonResponse(results, safe=False)
 
+    def retrieve(self, request, *args, **kwargs):
+        """
+        With `?include_archived=true` an archived product is returned (read
+        only, with `is_archived: true`) instead of a 404.
+        """
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            if not self.include_archived():
+                raise
+        archived = self.get_archived_queryset().filter(pk=kwargs['pk']).first() if kwargs['pk'].isdigit() else None
+        if archived is None:
+            raise Http404
+        return Response(ArchivedProductSerializer(archived).data)
+
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        """
+        Similar products (by attribute values and category), precomputed by
+        `manage.py compute_related_products`, most similar first.
+        """
+        products = Product.objects.filter(pk=pk) if pk.isdigit() else Product.objects.none()
+        base_code = products.values_list('base_code', flat=True).first()
+        if base_code is None:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        related = (
+            RelatedProduct.objects.filter(base_code=base_code, related__is_active=True)
+            .select_related('related').order_by('rank')
+        )
+        return Response(RelatedProductSerializer(related, many=True, context={'request': request}).data)
+
+    @action(detail=False, methods=['post'], url_path='bulk-delete')
+    def bulk_delete(self, request):
+        """
+        Deletes the products `{"ids": [...]}` in the background and returns
+        the deletion job; follow it at /api/deletion-jobs/<id>/.
+        """
+        serializer = ProductBulkDeleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = start_product_deletion(serializer.validated_data['ids'])
+        return Response(DeletionJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """
+        Typeahead suggestions: active products whose name (or a word of it),
+        SKU or base code starts with `?q=`, at most `?limit=` (default 10) hits.
+        Served from the in-memory prefix index, not the database.
+        """
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), settings.SUGGEST_MAX_LIMIT)
+        except ValueError:
+            return Response({'limit': ['A valid integer is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        query = request.query_params.get('q', '')
+        return JsonResponse({'q': query, 'results': suggest_index.search(query, max(limit, 0))})
+
+    @action(detail=False, methods=['get'])
+    def resolve(self, request):
+        """
+        Resolves a variant from its options, e.g.
+        `?base_code=X&color=red&size=M`, and lists the in-stock combinations.
+        """
+        options = request.query_params.dict()
+        base_code = options.pop('base_code', None)
+        options.pop('format', None)
+        if not base_code:
+            return Response({'base_code': ['This query parameter is required.']}, status=status.HTTP_400_BAD_REQUEST)
+
+        product, available = resolve_variant(base_code, options)
+        if available is None:
+            return Response({'detail': 'Unknown base_code.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'base_code': base_code,
+            'options': normalize_options(options),
+            'product': ProductSerializer(product).data if product else None,
+            'in_stock': bool(product and product.is_active and product.quantity > 0),
+            'available': available,
+        })
+
+    @action(detail=True, methods=['post'], url_path='stock-movements')
+    def stock_movements(self, request, pk=None):
+        """
+        Records a stock change (`{"delta": -1}`) in the inventory ledger without
+        locking the product row. It is applied to `quantity` by compaction.
+        """
+        serializer = StockMovementSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if not pk.isdigit() or (not Product.objects.filter(pk=pk).exists() and not self.restore_archived(pk)):
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        movement = record_stock_movement(pk, **serializer.validated_data)
+        return Response(StockMovementSerializer(movement).data, status=status.HTTP_202_ACCEPTED)
+
 
 class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
@@ -61,15 +175,56 @@ class CategoryViewSet(viewsets.ModelViewSet):
     search_fields = ['name'] 
     ordering_fields = ['name', 'created_time']
 
+    def destroy(self, request, *args, **kwargs):
+        """
+        Deletes the category with its products in the background, chunk by
+        chunk, and returns the deletion job instead of waiting for the cascade.
+        """
+        job = start_category_deletion(self.get_object())
+        return Response(DeletionJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        """
+        Returns the maintained product count, stock and price range of the
+        category (`/api/categories/<id>/stats/`) without scanning its products.
+        """
+        category = self.get_object()
+        stats = catalog_stats(CatalogStats.Scope.CATEGORY, [category.id]).get(str(category.id), EMPTY_CATALOG_STATS)
+        return Response(CatalogStatsSerializer(stats).data)
+
+
 class ProductAttributeViewSet(viewsets.ModelViewSet):
-    queryset = ProductAttribute.objects.select_related('product', 'attribute').all()
-    filterset_fields = ['product', 'attribute']
+    queryset = ProductAttribute.objects.select_related('product', 'attribute_value').all()
+    filterset_fields = ['product', 'attribute', 'attribute_value']
     serializer_class = ProductAttributeSerializer
     
 
+class AttributeValueViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Interned attribute values with the number of product attributes using
+    them, for attribute facets. Filter products by value with
+    `/api/products/?product_attributes__attribute_value=<id>`.
+    """
+    queryset = AttributeValue.objects.annotate(product_count=Count('product_attributes')).order_by('attribute', 'value')
+    serializer_class = AttributeValueSerializer
+    search_fields = ['value']
+    filterset_fields = ['attribute']
+
+
 class AttributesViewSet(viewsets.ModelViewSet):
     queryset = Attributes.objects.all()
     serializer_class = AttributesSerializer
     search_fields = ['name']
     filterset_fields = ['is_variant', 'is_visible']
-    ordering_fields = ['name', 'is_variant']
\ No newline at end of file
+    ordering_fields = ['name', 'is_variant']
+
+
+class DeletionJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Progress of background category and bulk product deletions.
+    """
+    queryset = DeletionJob.objects.order_by('-id')
+    serializer_class = DeletionJobSerializer
+    filterset_fields = ['status', 'target']
+
@@ -21,7 +21,9 @@ router = DefaultRouter()
 router.register(r'products', views.ProductViewSet, basename='product')
 router.register(r'categories', views.CategoryViewSet, basename='category')
 router.register(r'attributes', views.AttributesViewSet, basename='attribute')
+router.register(r'attribute-values', views.AttributeValueViewSet, basename='attribute-value')
 router.register(r'product-attributes', views.ProductAttributeViewSet, basename='product-attribute')
+router.register(r'deletion-jobs', views.DeletionJobViewSet, basename='deletion-job')
 
 urlpatterns = [
     path('swagger<format>/', schema_view.without_ui(), name='schema-json'),
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'example.settings')
 
 application = get_asgi_application()
+
+# Maintain the product suggest index in each worker process.
+from apps.ecommerce.suggest import start_suggest_index_in_workers  # noqa: E402
+
+start_suggest_index_in_workers()
@@ -1,3 +1,4 @@
+import sys
 from pathlib import Path
 from environ import Env
 
@@ -28,12 +29,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'apps.ecommerce.middleware.AdmissionControlMiddleware',
+    'apps.ecommerce.middleware.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apps.ecommerce.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'example.urls'
@@ -56,6 +60,10 @@ TEMPLATES = [
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+
+# Precompressed catalog snapshots served by nginx under /catalog/.
+CATALOG_SNAPSHOT_ROOT = env.path('CATALOG_SNAPSHOT_ROOT', default=BASE_DIR / 'snapshots')
+CATALOG_SNAPSHOTS_ON_WRITE = env.bool('CATALOG_SNAPSHOTS_ON_WRITE', default=False)
 WSGI_APPLICATION = 'example.wsgi.application'
 
 if  env.str('DB_ENGINE', default=None):
@@ -77,6 +85,24 @@ else:
         }
     }
 
+# Read replicas: every host in DB_REPLICA_HOSTS becomes a `replica_<n>` alias
+# sharing the primary's credentials. Catalog reads are routed there by
+# PrimaryReplicaRouter; writes and read-your-writes traffic stay on `default`.
+DATABASE_REPLICAS = []
+for index, host in enumerate(env.list('DB_REPLICA_HOSTS', default=[]), start=1):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {**DATABASES['default'], 'HOST': host, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+
+# Stand-in replica for `manage.py test` only (ReplicaRoutingTest lists it
+# in DATABASE_REPLICAS); it never touches the disk.
+if sys.argv[1:2] == ['test']:
+    DATABASES['replica'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+
+DATABASE_ROUTERS = ['apps.ecommerce.routers.PrimaryReplicaRouter']
+DATABASE_REPLICA_STICKY_SECONDS = env.int('DB_REPLICA_STICKY_SECONDS', default=5)
+DATABASE_REPLICA_STICKY_COOKIE = 'db_primary_pin'
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -129,4 +155,87 @@ if DEBUG:
         'rest_framework.permissions.AllowAny',
     ]
 CORS_ALLOW_ALL_ORIGINS = True
-CORS_ALLOW_CREDENTIALS = True
\ No newline at end of file
+CORS_ALLOW_CREDENTIALS = True
+
+# Per-process admission control, see AdmissionControlMiddleware.
+# The unpaginated product listing is expensive: it is capped, costs more
+# tokens and is shed first so that detail lookups keep their worker threads.
+ADMISSION_CONTROL = {
+    'ENABLED': env.bool('ADMISSION_CONTROL_ENABLED', default=True),
+    'MAX_INFLIGHT': env.int('ADMISSION_MAX_INFLIGHT', default=64),
+    'LOW_PRIORITY_MAX_INFLIGHT': env.int('ADMISSION_LOW_PRIORITY_MAX_INFLIGHT', default=32),
+    'CLIENT_RATE': env.float('ADMISSION_CLIENT_RATE', default=50.0),
+    'CLIENT_BURST': env.int('ADMISSION_CLIENT_BURST', default=100),
+    'MAX_TRACKED_CLIENTS': env.int('ADMISSION_MAX_TRACKED_CLIENTS', default=10000),
+    # META key of the client IP set by a trusted reverse proxy (e.g.
+    # HTTP_X_REAL_IP behind the bundled nginx); REMOTE_ADDR when empty.
+    'CLIENT_IP_HEADER': env.str('ADMISSION_CLIENT_IP_HEADER', default=''),
+    'ROUTES': [
+        {'pattern': r'^/api/products/$', 'methods': ['GET'], 'max_concurrency': 4, 'cost': 5, 'priority': 'low'},
+        {'pattern': r'^/api/swagger', 'max_concurrency': 2, 'cost': 5, 'priority': 'low'},
+    ],
+}
+
+# Transactional outbox: catalog change events are delivered by `manage.py dispatch_outbox`.
+OUTBOX_WEBHOOK_URL = env.str('OUTBOX_WEBHOOK_URL', default='')
+OUTBOX_BATCH_SIZE = env.int('OUTBOX_BATCH_SIZE', default=100)
+OUTBOX_MAX_ATTEMPTS = env.int('OUTBOX_MAX_ATTEMPTS', default=10)
+OUTBOX_TIMEOUT = env.float('OUTBOX_TIMEOUT', default=5.0)
+OUTBOX_BACKOFF_BASE = env.float('OUTBOX_BACKOFF_BASE', default=2.0)
+OUTBOX_BACKOFF_MAX = env.float('OUTBOX_BACKOFF_MAX', default=300.0)
+OUTBOX_LEASE_SECONDS = env.int('OUTBOX_LEASE_SECONDS', default=60)
+
+# Opt-in request profiling, see ProfilingMiddleware and `manage.py request_profiles`.
+REQUEST_PROFILING = {
+    'SAMPLE_RATE': env.float('PROFILING_SAMPLE_RATE', default=0.0),
+    'ROOT': env.path('PROFILING_ROOT', default=BASE_DIR / 'profiles'),
+    'MAX_PROFILES': env.int('PROFILING_MAX_PROFILES', default=200),
+    'TOKEN_MAX_AGE': env.int('PROFILING_TOKEN_MAX_AGE', default=3600),
+}
+
+# Inventory ledger, see StockMovement and `manage.py compact_inventory`.
+INVENTORY_COUNTER_SLOTS = env.int('INVENTORY_COUNTER_SLOTS', default=8)
+
+# Products inactive for longer than this are moved to the archive tables,
+# see ArchivedProduct and `manage.py archive_products`.
+PRODUCT_ARCHIVE_AFTER_DAYS = env.int('PRODUCT_ARCHIVE_AFTER_DAYS', default=180)
+
+# Category and Attributes are cached in every worker process; the shared
+# ReferenceDataVersion counter is checked at most this often (seconds).
+REFERENCE_DATA_CACHE_CHECK_SECONDS = env.float('REFERENCE_DATA_CACHE_CHECK_SECONDS', default=1.0)
+
+# Typeahead index behind /api/products/suggest/, see apps.ecommerce.suggest.
+SUGGEST_INDEX_SYNC_SECONDS = env.float('SUGGEST_INDEX_SYNC_SECONDS', default=1.0)
+SUGGEST_INDEX_REBUILD_SECONDS = env.float('SUGGEST_INDEX_REBUILD_SECONDS', default=600.0)
+SUGGEST_MAX_LIMIT = env.int('SUGGEST_MAX_LIMIT', default=50)
+
+# Background category/bulk product deletion, see DeletionJob.
+DELETION_BATCH_SIZE = env.int('DELETION_BATCH_SIZE', default=500)
+# Run new deletion jobs in a thread of the web process; otherwise they are
+# left to `manage.py process_deletion_jobs --loop`.
+DELETION_JOBS_IN_PROCESS = env.bool('DELETION_JOBS_IN_PROCESS', default=True)
+# A running job without progress for this long is taken over by another worker.
+DELETION_JOB_STALE_SECONDS = env.int('DELETION_JOB_STALE_SECONDS', default=300)
+
+# Product images are stored content-addressed and shared between products,
+# see apps.ecommerce.storage and `manage.py gc_images`.
+STORAGES = {
+    'default': {'BACKEND': 'apps.ecommerce.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+FILE_UPLOAD_HANDLERS = ['apps.ecommerce.storage.HashingFileUploadHandler']
+IMAGE_GC_GRACE_SECONDS = env.int('IMAGE_GC_GRACE_SECONDS', default=86400)
+
+# Precomputed related products, see `manage.py compute_related_products`.
+RELATED_PRODUCTS_TOP_K = env.int('RELATED_PRODUCTS_TOP_K', default=10)
+# Similarity is computed in dense blocks of at most this many cells.
+RELATED_PRODUCTS_BLOCK_CELLS = env.int('RELATED_PRODUCTS_BLOCK_CELLS', default=16_000_000)
+RELATED_PRODUCTS_CATEGORY_WEIGHT = env.float('RELATED_PRODUCTS_CATEGORY_WEIGHT', default=1.0)
+
+# Admin changelists of large tables count at most this many rows, see
+# apps.ecommerce.admin.EstimatedCountPaginator.
+ADMIN_EXACT_COUNT_LIMIT = env.int('ADMIN_EXACT_COUNT_LIMIT', default=10000)
+
+# Product updates touching at most this many rows apply exact per-product
+# catalog stats deltas; larger ones compare per-group aggregates.
+CATALOG_STATS_ROW_DELTA_LIMIT = env.int('CATALOG_STATS_ROW_DELTA_LIMIT', default=1000)